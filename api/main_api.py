@@ -1,16 +1,30 @@
 # main_api.py
+import time
 from contextlib import asynccontextmanager
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, HttpUrl
 
+from db.db import warm_up_engines, dispose_engines, DB_POOL_WARMUP
 from utils.logger import Logger
 from utils.path_utils import get_abs_path
+from utils.serialize import dumps
+from utils.metrics   import REGISTRY, REQUEST_SECONDS, CONTENT_TYPE as METRICS_CONTENT_TYPE, start_request_timing
 from services.car_value_analysis_service import (
-    evaluate_from_url,
-    evaluate_by_listing_id,
+    evaluate_json_from_url_async,
+    evaluate_json_by_listing_id_async,
+    evaluate_batch,
+    open_cohort_stream,
+    best_deals_json_async,
+    get_cache_stats,
+    get_snapshot,
+    refresh_listing_index,
+    USE_SNAPSHOT,
+    LISTING_INDEX,
 )
 
 import os
@@ -23,8 +37,11 @@ host        = "0.0.0.0"
 port        = 8000
 reload_flag = True
 watch_dirs  = ["api", "services", "core", "utils"]  # 想监听谁就写谁
+cache_control = os.getenv("evaluate_cache_control", "public, max-age=300")  # 评估结果的 Cache-Control
+server_timing = os.getenv("server_timing", "false").lower() in ("1", "true", "yes")  # 是否返回 Server-Timing 分段耗时头
 
-logger = Logger.get_global_logger()
+logger     = Logger.get_global_logger()
+hot_logger = Logger.get_hot_logger()     # 每个请求都会打的日志：可按 LOG_HOT_SAMPLE_EVERY 采样
 
 # ===== 工具函数：预测热重载模式（基于是否安装 watchfiles）=====
 def predict_reload_mode() -> str:
@@ -44,51 +61,202 @@ async def lifespan(app: FastAPI):
     except Exception:
         actual = "StatReload"
 
+    if USE_SNAPSHOT:
+        # 快照模式不连数据库：启动时映射快照（文件缺失时只告警，导出后首个请求自动加载）
+        try:
+            snapshot = get_snapshot()
+            logger.info("🗂️ 快照已映射: %s rows=%d cohorts=%d", snapshot.name, snapshot.rows, snapshot.cohort_count)
+        except Exception as e:
+            logger.warning("⚠️ 快照加载失败: %s", e)
+    else:
+        # 预热连接池：首批请求不再承担建连开销；数据库暂不可用时只告警，不阻止启动（请求时会按需重连）
+        try:
+            await warm_up_engines(DB_POOL_WARMUP)
+            logger.info("🔌 连接池预热完成: %d 个连接/引擎", DB_POOL_WARMUP)
+        except Exception as e:
+            logger.warning("⚠️ 连接池预热失败，首个请求时再建连: %s", e)
+        if LISTING_INDEX:
+            await run_in_threadpool(refresh_listing_index)      # 失败只告警，数据版本变化时会再试
+
     logger.info("🚀 服务启动成功")
     logger.info(f"🚀 当前热重载模式: {actual}")
     yield
+    await dispose_engines()
     logger.info("🛑 服务已关闭")
 
+# ===== 响应类：orjson 一次编码（NaN → null，numpy 标量直出） =====
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+# ===== 工具函数：ETag / 304 =====
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    # If-None-Match 用弱比较（忽略 W/ 前缀），支持多值与 *
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+def cached_json_response(request: Request, body: bytes, etag: str) -> Response:
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# ===== 中间件：请求耗时直方图（endpoint × cohort 桶）+ 可选 Server-Timing（纯 ASGI，不缓冲响应体） =====
+class MetricsMiddleware:
+    def __init__(self, app, emit_server_timing: bool = False):
+        self.app = app
+        self.emit_server_timing = emit_server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timing = start_request_timing()
+        t0     = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.emit_server_timing:
+                    total = time.perf_counter() - t0
+                    value = timing.server_timing()
+                    value = f"{value}, total;dur={total * 1000:.2f}" if value else f"total;dur={total * 1000:.2f}"
+                    message.setdefault("headers", []).append((b"server-timing", value.encode("latin-1")))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - t0,
+                endpoint=getattr(route, "path", "unmatched"),   # 用路由模板，避免 listing_id 撑爆标签基数
+                method=scope["method"],
+                status=str(status),
+                cohort_bucket=timing.labels.get("cohort_bucket", "none"),
+            )
+
 # ===== 应用 =====
-app = FastAPI(title=app_title, version=app_version, lifespan=lifespan)
+app = FastAPI(title=app_title, version=app_version, lifespan=lifespan, default_response_class=FastJSONResponse)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], allow_credentials=True,
     allow_methods=["*"], allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware, emit_server_timing=server_timing)   # 最外层：计入 CORS 在内的全部耗时
 
 # ===== 健康检查 =====
 @app.get("/healthz")
 def healthz() -> Dict[str, str]:
     return {"status": "ok"}
 
+# ===== 缓存命中统计 =====
+@app.get("/api/cache/stats")
+def api_cache_stats() -> Dict[str, Any]:
+    return get_cache_stats()
+
+# ===== Prometheus 指标 =====
+@app.get("/metrics")
+def api_metrics() -> Response:
+    return Response(content=REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
 # ===== 请求模型 =====
 class evaluate_req(BaseModel):
     url: HttpUrl
 
+class evaluate_batch_req(BaseModel):
+    urls: List[HttpUrl] = []
+    listing_ids: List[str] = []
+
 # ===== 接口（内联，省去 controller 层）=====
 @app.post("/api/evaluate")
-async def api_evaluate(req: evaluate_req) -> Dict[str, Any]:
-    logger.info(f"🔍 接收到评估请求: {req.url}")
+async def api_evaluate(req: evaluate_req, request: Request) -> Response:
+    hot_logger.info("🔍 接收到评估请求: %s", req.url)
+    try:
+        body, etag = await evaluate_json_from_url_async(str(req.url))
+        return cached_json_response(request, body, etag)
+    except ValueError as e:
+        logger.warning("⚠️ 参数错误: %s", e)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception("💥 服务异常: %s", e)
+        raise HTTPException(status_code=500, detail="internal server error")
+
+@app.post("/api/evaluate/batch")
+async def api_evaluate_batch(req: evaluate_batch_req) -> FastJSONResponse:
+    hot_logger.info("🔍 接收到批量评估请求: urls=%d listing_ids=%d", len(req.urls), len(req.listing_ids))
     try:
-        return evaluate_from_url(str(req.url))
+        # 批量评估走同步实现，整体放线程池，避免阻塞事件循环
+        result = await run_in_threadpool(evaluate_batch, urls=[str(u) for u in req.urls], listing_ids=req.listing_ids)
+        return FastJSONResponse(result)   # 直接编码，跳过 jsonable_encoder 二次遍历
     except ValueError as e:
-        logger.warning(f"⚠️ 参数错误: {e}")
+        logger.warning("⚠️ 参数错误: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.exception(f"💥 服务异常: {e}")
+        logger.exception("💥 服务异常: %s", e)
         raise HTTPException(status_code=500, detail="internal server error")
 
 @app.get("/api/evaluate/{listing_id}")
-async def api_evaluate_by_id(listing_id: str) -> Dict[str, Any]:
-    logger.info(f"🔍 按 listing_id 评估: {listing_id}")
+async def api_evaluate_by_id(listing_id: str, request: Request) -> Response:
+    hot_logger.info("🔍 按 listing_id 评估: %s", listing_id)
+    try:
+        body, etag = await evaluate_json_by_listing_id_async(listing_id)
+        return cached_json_response(request, body, etag)
+    except ValueError as e:
+        logger.warning("⚠️ 参数错误: %s", e)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception("💥 服务异常: %s", e)
+        raise HTTPException(status_code=500, detail="internal server error")
+
+@app.get("/api/cohort/{full_key:path}/{year}/evaluations")
+async def api_cohort_evaluations(
+        full_key: str,
+        year: int,
+        recommended_only: bool = False,
+        limit: Optional[int] = Query(None, ge=1),
+) -> StreamingResponse:
+    # 整个 cohort 的评估结果逐行输出（NDJSON，每行一个与单条接口相同的 JSON）；full_key 可含 "/"
+    hot_logger.info("🔍 cohort 流式评估: %s / %s recommended_only=%s limit=%s", full_key, year, recommended_only, limit)
+    try:
+        stream = await open_cohort_stream(full_key, year, recommended_only=recommended_only, limit=limit)
+        return StreamingResponse(stream, media_type="application/x-ndjson")
+    except ValueError as e:
+        logger.warning("⚠️ 参数错误: %s", e)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception("💥 服务异常: %s", e)
+        raise HTTPException(status_code=500, detail="internal server error")
+
+@app.get("/api/best-deals")
+async def api_best_deals(
+        request: Request,
+        sort_by: str = "price_saving",
+        limit: int = 20,
+        full_key_prefix: Optional[str] = None,
+        year_min: Optional[int] = None,
+        year_max: Optional[int] = None,
+        powertrain: Optional[str] = None,
+) -> Response:
+    # 全表推荐车源 Top-N（price_saving / mileage_saving 降序），读预计算结果表
+    hot_logger.info("🔍 best deals: sort_by=%s limit=%d prefix=%s year=%s~%s powertrain=%s",
+                    sort_by, limit, full_key_prefix, year_min, year_max, powertrain)
     try:
-        return evaluate_by_listing_id(listing_id)
+        body, etag = await best_deals_json_async(sort_by, limit, full_key_prefix, year_min, year_max, powertrain)
+        return cached_json_response(request, body, etag)
     except ValueError as e:
-        logger.warning(f"⚠️ 参数错误: {e}")
+        logger.warning("⚠️ 参数错误: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.exception(f"💥 服务异常: {e}")
+        logger.exception("💥 服务异常: %s", e)
         raise HTTPException(status_code=500, detail="internal server error")
 
 # ===== 开发启动（WatchFilesReload + 启动信息打印，纯 Lifespan 版）=====
@@ -1,12 +1,18 @@
 # car_value_evaluator.py
 # -*- coding: utf-8 -*-
 
-from typing import List, Dict, Any, Tuple
+from contextlib import nullcontext
+from typing import List, Dict, Any, Tuple, Optional, Iterator, Callable, ContextManager
 import json
+import numpy as np
 import pandas as pd
 
+from core.cohort_stats import CohortStats, FIELD_DEPR_RATE, QUANTILE_LEVELS
+from core.quantile_sketch import CohortSketch
+
 # 使用有人味的文案生成器（哈希稳定变体；不需要 seed）
 from core.textgen.advice_writer import compose_advice
+from utils.metrics import span
 
 # =============================
 # 小工具（最简实现，不做校验）
@@ -30,16 +36,46 @@ def simple_rank(df: pd.DataFrame, row: pd.Series, field: str, *, ascending_bette
     value  = row[field]
     return int((series < value).sum() + 1) if ascending_better else int((series > value).sum() + 1)
 
+def cohort_size(df: pd.DataFrame, stats: Optional[CohortStats] = None) -> int:
+    return stats.n if stats is not None else int(len(df))
+
+# =============================
+# 列声明：每个评估函数声明自己读取的列（row = 目标车源，cohort = 同款样本）
+# 服务层据此生成窄查询，不再 SELECT *
+# =============================
+def uses_columns(row: Tuple[str, ...] = (), cohort: Tuple[str, ...] = ()):
+    def deco(fn):
+        fn.row_columns    = tuple(row)
+        fn.cohort_columns = tuple(cohort)
+        return fn
+    return deco
+
+# =============================
+# 推荐判定阈值（单条 / 整个 cohort 向量化共用；分位点见 QUANTILE_LEVELS：(无信任, 有信任)）
+# =============================
+RECOMMEND_MIN_SAMPLES = 20     # cohort 样本数下限
+RECOMMEND_HOT_RATIO   = 0.10   # 热度前 10% 兜底为“热度好”
+NOT_RECOMMENDED_FLAGS = {"ok_price": False, "ok_mile": False, "ok_depr": False, "hot_ok": False}
+
 # =============================
 # 评估函数（自包含常量）
+# stats：可选的 CohortStats（每个 cohort 预构建一次）；传入时排名/分位走二分查表，不再扫 df
+#        也可传 CohortSketch（大 cohort 流式构建的分位数草图）：分位阈值 / 排名为估计值，误差界见 quantile_sketch
+# 无 pandas 路径：row 可为普通 dict（游标直取），传 stats 时 df 可为 None，输出与 Series/DataFrame 路径一致
 # =============================
-def eval_price_saving(df: pd.DataFrame, row: pd.Series) -> Dict[str, Any]:
+@uses_columns(row=("price_saving", "actual_price", "y_pred"), cohort=("price_saving",))
+def eval_price_saving(df: pd.DataFrame, row: pd.Series, stats: Optional[CohortStats] = None, *, rank: Optional[int] = None) -> Dict[str, Any]:
     price_saving_field = "price_saving"
     actual_price_field = "actual_price"
     y_pred_field       = "y_pred"
 
-    rank  = simple_rank(df, row, price_saving_field, ascending_better=False)
-    n     = int(len(df))
+    if rank is not None:
+        pass  # 已由 evaluate_cohort 向量化算好
+    elif stats is not None:
+        rank = stats.rank_desc(price_saving_field, row[price_saving_field])
+    else:
+        rank = simple_rank(df, row, price_saving_field, ascending_better=False)
+    n     = cohort_size(df, stats)
     value = row[price_saving_field]
 
     return {
@@ -50,14 +86,20 @@ def eval_price_saving(df: pd.DataFrame, row: pd.Series) -> Dict[str, Any]:
         "msg": f"价格回血 {value}，排 {rank}/{n}"
     }
 
-def eval_mileage_saving(df: pd.DataFrame, row: pd.Series) -> Dict[str, Any]:
+@uses_columns(row=("mileage_saving", "mileage", "mileage_y_pred", "price_per_km"), cohort=("mileage_saving",))
+def eval_mileage_saving(df: pd.DataFrame, row: pd.Series, stats: Optional[CohortStats] = None, *, rank: Optional[int] = None) -> Dict[str, Any]:
     mileage_saving_field = "mileage_saving"
     mileage_field        = "mileage"
     mileage_y_pred_field = "mileage_y_pred"
     price_per_km_field   = "price_per_km"
 
-    rank  = simple_rank(df, row, mileage_saving_field, ascending_better=False)
-    n     = int(len(df))
+    if rank is not None:
+        pass  # 已由 evaluate_cohort 向量化算好
+    elif stats is not None:
+        rank = stats.rank_desc(mileage_saving_field, row[mileage_saving_field])
+    else:
+        rank = simple_rank(df, row, mileage_saving_field, ascending_better=False)
+    n     = cohort_size(df, stats)
     value = row[mileage_saving_field]
 
     return {
@@ -69,15 +111,21 @@ def eval_mileage_saving(df: pd.DataFrame, row: pd.Series) -> Dict[str, Any]:
         "msg": f"里程回血 {value}，排 {rank}/{n}"
     }
 
-def eval_expected_depreciation(df: pd.DataFrame, row: pd.Series) -> Dict[str, Any]:
+@uses_columns(row=("expected_depreciation", "y_pred", "next_bin_avg_price"), cohort=("y_pred", "next_bin_avg_price"))
+def eval_expected_depreciation(df: pd.DataFrame, row: pd.Series, stats: Optional[CohortStats] = None, *, rank: Optional[int] = None) -> Dict[str, Any]:
     depreciation_field       = "expected_depreciation"
     y_pred_field             = "y_pred"
     next_bin_avg_price_field = "next_bin_avg_price"
 
-    rates = (df[y_pred_field] - df[next_bin_avg_price_field]) / df[y_pred_field]
     rate  = (row[y_pred_field] - row[next_bin_avg_price_field]) / row[y_pred_field]
-    rank  = int((rates < rate).sum() + 1)   # 贬值率越小越好
-    n     = int(len(df))
+    if rank is not None:
+        pass  # 已由 evaluate_cohort 向量化算好
+    elif stats is not None:
+        rank = stats.rank_asc(FIELD_DEPR_RATE, rate)   # 贬值率越小越好
+    else:
+        rates = (df[y_pred_field] - df[next_bin_avg_price_field]) / df[y_pred_field]
+        rank  = int((rates < rate).sum() + 1)   # 贬值率越小越好
+    n     = cohort_size(df, stats)
     value = row[depreciation_field]
 
     return {
@@ -89,7 +137,8 @@ def eval_expected_depreciation(df: pd.DataFrame, row: pd.Series) -> Dict[str, An
         "msg": f"贬值 {value}，贬值率 {round(rate*100, 2)}%，排 {rank}/{n}",
     }
 
-def eval_heat_rank(df: pd.DataFrame, row: pd.Series) -> Dict[str, Any]:
+@uses_columns(row=("heat_rank", "mileage_bin"))
+def eval_heat_rank(df: pd.DataFrame, row: pd.Series, stats: Optional[CohortStats] = None) -> Dict[str, Any]:
     heat_rank_field = "heat_rank"   # 全量热度排名（数值越小越好）
     bin_field       = "mileage_bin"
 
@@ -108,6 +157,7 @@ def eval_heat_rank(df: pd.DataFrame, row: pd.Series) -> Dict[str, Any]:
         "msg": f"全量热度排名：第 {value} 名" if value is not None else "全量热度：—"
     }
 
+@uses_columns(row=("certified", "accident_free", "carfax", "as_is"))
 def eval_trustworthiness(row: pd.Series) -> Dict[str, Any]:
     certified_field     = "certified"
     accident_free_field = "accident_free"
@@ -137,6 +187,7 @@ def eval_trustworthiness(row: pd.Series) -> Dict[str, Any]:
 
     return {"value_en": value_en, "value_zh": value_zh, "msg": msg}
 
+@uses_columns(row=("options",))
 def eval_options(row: pd.Series) -> Dict[str, Any]:
     options_field = "options"
     option_allowed = {
@@ -169,6 +220,7 @@ def eval_options(row: pd.Series) -> Dict[str, Any]:
         "msg": ("高价值配置：" + "，".join(opts_zh)) if opts_zh else "高价值配置：—"
     }
 
+@uses_columns(row=("safety_features",))
 def eval_safety_features(row: pd.Series) -> Dict[str, Any]:
     safety_field = "safety_features"
     safety_allowed = {
@@ -201,8 +253,12 @@ def eval_safety_features(row: pd.Series) -> Dict[str, Any]:
 # =============================
 # 推荐判定（仅返回布尔 + flags；不再生成文案）
 # =============================
-def decide_is_recommended(df: pd.DataFrame, row: pd.Series) -> Tuple[bool, Dict[str, bool]]:
-    min_samples         = 20
+@uses_columns(
+    row=("price_saving", "mileage_saving", "y_pred", "next_bin_avg_price", "heat_rank",
+         "certified", "accident_free", "carfax", "as_is"),
+    cohort=("price_saving", "mileage_saving", "y_pred", "next_bin_avg_price"),
+)
+def decide_is_recommended(df: pd.DataFrame, row: pd.Series, stats: Optional[CohortStats] = None) -> Tuple[bool, Dict[str, bool]]:
     price_field         = "price_saving"          # 越大越好
     mile_field          = "mileage_saving"        # 越大越好
     y_pred_field        = "y_pred"
@@ -213,26 +269,32 @@ def decide_is_recommended(df: pd.DataFrame, row: pd.Series) -> Tuple[bool, Dict[
     carfax_field        = "carfax"
     as_is_field         = "as_is"
 
-    n = int(len(df))
+    n = cohort_size(df, stats)
     # 样本太少：一律不推荐
-    if n < min_samples:
-        return False, {"ok_price": False, "ok_mile": False, "ok_depr": False, "hot_ok": False}
+    if n < RECOMMEND_MIN_SAMPLES:
+        return False, dict(NOT_RECOMMENDED_FLAGS)
     # AS-IS：一律不推荐
     if bool(row.get(as_is_field)):
-        return False, {"ok_price": False, "ok_mile": False, "ok_depr": False, "hot_ok": False}
+        return False, dict(NOT_RECOMMENDED_FLAGS)
 
     # 三个核心维度的分位阈值（无信任放宽）
-    depr_rates = (df[y_pred_field] - df[next_bin_avg_field]) / df[y_pred_field]
     row_depr   = (row[y_pred_field] - row[next_bin_avg_field]) / row[y_pred_field]
 
     has_trust = bool(row.get(certified_field) or row.get(accident_free_field) or row.get(carfax_field))
-    p_price = 0.75 if not has_trust else 0.70
-    p_mile  = 0.40 if not has_trust else 0.35
-    p_depr  = 0.60 if not has_trust else 0.65  # 贬值率越小越好（放宽=更高分位）
-
-    th_price = df[price_field].quantile(p_price)
-    th_mile  = df[mile_field].quantile(p_mile)
-    th_depr  = depr_rates.quantile(p_depr)
+    trust_idx = 1 if has_trust else 0
+    p_price = QUANTILE_LEVELS[price_field][trust_idx]       # 0.75 / 0.70
+    p_mile  = QUANTILE_LEVELS[mile_field][trust_idx]        # 0.40 / 0.35
+    p_depr  = QUANTILE_LEVELS[FIELD_DEPR_RATE][trust_idx]   # 0.60 / 0.65，贬值率越小越好（放宽=更高分位）
+
+    if stats is not None:
+        th_price = stats.quantile(price_field, p_price)
+        th_mile  = stats.quantile(mile_field, p_mile)
+        th_depr  = stats.quantile(FIELD_DEPR_RATE, p_depr)
+    else:
+        depr_rates = (df[y_pred_field] - df[next_bin_avg_field]) / df[y_pred_field]
+        th_price = df[price_field].quantile(p_price)
+        th_mile  = df[mile_field].quantile(p_mile)
+        th_depr  = depr_rates.quantile(p_depr)
 
     ok_price = row[price_field] >= th_price
     ok_mile  = row[mile_field]  >= th_mile
@@ -244,7 +306,7 @@ def decide_is_recommended(df: pd.DataFrame, row: pd.Series) -> Tuple[bool, Dict[
         heat_rank = int(row.get(heat_rank_field))
     except Exception:
         heat_rank = 10**9
-    hot_ok    = (heat_rank <= max(1, int(0.10 * n)))
+    hot_ok    = (heat_rank <= max(1, int(RECOMMEND_HOT_RATIO * n)))
 
     flags = {"ok_price": ok_price, "ok_mile": ok_mile, "ok_depr": ok_depr, "hot_ok": hot_ok}
     is_recommended = (wins >= 2) or (wins == 1 and hot_ok)
@@ -253,23 +315,48 @@ def decide_is_recommended(df: pd.DataFrame, row: pd.Series) -> Tuple[bool, Dict[
 # =============================
 # 聚合输出（单脚本只输出一个 json）
 # =============================
-def evaluate(df: pd.DataFrame, row: pd.Series) -> Dict[str, Any]:
+@uses_columns(row=("listing_id", "full_key", "year", "url"))
+def evaluate(df: pd.DataFrame, row: pd.Series, stats: Optional[CohortStats] = None) -> Dict[str, Any]:
+    return _evaluate_row(df, row, stats, timer=span)
+
+def _no_span(stage: str) -> ContextManager[None]:
+    return nullcontext()
+
+def _evaluate_row(
+        df: Optional[pd.DataFrame],
+        row: pd.Series,
+        stats: Optional[CohortStats],
+        ranks: Optional[Tuple[int, int, int]] = None,
+        decision: Optional[Tuple[bool, Dict[str, bool]]] = None,
+        timer: Callable[[str], ContextManager[None]] = _no_span,
+) -> Dict[str, Any]:
+    """
+    单条评估主体；ranks / decision 由 evaluate_cohort 向量化预先算好时直接使用。
+    timer：分段计时（evaluate 传 utils.metrics.span；整 cohort 评估不逐行计时）。
+    """
     listing_id_field = "listing_id"
     full_key_field   = "full_key"
     year_field       = "year"
     url_field        = "url"
 
-    sample_size = int(len(df))
-    price_res = eval_price_saving(df, row)
-    mile_res  = eval_mileage_saving(df, row)
-    depr_res  = eval_expected_depreciation(df, row)
-    heat_res  = eval_heat_rank(df, row)
-    trust_res = eval_trustworthiness(row)
-    opts_res  = eval_options(row)
-    saf_res   = eval_safety_features(row)
+    price_rank, mile_rank, depr_rank = ranks if ranks is not None else (None, None, None)
+
+    with timer("evaluate_metrics"):
+        sample_size = cohort_size(df, stats)
+        price_res = eval_price_saving(df, row, stats, rank=price_rank)
+        mile_res  = eval_mileage_saving(df, row, stats, rank=mile_rank)
+        depr_res  = eval_expected_depreciation(df, row, stats, rank=depr_rank)
+        heat_res  = eval_heat_rank(df, row, stats)
+        trust_res = eval_trustworthiness(row)
+        opts_res  = eval_options(row)
+        saf_res   = eval_safety_features(row)
 
     # 仅判定 True/False + flags（不再生成老文案）
-    is_recommended, flags = decide_is_recommended(df, row)
+    if decision is not None:
+        is_recommended, flags = decision
+    else:
+        with timer("evaluate_decide"):
+            is_recommended, flags = decide_is_recommended(df, row, stats)
 
     # 亮点（兼容前端）
     highlights = []
@@ -285,13 +372,14 @@ def evaluate(df: pd.DataFrame, row: pd.Series) -> Dict[str, Any]:
         "depr_rate":      depr_res.get("depreciation_rate"),  # 支持 0~1 或 0~100
         "heat_rank":      heat_res.get("value"),
     }
-    advice = compose_advice(
-        listing_id=str(row.get(listing_id_field)),
-        full_key=row.get(full_key_field, ""),
-        flags=flags,
-        metrics=metrics,
-        is_recommended=is_recommended,
-    )
+    with timer("compose_advice"):
+        advice = compose_advice(
+            listing_id=str(row.get(listing_id_field)),
+            full_key=row.get(full_key_field, ""),
+            flags=flags,
+            metrics=metrics,
+            is_recommended=is_recommended,
+        )
 
     return {
         "listing_id": str(row[listing_id_field]),
@@ -313,3 +401,143 @@ def evaluate(df: pd.DataFrame, row: pd.Series) -> Dict[str, Any]:
             "safety_features": saf_res,
         },
     }
+
+
+# =============================
+# 整个 cohort 向量化评估（每行结果与 evaluate(df, row) 完全一致）
+# 排名 = 一次排序 + searchsorted；分位阈值每个分位点只算一次；判定全部数组运算
+# =============================
+def _rank_desc_vec(sorted_vals: np.ndarray, values: np.ndarray) -> np.ndarray:
+    ranks = len(sorted_vals) - np.searchsorted(sorted_vals, values, side="right") + 1
+    return np.where(np.isnan(values), 1, ranks)
+
+def _rank_asc_vec(sorted_vals: np.ndarray, values: np.ndarray) -> np.ndarray:
+    ranks = np.searchsorted(sorted_vals, values, side="left") + 1
+    return np.where(np.isnan(values), 1, ranks)
+
+def _truthy_vec(series: pd.Series) -> np.ndarray:
+    # 与 bool(x) 口径一致（NaN 为 True，None 为 False）
+    return series.to_numpy().astype(bool)
+
+def _heat_rank_vec(series: pd.Series) -> np.ndarray:
+    # 与 int(row.get(...)) + 异常兜底 10**9 口径一致
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        vals = series.to_numpy(dtype="float64", na_value=np.nan)
+        return np.where(np.isfinite(vals), np.trunc(np.nan_to_num(vals, nan=0.0, posinf=0.0, neginf=0.0)), 10**9)
+    out = []
+    for x in series.to_numpy():
+        try:
+            out.append(int(x))
+        except Exception:
+            out.append(10**9)
+    return np.asarray(out, dtype="float64")
+
+def _decide_cohort(df: pd.DataFrame, stats: CohortStats, price: np.ndarray, mile: np.ndarray, rates: np.ndarray) -> List[Tuple[bool, Dict[str, bool]]]:
+    price_field = "price_saving"
+    mile_field  = "mileage_saving"
+    size        = len(df)
+    n           = stats.n
+
+    if n < RECOMMEND_MIN_SAMPLES:
+        return [(False, dict(NOT_RECOMMENDED_FLAGS)) for _ in range(size)]
+
+    as_is     = _truthy_vec(df["as_is"])
+    has_trust = _truthy_vec(df["certified"]) | _truthy_vec(df["accident_free"]) | _truthy_vec(df["carfax"])
+
+    def thresholds(field: str) -> np.ndarray:
+        p_no, p_yes = QUANTILE_LEVELS[field]
+        return np.where(has_trust, stats.quantile(field, p_yes), stats.quantile(field, p_no))
+
+    ok_price = price >= thresholds(price_field)
+    ok_mile  = mile  >= thresholds(mile_field)
+    ok_depr  = rates <= thresholds(FIELD_DEPR_RATE)
+    wins     = ok_price.astype(int) + ok_mile.astype(int) + ok_depr.astype(int)
+    hot_ok   = _heat_rank_vec(df["heat_rank"]) <= max(1, int(RECOMMEND_HOT_RATIO * n))
+    is_rec   = (wins >= 2) | ((wins == 1) & hot_ok)
+
+    decisions = []
+    for i in range(size):
+        if as_is[i]:
+            decisions.append((False, dict(NOT_RECOMMENDED_FLAGS)))
+            continue
+        flags = {"ok_price": ok_price[i], "ok_mile": ok_mile[i], "ok_depr": ok_depr[i], "hot_ok": bool(hot_ok[i])}
+        decisions.append((bool(is_rec[i]), flags))
+    return decisions
+
+def iter_evaluate_cohort(
+        df: pd.DataFrame,
+        stats: Optional[CohortStats] = None,
+        recommended_only: bool = False,
+        limit: Optional[int] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    逐行产出整个 cohort 的评估结果（生成器，结果按 df 行序）。
+    排名/贬值率/推荐判定先整体向量化算好，之后每行只做拼装 + 文案生成。
+    df 可以只是 cohort 的一部分（分块流式评估），此时 stats 必须是整个 cohort 的统计（CohortStats 或 CohortSketch）。
+    recommended_only / limit 在拼装之前生效：被过滤掉的行不生成结果与文案。
+    """
+    price_field = "price_saving"
+    mile_field  = "mileage_saving"
+    y_pred_field       = "y_pred"
+    next_bin_avg_field = "next_bin_avg_price"
+
+    if stats is None:
+        stats = CohortStats.from_frame(df)
+
+    price = df[price_field].to_numpy(dtype="float64", na_value=np.nan)
+    mile  = df[mile_field].to_numpy(dtype="float64", na_value=np.nan)
+    y     = df[y_pred_field].to_numpy(dtype="float64", na_value=np.nan)
+    nb    = df[next_bin_avg_field].to_numpy(dtype="float64", na_value=np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rates = (y - nb) / y
+
+    if isinstance(stats, CohortSketch):
+        price_ranks = stats.ranks_desc(price_field, price)
+        mile_ranks  = stats.ranks_desc(mile_field, mile)
+        depr_ranks  = stats.ranks_asc(FIELD_DEPR_RATE, rates)
+    else:
+        price_ranks = _rank_desc_vec(stats.sorted[price_field], price)
+        mile_ranks  = _rank_desc_vec(stats.sorted[mile_field], mile)
+        depr_ranks  = _rank_asc_vec(stats.sorted[FIELD_DEPR_RATE], rates)
+    decisions   = _decide_cohort(df, stats, price, mile, rates)
+
+    # 行取值与 df.iloc[i] 相同（列数组按位置取 numpy 标量），但无需每行构建 Series
+    columns = {c: df[c].to_numpy() for c in df.columns}
+    emitted = 0
+    for i in range(len(df)):
+        if limit is not None and emitted >= limit:
+            return
+        if recommended_only and not decisions[i][0]:
+            continue
+        emitted += 1
+        row   = {c: arr[i] for c, arr in columns.items()}
+        ranks = (int(price_ranks[i]), int(mile_ranks[i]), int(depr_ranks[i]))
+        yield _evaluate_row(None, row, stats, ranks=ranks, decision=decisions[i])
+
+def evaluate_cohort(df: pd.DataFrame, stats: Optional[CohortStats] = None) -> List[Dict[str, Any]]:
+    """整个 cohort 一次评估：返回每行结果（与逐行调用 evaluate(df, row) 输出一致）"""
+    return list(iter_evaluate_cohort(df, stats))
+
+# =============================
+# 列清单（服务层生成投影用）
+# =============================
+EVALUATORS = [
+    evaluate,
+    eval_price_saving,
+    eval_mileage_saving,
+    eval_expected_depreciation,
+    eval_heat_rank,
+    eval_trustworthiness,
+    eval_options,
+    eval_safety_features,
+    decide_is_recommended,
+]
+
+def required_columns() -> Tuple[List[str], List[str]]:
+    """
+    汇总所有评估函数声明的列（保序去重）。
+    返回：(row_columns, cohort_columns) —— 目标车源要全部评估列；cohort 只要数值列。
+    """
+    row_cols    = list(dict.fromkeys(c for fn in EVALUATORS for c in fn.row_columns))
+    cohort_cols = list(dict.fromkeys(c for fn in EVALUATORS for c in fn.cohort_columns))
+    return row_cols, cohort_cols
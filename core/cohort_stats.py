@@ -0,0 +1,149 @@
+# core/cohort_stats.py
+# -*- coding: utf-8 -*-
+"""
+cohort 统计索引：每个 cohort 只构建一次（排序 + 预计算分位数），
+之后排名 = searchsorted 二分查找（O(log n)），分位阈值 = 查表。
+口径与 pandas 完全一致：比较时忽略 NaN，分位数为 linear 插值。
+"""
+
+from typing import Any, Dict, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+__all__ = ["CohortStats", "TargetAggregates", "FIELD_DEPR_RATE", "QUANTILE_LEVELS"]
+
+# ===================== 字段与预计算分位点 =====================
+FIELD_PRICE_SAVING   = "price_saving"
+FIELD_MILEAGE_SAVING = "mileage_saving"
+FIELD_Y_PRED         = "y_pred"
+FIELD_NEXT_BIN_AVG   = "next_bin_avg_price"
+FIELD_DEPR_RATE      = "depr_rate"        # 派生：(y_pred - next_bin_avg_price) / y_pred
+
+# decide_is_recommended 用到的分位点（无信任 / 有信任），构建时一次算好
+QUANTILE_LEVELS: Dict[str, Tuple[float, ...]] = {
+    FIELD_PRICE_SAVING:   (0.75, 0.70),
+    FIELD_MILEAGE_SAVING: (0.40, 0.35),
+    FIELD_DEPR_RATE:      (0.60, 0.65),
+}
+
+
+def _is_nan(x: Any) -> bool:
+    return x is None or x != x
+
+
+def _sorted_finite(values: Any) -> np.ndarray:
+    arr = np.asarray(values, dtype="float64")
+    arr = arr[~np.isnan(arr)]
+    arr.sort()
+    return arr
+
+
+class CohortStats:
+    def __init__(self, price_saving: Any, mileage_saving: Any, y_pred: Any, next_bin_avg_price: Any, n: int):
+        # ======== 派生：贬值率（与 evaluator 相同公式） ========
+        y_pred   = np.asarray(y_pred, dtype="float64")
+        next_bin = np.asarray(next_bin_avg_price, dtype="float64")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            depr_rates = (y_pred - next_bin) / y_pred
+
+        # ======== 排序数组（已剔除 NaN） ========
+        self.n = int(n)                                        # cohort 样本数（含 NaN 行，与 len(df) 一致）
+        self.sorted: Dict[str, np.ndarray] = {
+            FIELD_PRICE_SAVING:   _sorted_finite(price_saving),
+            FIELD_MILEAGE_SAVING: _sorted_finite(mileage_saving),
+            FIELD_DEPR_RATE:      _sorted_finite(depr_rates),
+        }
+
+        # ======== 预计算分位数 ========
+        self._quantiles: Dict[Tuple[str, float], float] = {}
+        for field, levels in QUANTILE_LEVELS.items():
+            for p in levels:
+                self._quantiles[(field, p)] = self._compute_quantile(field, p)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "CohortStats":
+        return cls(
+            price_saving=df[FIELD_PRICE_SAVING].to_numpy(dtype="float64", na_value=np.nan),
+            mileage_saving=df[FIELD_MILEAGE_SAVING].to_numpy(dtype="float64", na_value=np.nan),
+            y_pred=df[FIELD_Y_PRED].to_numpy(dtype="float64", na_value=np.nan),
+            next_bin_avg_price=df[FIELD_NEXT_BIN_AVG].to_numpy(dtype="float64", na_value=np.nan),
+            n=len(df),
+        )
+
+    @classmethod
+    def from_records(cls, records: Sequence[Sequence[Any]], keys: Sequence[str]) -> "CohortStats":
+        """
+        直接由数据库游标结果构建（不经过 DataFrame）：records 为行 tuple 列表，keys 为列名。
+        None → NaN、Decimal → float，与 pd.read_sql(coerce_float=True) 口径一致。
+        """
+        index   = {k: i for i, k in enumerate(keys)}
+        columns = list(zip(*records)) if records else [()] * len(keys)
+
+        def col(field: str) -> np.ndarray:
+            return np.array(columns[index[field]], dtype="float64")
+
+        return cls(
+            price_saving=col(FIELD_PRICE_SAVING),
+            mileage_saving=col(FIELD_MILEAGE_SAVING),
+            y_pred=col(FIELD_Y_PRED),
+            next_bin_avg_price=col(FIELD_NEXT_BIN_AVG),
+            n=len(records),
+        )
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(a.nbytes for a in self.sorted.values()))
+
+    # ======== 排名（1 起；与 simple_rank 口径一致） ========
+    def rank_desc(self, field: str, value: Any) -> int:
+        """越大越好：1 + 严格大于 value 的个数"""
+        if _is_nan(value):
+            return 1
+        arr = self.sorted[field]
+        return int(len(arr) - np.searchsorted(arr, value, side="right") + 1)
+
+    def rank_asc(self, field: str, value: Any) -> int:
+        """越小越好：1 + 严格小于 value 的个数"""
+        if _is_nan(value):
+            return 1
+        arr = self.sorted[field]
+        return int(np.searchsorted(arr, value, side="left") + 1)
+
+    # ======== 分位数（预计算命中直接返回；其他分位点现算并记住） ========
+    def quantile(self, field: str, p: float) -> float:
+        key = (field, p)
+        q = self._quantiles.get(key)
+        if q is None:
+            q = self._compute_quantile(field, p)
+            self._quantiles[key] = q
+        return q
+
+    def _compute_quantile(self, field: str, p: float) -> float:
+        arr = self.sorted[field]
+        if len(arr) == 0:
+            return np.float64(np.nan)
+        # 与 Series.quantile 相同的计算路径（百分位 + linear 插值）
+        return np.percentile(arr, p * 100, method="linear")
+
+
+class TargetAggregates:
+    """
+    单个目标车源相对其 cohort 的聚合结果（由数据库一次查询算好：样本数、排名、分位阈值）。
+    接口与 CohortStats 相同，可直接传给 evaluator 的 stats 参数；排名只对该目标车源有效。
+    """
+
+    def __init__(self, n: int, ranks: Dict[str, int], quantiles: Dict[Tuple[str, float], float]):
+        self.n          = int(n)
+        self.ranks      = ranks         # field -> rank（1 起）
+        self._quantiles = quantiles     # (field, p) -> 阈值
+
+    def rank_desc(self, field: str, value: Any) -> int:
+        return int(self.ranks[field])
+
+    def rank_asc(self, field: str, value: Any) -> int:
+        return int(self.ranks[field])
+
+    def quantile(self, field: str, p: float) -> float:
+        q = self._quantiles[(field, p)]
+        return np.float64(np.nan) if q is None else q
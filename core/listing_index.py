@@ -0,0 +1,162 @@
+# core/listing_index.py
+# -*- coding: utf-8 -*-
+"""
+listing_id → (cohort, 行号) 内存索引：排好序的 int64 listing_id 数组 + 平行的 cohort 编号 / 行号数组，
+查找 = 一次 np.searchsorted 二分（O(log n)，无数据库往返）。百万行约 20MB（ids 8B + cohort 4B + 行号 8B）。
+非规范数字的 listing_id（含字母、前导 0 等）放在一个小字典里兜底，与数据库的文本等值比较口径一致。
+"""
+
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+__all__ = ["ListingIndex", "ListingIndexBuilder"]
+
+CohortKey = Tuple[str, int]
+
+NO_ROW    = -1       # 未记录行号（数据库模式只需要 cohort）
+NO_COHORT = -1       # full_key / year 为 NULL：没有可用的 cohort
+
+
+def _parse_id(listing_id: Any) -> Optional[int]:
+    """
+    规范 ASCII 十进制字符串 → int（str(int(x)) == x 才算，避免 "007" 与 "7" 混淆）；否则 None。
+    isdigit 对全角 / 阿拉伯-印度数字、上标等也为 True（int("١٢") == 12，int("²") 直接报错），须先限定 ASCII。
+    """
+    s = str(listing_id)
+    if not (s.isascii() and s.isdigit()) or len(s) > 18 or (s[0] == "0" and len(s) > 1):
+        return None
+    return int(s)
+
+
+class ListingIndex:
+    def __init__(self, ids: np.ndarray, cohorts: np.ndarray, rows: Optional[np.ndarray], cohort_keys: List[CohortKey],
+                 extra: Optional[Dict[str, Tuple[int, int]]] = None, version: Optional[str] = None):
+        self.ids         = ids              # int64，升序、唯一
+        self.cohorts     = cohorts          # int32，cohort_keys 下标（NO_COHORT 表示无）
+        self.rows        = rows             # int64 行号（快照中的行位置），数据库模式为 None
+        self.cohort_keys = cohort_keys
+        self.extra       = extra or {}      # 非规范数字 id → (cohort, row)
+        self.version     = version
+
+    # ======== 查找 ========
+    def _locate(self, listing_id: Any) -> Optional[Tuple[int, int]]:
+        key = _parse_id(listing_id)
+        if key is None:
+            return self.extra.get(str(listing_id))
+        k = int(np.searchsorted(self.ids, key))
+        if k < len(self.ids) and self.ids[k] == key:
+            return int(self.cohorts[k]), (int(self.rows[k]) if self.rows is not None else NO_ROW)
+        return None
+
+    def __contains__(self, listing_id: Any) -> bool:
+        return self._locate(listing_id) is not None
+
+    def cohort_of(self, listing_id: Any) -> Optional[CohortKey]:
+        hit = self._locate(listing_id)
+        if hit is None or hit[0] == NO_COHORT:
+            return None
+        return self.cohort_keys[hit[0]]
+
+    def row_of(self, listing_id: Any) -> Optional[int]:
+        hit = self._locate(listing_id)
+        if hit is None or hit[1] == NO_ROW:
+            return None
+        return hit[1]
+
+    def __len__(self) -> int:
+        return len(self.ids) + len(self.extra)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.ids.nbytes + self.cohorts.nbytes + (self.rows.nbytes if self.rows is not None else 0))
+
+    # ======== 持久化（快照目录内；load 默认只读 mmap，多进程共享页缓存） ========
+    def save(self, prefix: str) -> None:
+        self.ids.tofile(prefix + ".ids.bin")
+        self.cohorts.tofile(prefix + ".cohorts.bin")
+        if self.rows is not None:
+            self.rows.tofile(prefix + ".rows.bin")
+        meta = {
+            "cohort_keys": [list(k) for k in self.cohort_keys],
+            "extra":       {k: list(v) for k, v in self.extra.items()},
+            "version":     self.version,
+            "has_rows":    self.rows is not None,
+        }
+        with open(prefix + ".json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, prefix: str, mmap: bool = True) -> "ListingIndex":
+        with open(prefix + ".json", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        def array(part: str, dtype) -> np.ndarray:
+            path = f"{prefix}.{part}.bin"
+            if mmap and os.path.getsize(path) > 0:
+                return np.memmap(path, dtype=dtype, mode="r")
+            return np.fromfile(path, dtype=dtype)
+
+        return cls(
+            ids=array("ids", np.int64),
+            cohorts=array("cohorts", np.int32),
+            rows=array("rows", np.int64) if meta["has_rows"] else None,
+            cohort_keys=[(k, int(y)) for k, y in meta["cohort_keys"]],
+            extra={k: (int(c), int(r)) for k, (c, r) in meta["extra"].items()},
+            version=meta.get("version"),
+        )
+
+
+class ListingIndexBuilder:
+    """
+    逐行累积后一次性排序：add(listing_id, full_key, year[, row])；
+    重复的 listing_id 保留先出现的一行（与 LIMIT 1 / 快照中第一行一致）。
+    """
+
+    def __init__(self):
+        self._ids: List[int]     = []
+        self._cohorts: List[int] = []
+        self._rows: List[int]    = []
+        self._extra: Dict[str, Tuple[int, int]] = {}
+        self._key_ids: Dict[CohortKey, int] = {}
+        self.cohort_keys: List[CohortKey] = []
+
+    def _cohort_id(self, full_key: Any, year: Any) -> int:
+        if full_key is None or year is None:
+            return NO_COHORT
+        key = (full_key, int(year))
+        cid = self._key_ids.get(key)
+        if cid is None:
+            cid = self._key_ids[key] = len(self.cohort_keys)
+            self.cohort_keys.append(key)
+        return cid
+
+    def add(self, listing_id: Any, full_key: Any, year: Any, row: int = NO_ROW) -> None:
+        if listing_id is None:
+            return
+        cid = self._cohort_id(full_key, year)
+        key = _parse_id(listing_id)
+        if key is None:
+            self._extra.setdefault(str(listing_id), (cid, row))
+            return
+        self._ids.append(key)
+        self._cohorts.append(cid)
+        self._rows.append(row)
+
+    def build(self, with_rows: bool = True, version: Optional[str] = None) -> ListingIndex:
+        ids   = np.array(self._ids, dtype=np.int64)
+        order = np.argsort(ids, kind="stable")
+        ids   = ids[order]
+        keep  = np.ones(len(ids), dtype=bool)
+        keep[1:] = ids[1:] != ids[:-1]                      # 稳定排序后相同 id 的第一条即最先出现的
+        order = order[keep]
+        return ListingIndex(
+            ids=ids[keep],
+            cohorts=np.array(self._cohorts, dtype=np.int32)[order],
+            rows=np.array(self._rows, dtype=np.int64)[order] if with_rows else None,
+            cohort_keys=list(self.cohort_keys),
+            extra=dict(self._extra),
+            version=version,
+        )
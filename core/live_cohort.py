@@ -0,0 +1,409 @@
+# core/live_cohort.py
+# -*- coding: utf-8 -*-
+"""
+可增量维护的 cohort 统计：白天新车源上架 / 下架时逐条 insert / remove，不重建整个 cohort。
+price_saving / mileage_saving / 贬值率 / 热度各一个有序多重集合（分桶有序列表 + 桶大小 Fenwick 树），
+插入、删除、排名、按名次取值都是 O(log n)（桶容量为常数）；分位阈值按 np.percentile(linear) 同一公式
+从相邻两个名次插值，与 CohortStats 重建结果逐位一致。
+
+接口与 CohortStats 相同（n / rank_desc / rank_asc / quantile），可直接作为 evaluator 的 stats 参数；
+每次更新后只重新判定"取值落在新旧阈值之间"的车源（以及热度名次在新旧上限之间的），
+返回其中 is_recommended 发生翻转的车源。代价 O(log n + 受影响车源数)；
+只有样本数跨过 RECOMMEND_MIN_SAMPLES 时全部车源的结论都会变，才整体重判一次。
+"""
+
+import math
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from core.car_value_evaluator import RECOMMEND_HOT_RATIO, RECOMMEND_MIN_SAMPLES, _decide_cohort, decide_is_recommended
+from core.cohort_stats import (
+    CohortStats, FIELD_DEPR_RATE, FIELD_MILEAGE_SAVING, FIELD_NEXT_BIN_AVG, FIELD_PRICE_SAVING, FIELD_Y_PRED,
+    QUANTILE_LEVELS,
+)
+
+__all__ = ["LiveCohortStats"]
+
+# ======== 参数变量 ========
+FIELD_LISTING_ID = "listing_id"
+FIELD_HEAT_RANK  = "heat_rank"
+DECISION_FIELDS  = (FIELD_PRICE_SAVING, FIELD_MILEAGE_SAVING, FIELD_Y_PRED, FIELD_NEXT_BIN_AVG, FIELD_HEAT_RANK,
+                    "certified", "accident_free", "carfax", "as_is")     # decide_is_recommended 读取的列
+BUCKET_LOAD      = 512        # 有序列表每桶容量（超过 2 倍拆分）
+NO_HEAT          = 10 ** 9    # 热度缺失 / 无法解析（与 decide_is_recommended 口径一致）
+
+Key = Tuple[float, int]       # (取值, 成员编号)：同值按编号区分，便于按成员删除
+
+
+# ===================== 有序多重集合 =====================
+class _SortedKeys:
+    """分桶有序列表；Fenwick 树记录各桶大小，名次 ↔ 位置换算 O(log 桶数)"""
+
+    def __init__(self, keys: List[Key] = (), load: int = BUCKET_LOAD):
+        keys = sorted(keys)
+        self._load    = load
+        self._len     = len(keys)
+        self._buckets = [keys[i:i + load] for i in range(0, len(keys), load)]
+        self._maxes   = [b[-1] for b in self._buckets]
+        self._rebuild()
+
+    def __len__(self) -> int:
+        return self._len
+
+    # ======== Fenwick（桶大小前缀和） ========
+    def _rebuild(self) -> None:
+        m = len(self._buckets)
+        tree = [0] * (m + 1)
+        for i, bucket in enumerate(self._buckets, 1):
+            tree[i] += len(bucket)
+            j = i + (i & -i)
+            if j <= m:
+                tree[j] += tree[i]
+        self._tree = tree
+
+    def _tree_add(self, i: int, delta: int) -> None:
+        i += 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, i: int) -> int:
+        """前 i 个桶的元素总数"""
+        total = 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _locate(self, pos: int) -> Tuple[int, int]:
+        """名次 pos（0 起）→ (桶下标, 桶内下标)"""
+        tree, i = self._tree, 0
+        step = 1 << (len(tree) - 1).bit_length()
+        while step:
+            j = i + step
+            if j < len(tree) and tree[j] <= pos:
+                i = j
+                pos -= tree[j]
+            step >>= 1
+        return i, pos
+
+    # ======== 增删 ========
+    def add(self, key: Key) -> None:
+        if not self._buckets:
+            self._buckets, self._maxes, self._len = [[key]], [key], 1
+            self._rebuild()
+            return
+        i = bisect_left(self._maxes, key)
+        if i == len(self._buckets):
+            i -= 1
+            self._buckets[i].append(key)
+            self._maxes[i] = key
+        else:
+            insort(self._buckets[i], key)
+        self._len += 1
+        bucket = self._buckets[i]
+        if len(bucket) > 2 * self._load:
+            self._buckets[i:i + 1] = [bucket[:self._load], bucket[self._load:]]
+            self._maxes[i:i + 1]   = [bucket[self._load - 1], bucket[-1]]
+            self._rebuild()
+        else:
+            self._tree_add(i, 1)
+
+    def remove(self, key: Key) -> None:
+        i = bisect_left(self._maxes, key)
+        bucket = self._buckets[i] if i < len(self._buckets) else []
+        j = bisect_left(bucket, key)
+        if j == len(bucket) or bucket[j] != key:
+            raise KeyError(key)
+        del bucket[j]
+        self._len -= 1
+        if bucket:
+            self._maxes[i] = bucket[-1]
+            self._tree_add(i, -1)
+        else:
+            del self._buckets[i], self._maxes[i]
+            self._rebuild()
+
+    # ======== 查询 ========
+    def bisect_left(self, key: Key) -> int:
+        i = bisect_left(self._maxes, key)
+        if i == len(self._buckets):
+            return self._len
+        return self._prefix(i) + bisect_left(self._buckets[i], key)
+
+    def bisect_right(self, key: Key) -> int:
+        i = bisect_right(self._maxes, key)
+        if i == len(self._buckets):
+            return self._len
+        return self._prefix(i) + bisect_right(self._buckets[i], key)
+
+    def __getitem__(self, pos: int) -> Key:
+        if pos < 0:
+            pos += self._len
+        if not 0 <= pos < self._len:
+            raise IndexError(pos)
+        i, j = self._locate(pos)
+        return self._buckets[i][j]
+
+    def irange(self, lo: float, hi: float) -> Iterator[int]:
+        """取值在 [lo, hi] 内的成员编号"""
+        start = self.bisect_left((lo, -1))
+        stop  = self.bisect_right((hi, math.inf))
+        if start >= stop:
+            return
+        i, j = self._locate(start)
+        for _ in range(stop - start):
+            while j >= len(self._buckets[i]):
+                i, j = i + 1, 0
+            yield self._buckets[i][j][1]
+            j += 1
+
+    def values(self) -> np.ndarray:
+        return np.array([k[0] for bucket in self._buckets for k in bucket], dtype="float64")
+
+
+def _linear_percentile(keys: _SortedKeys, p: float) -> float:
+    """
+    与 np.percentile(sorted_arr, p * 100, method="linear") 相同的取点与插值步骤（含越界与 inf 的处理），
+    只需访问两个名次，O(log n)
+    """
+    n = len(keys)
+    if n == 0:
+        return np.float64(np.nan)
+    q = np.true_divide(np.float64(p * 100), 100)
+    v = (n - 1) * q
+    if v >= n - 1:
+        i = j = n - 1
+        gamma = v + 1                               # numpy 越界时 previous 记为 -1
+    elif v < 0:
+        i = j = 0
+        gamma = v
+    else:
+        i = int(math.floor(v))
+        j = i + 1
+        gamma = v - i
+    a, b = keys[i][0], keys[j][0]
+    diff = b - a
+    result = b - diff * (1 - gamma) if gamma >= 0.5 else a + diff * gamma
+    return np.float64(result)
+
+
+def _float(x: Any) -> float:
+    return np.nan if x is None or x is pd.NA else float(x)
+
+
+def _heat_rank(x: Any) -> int:
+    try:
+        return int(x)
+    except Exception:
+        return NO_HEAT
+
+
+# ===================== 可增量维护的 cohort 统计 =====================
+class _Member:
+    __slots__ = ("no", "row", "values", "heat", "is_recommended", "flags")
+
+    def __init__(self, no: int, row: Dict[str, Any], depr: float):
+        self.no     = no
+        self.row    = row                                       # decide_is_recommended 用到的列
+        self.values = {
+            FIELD_PRICE_SAVING:   row[FIELD_PRICE_SAVING],
+            FIELD_MILEAGE_SAVING: row[FIELD_MILEAGE_SAVING],
+            FIELD_DEPR_RATE:      depr,
+        }
+        self.heat  = _heat_rank(row.get(FIELD_HEAT_RANK))
+        self.is_recommended = False
+        self.flags: Dict[str, bool] = {}
+
+
+class LiveCohortStats:
+    def __init__(self):
+        self._members: Dict[str, _Member] = {}
+        self._by_no: Dict[int, str] = {}
+        self._next_no = 0
+        self.sorted_keys: Dict[str, _SortedKeys] = {f: _SortedKeys() for f in QUANTILE_LEVELS}
+        self._heat = _SortedKeys()
+        self._quantiles: Dict[Tuple[str, float], float] = {}
+        self._refresh_quantiles()
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, id_field: str = FIELD_LISTING_ID) -> "LiveCohortStats":
+        """由整个 cohort 的 DataFrame 构建（O(n log n)，之后逐条更新）；初始判定与 evaluate_cohort 一致"""
+        live = cls()
+        y  = df[FIELD_Y_PRED].to_numpy(dtype="float64", na_value=np.nan)
+        nb = df[FIELD_NEXT_BIN_AVG].to_numpy(dtype="float64", na_value=np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rates = (y - nb) / y
+        members = [live._new_member(str(lid), row, float(r)) for lid, row, r in zip(df[id_field], _rows(df), rates)]
+        for field in QUANTILE_LEVELS:
+            live.sorted_keys[field] = _SortedKeys([(m.values[field], m.no) for m in members if not math.isnan(m.values[field])])
+        live._heat = _SortedKeys([(m.heat, m.no) for m in members])
+        live._refresh_quantiles()
+
+        price = df[FIELD_PRICE_SAVING].to_numpy(dtype="float64", na_value=np.nan)
+        mile  = df[FIELD_MILEAGE_SAVING].to_numpy(dtype="float64", na_value=np.nan)
+        for member, (is_rec, flags) in zip(members, _decide_cohort(df, live, price, mile, rates)):
+            member.is_recommended, member.flags = is_rec, flags
+        return live
+
+    # ======== CohortStats 接口 ========
+    @property
+    def n(self) -> int:
+        return len(self._members)
+
+    def rank_desc(self, field: str, value: Any) -> int:
+        """越大越好：1 + 严格大于 value 的个数"""
+        if value is None or value != value:
+            return 1
+        keys = self.sorted_keys[field]
+        return len(keys) - keys.bisect_right((value, math.inf)) + 1
+
+    def rank_asc(self, field: str, value: Any) -> int:
+        """越小越好：1 + 严格小于 value 的个数"""
+        if value is None or value != value:
+            return 1
+        return self.sorted_keys[field].bisect_left((value, -1)) + 1
+
+    def quantile(self, field: str, p: float) -> float:
+        key = (field, p)
+        q = self._quantiles.get(key)
+        if q is None:
+            q = self._quantiles[key] = _linear_percentile(self.sorted_keys[field], p)
+        return q
+
+    def freeze(self) -> CohortStats:
+        """当前状态的只读 CohortStats（整 cohort 向量化评估 / 放入缓存用），O(n log n)"""
+        rows = [m.row for m in self._members.values()]
+        return CohortStats(
+            price_saving=[r[FIELD_PRICE_SAVING] for r in rows],
+            mileage_saving=[r[FIELD_MILEAGE_SAVING] for r in rows],
+            y_pred=[r[FIELD_Y_PRED] for r in rows],
+            next_bin_avg_price=[r[FIELD_NEXT_BIN_AVG] for r in rows],
+            n=len(rows),
+        )
+
+    # ======== 成员 ========
+    def __contains__(self, listing_id: Any) -> bool:
+        return str(listing_id) in self._members
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def verdict(self, listing_id: Any) -> Optional[Tuple[bool, Dict[str, bool]]]:
+        member = self._members.get(str(listing_id))
+        return None if member is None else (member.is_recommended, dict(member.flags))
+
+    # ======== 增量更新 ========
+    def insert(self, listing_id: Any, row: Mapping[str, Any]) -> dict:
+        """
+        新增一条车源（同一 listing_id 已存在时视为更新：先移除旧值）。
+        返回 {"listing_id", "is_recommended", "flags", "n", "flipped": [{"listing_id", "is_recommended", "flags"}]}，
+        flipped 为其他已有车源中 is_recommended 发生变化的（值为变化后的结论）。
+        """
+        listing_id = str(listing_id)
+        before = self._thresholds()
+        old = self._members.get(listing_id)
+        if old is not None:
+            self._detach(listing_id, old)
+        member = self._new_member(listing_id, row)
+        self._attach(member)
+        self._refresh_quantiles()
+        member.is_recommended, member.flags = decide_is_recommended(None, member.row, self)
+        return {
+            "listing_id": listing_id,
+            "is_recommended": member.is_recommended,
+            "flags": dict(member.flags),
+            "n": self.n,
+            "flipped": self._redecide(before, skip=listing_id),
+        }
+
+    def remove(self, listing_id: Any) -> dict:
+        """移除一条车源（下架）；不存在时抛 KeyError。返回 {"listing_id", "n", "flipped"}"""
+        listing_id = str(listing_id)
+        member = self._members.get(listing_id)
+        if member is None:
+            raise KeyError(listing_id)
+        before = self._thresholds()
+        self._detach(listing_id, member)
+        self._refresh_quantiles()
+        return {"listing_id": listing_id, "n": self.n, "flipped": self._redecide(before, skip=listing_id)}
+
+    # ======== 内部 ========
+    def _new_member(self, listing_id: str, row: Mapping[str, Any], depr: Optional[float] = None) -> _Member:
+        data = {f: row.get(f) for f in DECISION_FIELDS}
+        for f in (FIELD_PRICE_SAVING, FIELD_MILEAGE_SAVING, FIELD_Y_PRED, FIELD_NEXT_BIN_AVG):
+            data[f] = np.float64(_float(data[f]))               # 与 DataFrame 行取值同为 numpy 浮点
+        if depr is None:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                depr = float((data[FIELD_Y_PRED] - data[FIELD_NEXT_BIN_AVG]) / data[FIELD_Y_PRED])   # 与 CohortStats 相同（y_pred = 0 → ±inf）
+        member = _Member(self._next_no, data, depr)
+        self._next_no += 1
+        self._members[listing_id] = member
+        self._by_no[member.no] = listing_id
+        return member
+
+    def _attach(self, member: _Member) -> None:
+        for field, keys in self.sorted_keys.items():
+            if not math.isnan(member.values[field]):
+                keys.add((member.values[field], member.no))
+        self._heat.add((member.heat, member.no))
+
+    def _detach(self, listing_id: str, member: _Member) -> None:
+        for field, keys in self.sorted_keys.items():
+            if not math.isnan(member.values[field]):
+                keys.remove((member.values[field], member.no))
+        self._heat.remove((member.heat, member.no))
+        del self._members[listing_id], self._by_no[member.no]
+
+    def _refresh_quantiles(self) -> None:
+        self._quantiles = {
+            (field, p): _linear_percentile(self.sorted_keys[field], p)
+            for field, levels in QUANTILE_LEVELS.items() for p in levels
+        }
+
+    def _thresholds(self) -> Tuple[int, Dict[Tuple[str, float], float], int]:
+        return self.n, dict(self._quantiles), max(1, int(RECOMMEND_HOT_RATIO * self.n))
+
+    def _candidates(self, before: Tuple[int, Dict[Tuple[str, float], float], int]) -> Set[int]:
+        """判定可能变化的成员：取值落在新旧分位阈值之间 / 热度名次落在新旧上限之间"""
+        n_old, q_old, hot_old = before
+        if n_old < RECOMMEND_MIN_SAMPLES and self.n < RECOMMEND_MIN_SAMPLES:
+            return set()                                       # 样本不足：前后都是一律不推荐
+        if (n_old < RECOMMEND_MIN_SAMPLES) != (self.n < RECOMMEND_MIN_SAMPLES):
+            return set(self._by_no)
+        found: Set[int] = set()
+        for (field, p), old in q_old.items():
+            new = self._quantiles[(field, p)]
+            if old == new:
+                continue
+            if math.isnan(old) or math.isnan(new):               # 与 NaN 比较恒为 False：该维度全部重判
+                lo, hi = -math.inf, math.inf
+            else:
+                lo, hi = min(old, new), max(old, new)
+            found.update(self.sorted_keys[field].irange(lo, hi))
+        hot_new = max(1, int(RECOMMEND_HOT_RATIO * self.n))
+        if hot_new != hot_old:
+            found.update(self._heat.irange(min(hot_old, hot_new) + 1, max(hot_old, hot_new)))
+        return found
+
+    def _redecide(self, before: Tuple[int, Dict[Tuple[str, float], float], int], skip: str) -> List[dict]:
+        flipped = []
+        for no in self._candidates(before):
+            listing_id = self._by_no[no]
+            if listing_id == skip:
+                continue
+            member = self._members[listing_id]
+            is_rec, flags = decide_is_recommended(None, member.row, self)
+            if is_rec != member.is_recommended:
+                flipped.append({"listing_id": listing_id, "is_recommended": is_rec, "flags": dict(flags)})
+            member.is_recommended, member.flags = is_rec, flags
+        return flipped
+
+
+def _rows(df: pd.DataFrame) -> Iterator[Dict[str, Any]]:
+    columns = {c: df[c].to_numpy() for c in DECISION_FIELDS if c in df.columns}
+    for i in range(len(df)):
+        yield {c: arr[i] for c, arr in columns.items()}
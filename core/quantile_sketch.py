@@ -0,0 +1,339 @@
+# core/quantile_sketch.py
+# -*- coding: utf-8 -*-
+"""
+可合并的分位数草图（KLL）：大 cohort（热门车型跨大量车商、将来的区域级"市场" cohort）不必把整列取回内存排序，
+按块流式 update，分片各自构建后 merge，内存只与 k 和 log(n) 有关（默认 k=400，三个指标合计约 10KB）。
+
+KLLSketch：单个指标。层 h 的元素权重 2^h；某层超过容量时排序、随机保留奇数位或偶数位升到上一层（压缩）。
+  合并：merge 只把各层无损拼接（不压缩），压缩推迟到下一次查询 / 写入 / 序列化；
+    压缩用的随机位由 (seed, 层, count, 累计误差) 决定，种子按异或合并，且每次压缩后各层保持有序，
+    因此多个分片之间连续 merge（中途不查询）时，结果（含 to_bytes 字节）与合并顺序无关。
+  误差界（rank_error_bound，逐实例累计、确定性）：
+    一次 h 层压缩对任意查询值的计数误差不超过 2^h，草图记录所有压缩（含合并进来的）的累计值，
+    故 |估计名次 - 真实名次| <= rank_error_bound；quantile(p) 返回值落在真实 p ± rank_error_bound / count 分位之间。
+  典型误差（随机抵消，远小于上面的最坏情况）：与 DataSketches KLL 相同的容量规则（c = 2/3，最小宽度 8），
+    99% 置信下单个分位点的归一化名次误差约 2.3 / k^0.97（k=400 约 0.7%）；scripts/bench_quantile_sketch.py 实测。
+  样本数 <= k 时从未压缩：排名与分位数与 CohortStats 逐位一致。
+
+CohortSketch：一个 cohort 的三个判定指标（price_saving / mileage_saving / 贬值率）各一个 KLLSketch，
+接口与 CohortStats 相同（n / rank_desc / rank_asc / quantile），可直接作为 evaluator 的 stats 参数；
+排名为估计值（误差界同上），判定只用到分位阈值。
+"""
+
+import math
+import struct
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from core.cohort_stats import (
+    FIELD_DEPR_RATE, FIELD_MILEAGE_SAVING, FIELD_NEXT_BIN_AVG, FIELD_PRICE_SAVING, FIELD_Y_PRED, QUANTILE_LEVELS,
+)
+
+__all__ = ["KLLSketch", "CohortSketch", "DEFAULT_K"]
+
+# ======== 参数变量 ========
+DEFAULT_K     = 400        # 顶层容量；误差约与 1/k 成正比，每个指标只保留数百个值
+MIN_WIDTH     = 8          # 每层最小容量
+CAPACITY_RATE = 2 / 3      # 每往下一层容量乘以该系数
+SKETCH_FIELDS = (FIELD_PRICE_SAVING, FIELD_MILEAGE_SAVING, FIELD_DEPR_RATE)
+
+_HEADER = struct.Struct("<IQQQI")   # k, count, rank_error_bound, seed, 层数；之后每层长度（uint64）与 float64 数据
+_MASK64 = (1 << 64) - 1
+
+
+def _finite_or_inf(values: Any) -> np.ndarray:
+    """剔除 NaN（±inf 保留，与 CohortStats 口径一致）"""
+    arr = np.asarray(values, dtype="float64").ravel()
+    return arr[~np.isnan(arr)]
+
+
+def _coin(*parts: int) -> int:
+    """由整数确定的伪随机位（splitmix64 逐个混合）"""
+    x = 0
+    for part in parts:
+        x = (x + (part & _MASK64) + 0x9E3779B97F4A7C15) & _MASK64
+        x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+        x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+        x ^= x >> 31
+    return x & 1
+
+
+def _lerp(lo: float, hi: float, t: float) -> float:
+    if lo == hi or t == 0:
+        return lo
+    return lo + (hi - lo) * t if t < 0.5 else hi - (hi - lo) * (1 - t)
+
+
+# ===================== 单指标 KLL =====================
+class KLLSketch:
+    def __init__(self, k: int = DEFAULT_K, seed: int = 0):
+        if k < MIN_WIDTH:
+            raise ValueError(f"k must be >= {MIN_WIDTH}")
+        self.k      = int(k)
+        self.count  = 0                        # 已写入的非 NaN 元素数（= 各层权重之和）
+        self.levels: List[np.ndarray] = [np.empty(0, dtype="float64")]
+        self._bound   = 0                      # 累计压缩误差（名次，绝对值）
+        self._seed    = int(seed) & _MASK64
+        self._pending = False                  # merge 之后尚未压缩
+        self._view    = None                   # (排序后的元素, 累计权重前缀和[0 起])，查询时惰性构建
+
+    # ======== 写入 / 合并 ========
+    def update(self, values: Any) -> "KLLSketch":
+        """写入一批值（NaN 忽略）；整块追加到第 0 层后统一压缩"""
+        arr = _finite_or_inf(values)
+        if len(arr):
+            self.levels[0] = np.concatenate((self.levels[0], arr))
+            self.count += len(arr)
+            self._compress()
+        return self
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        """合并另一个分片的草图（原地，返回 self）：各层无损拼接、误差界相加，压缩推迟到下次使用"""
+        if other.k != self.k:
+            raise ValueError(f"cannot merge sketches with different k ({self.k} != {other.k})")
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0, dtype="float64"))
+        for h, items in enumerate(other.levels):
+            if len(items):
+                self.levels[h] = np.concatenate((self.levels[h], items))
+        self.count   += other.count
+        self._bound  += other._bound
+        self._seed   ^= other._seed
+        self._pending = True
+        self._view    = None
+        return self
+
+    def _capacity(self, h: int) -> int:
+        depth = len(self.levels) - 1 - h
+        return max(MIN_WIDTH, int(math.ceil(self.k * CAPACITY_RATE ** depth)))
+
+    def _compress(self) -> None:
+        self._view    = None
+        self._pending = False
+        h = 0
+        while h < len(self.levels):
+            items = self.levels[h]
+            if len(items) > self._capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0, dtype="float64"))
+                items  = np.sort(items)
+                odd    = len(items) % 2
+                pairs  = items[odd:]                                  # 奇数个时最小的一个留在本层
+                offset = _coin(self._seed, h, self.count, self._bound)
+                self.levels[h + 1] = np.concatenate((self.levels[h + 1], pairs[offset::2]))
+                self.levels[h]     = items[:odd].copy()
+                self._bound += 1 << h
+            h += 1
+        self.levels = [np.sort(items) for items in self.levels]       # 规范化：同一多重集合 → 同一状态
+
+    def _settle(self) -> None:
+        if self._pending:
+            self._compress()
+
+    # ======== 查询 ========
+    @property
+    def rank_error_bound(self) -> int:
+        self._settle()
+        return self._bound
+
+    @property
+    def is_exact(self) -> bool:
+        """从未压缩：保存的就是全部原始值"""
+        return self.rank_error_bound == 0
+
+    @property
+    def num_retained(self) -> int:
+        self._settle()
+        return int(sum(len(items) for items in self.levels))
+
+    def _sorted_view(self):
+        self._settle()
+        if self._view is None:
+            items   = np.concatenate(self.levels)
+            weights = np.concatenate([np.full(len(a), 1 << h, dtype="int64") for h, a in enumerate(self.levels)])
+            order   = np.argsort(items, kind="stable")
+            self._view = (items[order], np.concatenate(([0], np.cumsum(weights[order]))))
+        return self._view
+
+    def count_less(self, values: Any) -> np.ndarray:
+        """估计严格小于 value 的个数（向量化）"""
+        items, cum = self._sorted_view()
+        return cum[np.searchsorted(items, values, side="left")]
+
+    def count_greater(self, values: Any) -> np.ndarray:
+        """估计严格大于 value 的个数（向量化）"""
+        items, cum = self._sorted_view()
+        return self.count - cum[np.searchsorted(items, values, side="right")]
+
+    def quantile(self, p: float) -> float:
+        """linear 插值分位数；未压缩时与 np.percentile(method="linear") 逐位一致"""
+        if self.count == 0:
+            return np.float64(np.nan)
+        if self.is_exact:
+            return np.percentile(self.levels[0], p * 100, method="linear")
+        items, cum = self._sorted_view()
+        pos  = p * (self.count - 1)
+        low  = math.floor(pos)
+        high = min(low + 1, self.count - 1)
+        # 第 r 名（0 起）对应累计权重首次超过 r 的元素
+        lo_val, hi_val = items[np.searchsorted(cum, [low, high], side="right") - 1]
+        return np.float64(_lerp(lo_val, hi_val, pos - low))
+
+    @property
+    def nbytes(self) -> int:
+        self._settle()
+        return int(sum(a.nbytes for a in self.levels))
+
+    # ======== 序列化（分片在其他进程构建时传回合并） ========
+    def to_bytes(self) -> bytes:
+        self._settle()
+        sizes = [len(a) for a in self.levels]
+        head  = _HEADER.pack(self.k, self.count, self._bound, self._seed, len(sizes))
+        return head + struct.pack(f"<{len(sizes)}Q", *sizes) + b"".join(a.astype("<f8").tobytes() for a in self.levels)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "KLLSketch":
+        k, count, bound, seed, depth = _HEADER.unpack_from(data, 0)
+        offset = _HEADER.size
+        sizes  = struct.unpack_from(f"<{depth}Q", data, offset)
+        offset += 8 * depth
+        sketch = cls(k, seed=seed)
+        sketch.levels = []
+        for size in sizes:
+            sketch.levels.append(np.frombuffer(data, dtype="<f8", count=size, offset=offset).astype("float64"))
+            offset += 8 * size
+        sketch.count, sketch._bound = count, bound
+        return sketch
+
+
+# ===================== 一个 cohort 的判定指标 =====================
+class CohortSketch:
+    """
+    按块构建：CohortSketch.from_chunks(frames) 或逐块 update_frame / update_records；
+    分片合并：a.merge(b)（原地；连续合并多个分片时结果与顺序无关）。n 为 cohort 行数（含 NaN 行，与 CohortStats.n 一致）。
+    """
+
+    def __init__(self, k: int = DEFAULT_K, seed: int = 0):
+        self.k = int(k)
+        self.n = 0
+        self.sketches: Dict[str, KLLSketch] = {f: KLLSketch(k, seed=seed + i) for i, f in enumerate(SKETCH_FIELDS)}
+        self._quantiles: Dict[tuple, float] = {}
+
+    # ======== 构建 ========
+    def update(self, price_saving: Any, mileage_saving: Any, y_pred: Any, next_bin_avg_price: Any, n: int) -> "CohortSketch":
+        y_pred   = np.asarray(y_pred, dtype="float64")
+        next_bin = np.asarray(next_bin_avg_price, dtype="float64")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            depr_rates = (y_pred - next_bin) / y_pred              # 与 CohortStats 相同公式
+        self.sketches[FIELD_PRICE_SAVING].update(price_saving)
+        self.sketches[FIELD_MILEAGE_SAVING].update(mileage_saving)
+        self.sketches[FIELD_DEPR_RATE].update(depr_rates)
+        self.n += int(n)
+        self._quantiles.clear()
+        return self
+
+    def update_frame(self, df: pd.DataFrame) -> "CohortSketch":
+        return self.update(
+            price_saving=df[FIELD_PRICE_SAVING].to_numpy(dtype="float64", na_value=np.nan),
+            mileage_saving=df[FIELD_MILEAGE_SAVING].to_numpy(dtype="float64", na_value=np.nan),
+            y_pred=df[FIELD_Y_PRED].to_numpy(dtype="float64", na_value=np.nan),
+            next_bin_avg_price=df[FIELD_NEXT_BIN_AVG].to_numpy(dtype="float64", na_value=np.nan),
+            n=len(df),
+        )
+
+    def update_records(self, records: Sequence[Sequence[Any]], keys: Sequence[str]) -> "CohortSketch":
+        """游标结果直接写入（None → NaN、Decimal → float，与 CohortStats.from_records 口径一致）"""
+        index   = {k: i for i, k in enumerate(keys)}
+        columns = list(zip(*records)) if records else [()] * len(keys)
+
+        def col(field: str) -> np.ndarray:
+            return np.array(columns[index[field]], dtype="float64")
+
+        return self.update(col(FIELD_PRICE_SAVING), col(FIELD_MILEAGE_SAVING), col(FIELD_Y_PRED), col(FIELD_NEXT_BIN_AVG),
+                           n=len(records))
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, k: int = DEFAULT_K) -> "CohortSketch":
+        return cls(k).update_frame(df)
+
+    @classmethod
+    def from_chunks(cls, frames: Iterable[pd.DataFrame], k: int = DEFAULT_K) -> "CohortSketch":
+        sketch = cls(k)
+        for df in frames:
+            sketch.update_frame(df)
+        return sketch
+
+    def merge(self, other: "CohortSketch") -> "CohortSketch":
+        for field, sketch in self.sketches.items():
+            sketch.merge(other.sketches[field])
+        self.n += other.n
+        self._quantiles.clear()
+        return self
+
+    # ======== CohortStats 接口（排名为估计值） ========
+    def rank_desc(self, field: str, value: Any) -> int:
+        """越大越好：1 + 估计的严格大于 value 的个数"""
+        if value is None or value != value:
+            return 1
+        return int(self.sketches[field].count_greater(value)) + 1
+
+    def rank_asc(self, field: str, value: Any) -> int:
+        """越小越好：1 + 估计的严格小于 value 的个数"""
+        if value is None or value != value:
+            return 1
+        return int(self.sketches[field].count_less(value)) + 1
+
+    def ranks_desc(self, field: str, values: np.ndarray) -> np.ndarray:
+        return np.where(np.isnan(values), 1, self.sketches[field].count_greater(values) + 1)
+
+    def ranks_asc(self, field: str, values: np.ndarray) -> np.ndarray:
+        return np.where(np.isnan(values), 1, self.sketches[field].count_less(values) + 1)
+
+    def quantile(self, field: str, p: float) -> float:
+        key = (field, p)
+        q = self._quantiles.get(key)
+        if q is None:
+            q = self._quantiles[key] = self.sketches[field].quantile(p)
+        return q
+
+    # ======== 误差 / 体积 ========
+    @property
+    def is_exact(self) -> bool:
+        return all(s.is_exact for s in self.sketches.values())
+
+    def rank_error(self, field: Optional[str] = None) -> float:
+        """归一化名次误差上界（rank_error_bound / count）；不指定字段时取三个指标中最大的"""
+        fields = [field] if field is not None else list(self.sketches)
+        return max((self.sketches[f].rank_error_bound / self.sketches[f].count if self.sketches[f].count else 0.0)
+                   for f in fields)
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(s.nbytes for s in self.sketches.values()))
+
+    def precompute(self) -> "CohortSketch":
+        """预先算好判定用的分位阈值（放入缓存前调用）"""
+        for field, levels in QUANTILE_LEVELS.items():
+            for p in levels:
+                self.quantile(field, p)
+        return self
+
+    # ======== 序列化 ========
+    def to_bytes(self) -> bytes:
+        parts = [self.sketches[f].to_bytes() for f in SKETCH_FIELDS]
+        return struct.pack(f"<Q{len(parts)}Q", self.n, *(len(p) for p in parts)) + b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "CohortSketch":
+        count  = len(SKETCH_FIELDS)
+        n, *sizes = struct.unpack_from(f"<Q{count}Q", data, 0)
+        offset = 8 * (count + 1)
+        out = cls.__new__(cls)
+        out.n, out.sketches, out._quantiles = n, {}, {}
+        for field, size in zip(SKETCH_FIELDS, sizes):
+            out.sketches[field] = KLLSketch.from_bytes(data[offset:offset + size])
+            offset += size
+        out.k = out.sketches[SKETCH_FIELDS[0]].k
+        return out
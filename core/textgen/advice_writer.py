@@ -2,14 +2,21 @@
 # -*- coding: utf-8 -*-
 """
 生成“有人味”的推荐文案（summary + decision_reason），零依赖。
+
+模板表在导入时预编译（emoji 前缀并入模板、决策句按 (结论, 动力类型) 切好前后缀），
+每次调用只剩：取种子 → 抽变体下标 → 填金额/百分比 → 拼接。
+同一车源的文案由 sha1(listing_id|full_key|heat_rank) 种子 + MT 抽样决定，改动种子或抽样方式都会改变已发布的文案，
+因此二者保持不变，只复用每线程一个 Random 对象（重设种子，不再每次新建）。
 """
 
-from typing import Dict, Any, List, Optional
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
 import random
 import hashlib
 import os
+import threading
 
-__all__ = ["compose_advice"]
+__all__ = ["compose_advice", "detect_powertrain", "POWERTRAINS"]
 
 # ===================== 可调参数（阈值与风格，小写） =====================
 price_small = 500        # <500 小幅
@@ -111,20 +118,61 @@ decision_tail_map = {
     "unknown": "建议预约看车并完成常规检查，车况正常可小幅议价。",
 }
 
+POWERTRAINS = tuple(next_actions_map)     # detect_powertrain 的全部取值
+
 decision_tpl_map = {
     "recommended": "{emoji}推荐：{head}。{tail}",
     "conditional": "{emoji}谨慎推荐：{head}。{tail}",
     "not_recommended": "{emoji}暂不推荐：核心优势不足。建议先观望或扩大筛选范围。",
 }
 
+# ===================== 预编译（导入时解析一次） =====================
+def _compile(tpls: List[str], emoji: str = "") -> Tuple[str, ...]:
+    if not tpls:
+        raise ValueError("template list must not be empty")   # 导入时拒绝，而不是请求时 randrange(0) 报错
+    return tuple(emoji + t for t in tpls)
+
+price_pos_c   = _compile(price_pos_tpl, emoji_ok)
+price_neg_c   = _compile(price_neg_tpl, emoji_warn)
+mile_pos_c    = _compile(mile_pos_tpl, emoji_ok)
+mile_neg_c    = _compile(mile_neg_tpl, emoji_warn)
+depr_low_c    = _compile(depr_low_tpl)
+depr_mid_c    = _compile(depr_mid_tpl)
+depr_high_c   = _compile(depr_high_tpl)
+heat_strong_c = _compile(heat_tpl_strong)
+heat_good_c   = _compile(heat_tpl_good)
+heat_ok_c     = _compile(heat_tpl_ok)
+
+price_ok_text = f"{emoji_ok}价格基本合理"
+mile_ok_text  = f"{emoji_ok}里程基本合理"
+
+def _split_decision(key: str, pt: str) -> Tuple[str, Optional[str]]:
+    """决策句切成 (head 之前, head 之后)；模板不含 head 时返回 (整句, None)"""
+    emoji = emoji_warn if key == "not_recommended" else emoji_ok
+    text = decision_tpl_map[key].format(emoji=emoji, head="\0", tail=decision_tail_map[pt])
+    before, sep, after = text.partition("\0")
+    return (before, after) if sep else (text, None)
+
+decision_parts = {(key, pt): _split_decision(key, pt) for key in decision_tpl_map for pt in decision_tail_map}
+
 # ===================== 工具函数（小写） =====================
 def _seed_from_ids(*parts: str) -> int:
     raw = "|".join([p or "" for p in parts])
-    h = hashlib.sha1(raw.encode("utf-8")).hexdigest()
-    return int(h[:12], 16)
+    return int.from_bytes(hashlib.sha1(raw.encode("utf-8")).digest()[:6], "big")   # 等价于 hexdigest 前 12 位
+
+_local = threading.local()
+
+def _seeded_rng(seed: int) -> random.Random:
+    """每线程复用一个 Random；seed() 后的状态与 random.Random(seed) 完全一致"""
+    try:
+        rng = _local.rng
+    except AttributeError:
+        rng = _local.rng = random.Random()
+    rng.seed(seed)
+    return rng
 
-def _pick(rng: random.Random, candidates: List[str]) -> str:
-    return candidates[rng.randrange(0, len(candidates))] if candidates else ""
+def _pick(rng: random.Random, tpls: Tuple[str, ...]) -> str:
+    return tpls[rng.randrange(len(tpls))]
 
 def _scale_word(amount: float) -> str:
     a = abs(amount)
@@ -146,7 +194,8 @@ def _to_float(x: Any) -> Optional[float]:
     except Exception:
         return None
 
-def _detect_powertrain(full_key: str) -> str:
+@lru_cache(maxsize=8192)
+def detect_powertrain(full_key: str) -> str:
     k = (full_key or "").lower()
     if "electric" in k or " ev" in k or "ev_" in k:
         return "ev"
@@ -168,36 +217,32 @@ def _points_humanized(rng: random.Random, flags: Dict[str, bool], m: Dict[str, A
     ps = _to_float(m.get("price_saving"))
     if ps is not None:
         if ps > 1e-9:
-            tpl = _pick(rng, price_pos_tpl)
-            pts.append(f"{emoji_ok}{tpl.format(scale=_scale_word(ps), amt=_fmt_money_abs(ps))}")
+            pts.append(_pick(rng, price_pos_c).format(scale=_scale_word(ps), amt=_fmt_money_abs(ps)))
         elif ps < -1e-9:
-            tpl = _pick(rng, price_neg_tpl)
-            pts.append(f"{emoji_warn}{tpl.format(scale=_scale_word(ps), amt=_fmt_money_abs(ps))}")
+            pts.append(_pick(rng, price_neg_c).format(scale=_scale_word(ps), amt=_fmt_money_abs(ps)))
         elif flags.get("ok_price"):
-            pts.append(f"{emoji_ok}价格基本合理")
+            pts.append(price_ok_text)
 
     # 里程：明确因里程省/多花
     ms = _to_float(m.get("mileage_saving"))
     if ms is not None:
         if ms > 1e-9:
-            tpl = _pick(rng, mile_pos_tpl)
-            pts.append(f"{emoji_ok}{tpl.format(amt=_fmt_money_abs(ms))}")
+            pts.append(_pick(rng, mile_pos_c).format(amt=_fmt_money_abs(ms)))
         elif ms < -1e-9:
-            tpl = _pick(rng, mile_neg_tpl)
-            pts.append(f"{emoji_warn}{tpl.format(amt=_fmt_money_abs(ms))}")
+            pts.append(_pick(rng, mile_neg_c).format(amt=_fmt_money_abs(ms)))
         elif flags.get("ok_mile"):
-            pts.append(f"{emoji_ok}里程基本合理")
+            pts.append(mile_ok_text)
 
     # 贬值率：分段口径
     dr = _to_float(m.get("depr_rate"))
     if dr is not None:
         pct = _norm_pct(dr)
         if pct < depr_low:
-            tpl = _pick(rng, depr_low_tpl)
+            tpl = _pick(rng, depr_low_c)
         elif pct < depr_mid:
-            tpl = _pick(rng, depr_mid_tpl)
+            tpl = _pick(rng, depr_mid_c)
         else:
-            tpl = _pick(rng, depr_high_tpl)
+            tpl = _pick(rng, depr_high_c)
         pts.append(tpl.format(pct=f"{pct:.1f}%"))
 
     # 热度：兜底或靠前才说
@@ -209,11 +254,11 @@ def _points_humanized(rng: random.Random, flags: Dict[str, bool], m: Dict[str, A
             rnk = None
         if flags.get("hot_ok") or (rnk is not None and rnk <= heat_top_good):
             if rnk is not None and rnk <= heat_top_strong:
-                tpl = _pick(rng, heat_tpl_strong)
+                tpl = _pick(rng, heat_strong_c)
             elif rnk is not None and rnk <= heat_top_good:
-                tpl = _pick(rng, heat_tpl_good)
+                tpl = _pick(rng, heat_good_c)
             else:
-                tpl = _pick(rng, heat_tpl_ok)
+                tpl = _pick(rng, heat_ok_c)
             pts.append(tpl.format(rank=rnk if rnk is not None else "—"))
 
     return pts or ["暂无明显优势"]
@@ -246,24 +291,22 @@ def compose_advice(
     }
 
     seed = _seed_from_ids(str(listing_id or ""), full_key, str(m.get("heat_rank") or ""))
-    rng = random.Random(seed)
+    rng = _seeded_rng(seed)
 
     points = _points_humanized(rng, flags, m)
-    head = "，".join(points[:max_points])
 
-    pt = _detect_powertrain(full_key)
-    next_actions = next_actions_map.get(pt) or next_actions_map["unknown"]
+    pt = detect_powertrain(full_key)
+    next_actions = next_actions_map[pt]
 
     wins = int(bool(flags.get("ok_price"))) + int(bool(flags.get("ok_mile"))) + int(bool(flags.get("ok_depr")))
-    tail = decision_tail_map.get(pt) or decision_tail_map["unknown"]
 
     if is_recommended:
         key = "conditional" if (wins == 1 and flags.get("hot_ok")) else "recommended"
     else:
         key = "not_recommended"
 
-    emoji = emoji_ok if is_recommended else emoji_warn
-    decision_reason = decision_tpl_map[key].format(emoji=emoji, head=head, tail=tail)
+    before, after = decision_parts[(key, pt)]
+    decision_reason = before if after is None else before + "，".join(points[:max_points]) + after
 
     return {
         "summary": {"points": points, "next_actions": next_actions},
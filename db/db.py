@@ -1,5 +1,8 @@
+import asyncio
 import os
+import threading
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
 from dotenv import load_dotenv
 
 # ======== 加载 .env 文件配置 ========
@@ -24,11 +27,29 @@ RENDER_DB_NAME     = os.getenv("RENDER_DB_NAME")      # Render 云端数据库
 
 # ======== 固定连接参数（内部用） ========
 DB_DRIVER_PREFIX   = "postgresql+psycopg2"   # 数据库驱动前缀（SQLAlchemy 使用 psycopg2）
+DB_ASYNC_DRIVER_PREFIX = "postgresql+asyncpg"  # 异步驱动前缀（SQLAlchemy asyncio 使用 asyncpg）
 DB_ECHO            = False                   # 是否打印 SQL（建议关闭）
-DB_POOL_PRE_PING   = True                    # 检查连接池连接是否存活（防止失效连接报错）
 
-# ======== 获取 SQLAlchemy 引擎实例 ========
-def get_engine():
+# ======== 连接池参数（按环境用 .env 覆盖） ========
+DB_POOL_SIZE       = int(os.getenv("DB_POOL_SIZE", "5"))          # 常驻连接数
+DB_MAX_OVERFLOW    = int(os.getenv("DB_MAX_OVERFLOW", "10"))      # 高峰时额外允许的连接数
+DB_POOL_TIMEOUT    = float(os.getenv("DB_POOL_TIMEOUT", "30"))    # 等待空闲连接的超时（秒）
+DB_POOL_RECYCLE    = int(os.getenv("DB_POOL_RECYCLE", "300"))     # 连接最长复用时间（秒），早于服务端/代理的空闲断开
+DB_POOL_PRE_PING   = os.getenv("DB_POOL_PRE_PING", "false").lower() == "true"  # 每次取连接前探活（多一次往返；网络不稳时再开）
+DB_POOL_WARMUP     = int(os.getenv("DB_POOL_WARMUP", "2"))        # 启动时预先建立的连接数（每个引擎）
+
+def _pool_kwargs() -> dict:
+    return {
+        "pool_size":     DB_POOL_SIZE,
+        "max_overflow":  DB_MAX_OVERFLOW,
+        "pool_timeout":  DB_POOL_TIMEOUT,
+        "pool_recycle":  DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_use_lifo": True,   # 优先复用最近用过的连接，空闲连接自然过期，热连接少而稳
+    }
+
+# ======== 拼接连接字符串（按当前运行环境） ========
+def _build_db_url(driver_prefix: str) -> str:
     # ======== 参数选择（按当前运行环境） ========
     db_user = LOCAL_DB_USER     if LOCAL_MODE else RENDER_DB_USER
     db_pass = LOCAL_DB_PASSWORD if LOCAL_MODE else RENDER_DB_PASSWORD
@@ -40,8 +61,81 @@ def get_engine():
     if not all([db_user, db_pass, db_host, db_port, db_name]):
         raise ValueError("❌ 缺少数据库连接信息，请检查 .env 文件")
 
-    # ======== 拼接连接字符串 & 创建引擎 ========
-    db_url  = f"{DB_DRIVER_PREFIX}://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}"
-    engine  = create_engine(db_url, echo=DB_ECHO, pool_pre_ping=DB_POOL_PRE_PING)
+    return f"{driver_prefix}://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}"
+
+# ======== 获取 SQLAlchemy 引擎实例 ========
+def get_engine():
+    db_url  = _build_db_url(DB_DRIVER_PREFIX)
+    engine  = create_engine(db_url, echo=DB_ECHO, **_pool_kwargs())
+
+    return engine
+
+# ======== 获取 SQLAlchemy 异步引擎实例（asyncpg，不阻塞事件循环） ========
+def get_async_engine():
+    db_url  = _build_db_url(DB_ASYNC_DRIVER_PREFIX)
+    engine  = create_async_engine(db_url, echo=DB_ECHO, **_pool_kwargs())
 
     return engine
+
+# ======== 进程内共享引擎（首次使用时创建；由 API lifespan 负责预热与释放） ========
+_shared_lock         = threading.Lock()
+_shared_engine       = None
+_shared_async_engine = None
+
+def get_shared_engine():
+    global _shared_engine
+    if _shared_engine is None:
+        with _shared_lock:
+            if _shared_engine is None:
+                _shared_engine = get_engine()
+    return _shared_engine
+
+def get_shared_async_engine():
+    global _shared_async_engine
+    if _shared_async_engine is None:
+        with _shared_lock:
+            if _shared_async_engine is None:
+                _shared_async_engine = get_async_engine()
+    return _shared_async_engine
+
+def _warm_up_sync(n: int) -> None:
+    engine = get_shared_engine()
+    conns  = []
+    try:
+        for _ in range(n):
+            conns.append(engine.connect())
+    finally:
+        for conn in conns:
+            conn.close()   # 归还连接池，连接本身保持打开
+
+async def warm_up_engines(n: int = DB_POOL_WARMUP) -> None:
+    """
+    预先建立 n 个连接（同步 + 异步引擎各 n 个，且不超过 pool_size），
+    部署或冷启动后的首批请求不再承担 TCP/TLS/认证握手。
+    """
+    n = max(0, min(n, DB_POOL_SIZE))
+    if n == 0:
+        return
+    async_engine = get_shared_async_engine()
+    # 任一连接失败时先把已建立的连接归还连接池，再抛出第一个异常
+    results = await asyncio.gather(*(async_engine.connect().start() for _ in range(n)), return_exceptions=True)
+    conns   = [r for r in results if not isinstance(r, BaseException)]
+    errors  = [r for r in results if isinstance(r, BaseException)]
+    try:
+        if errors:
+            raise errors[0]
+        await asyncio.to_thread(_warm_up_sync, n)
+    finally:
+        for conn in conns:
+            await conn.close()
+
+async def dispose_engines() -> None:
+    """关闭共享引擎的全部连接（lifespan 退出时调用）；之后再使用会重新创建"""
+    global _shared_engine, _shared_async_engine
+    with _shared_lock:
+        engine, async_engine = _shared_engine, _shared_async_engine
+        _shared_engine = _shared_async_engine = None
+    if async_engine is not None:
+        await async_engine.dispose()
+    if engine is not None:
+        engine.dispose()
@@ -0,0 +1,97 @@
+# scripts/bench_async_concurrency.py
+# -*- coding: utf-8 -*-
+"""
+并发扩展性基准：对比「事件循环内直接调同步评估」（旧写法）与「异步 DB + 线程池 CPU」（新写法）
+在不同并发度下的吞吐与延迟。单事件循环 = 单个 uvicorn worker 的真实情况。
+
+用法（项目根目录，需配置好 .env 数据库）：
+    python -m scripts.bench_async_concurrency 400000001 400000002 ...
+    python -m scripts.bench_async_concurrency --url http://127.0.0.1:8000 400000001   # 压测已启动的服务
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Awaitable, Callable, List
+
+from services.car_value_analysis_service import (
+    cohort_cache,
+    evaluate_by_listing_id,
+    evaluate_by_listing_id_async,
+)
+
+# ======== 参数变量 ========
+default_levels   = [1, 2, 4, 8, 16, 32]     # 并发度
+default_requests = 64                       # 每个并发度的总请求数
+
+
+async def _run_level(call: Callable[[str], Awaitable], listing_ids: List[str], concurrency: int, total: int) -> dict:
+    sem = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def one(i: int):
+        async with sem:
+            t0 = time.perf_counter()
+            await call(listing_ids[i % len(listing_ids)])
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - t0
+
+    latencies.sort()
+    return {
+        "rps": total / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+    }
+
+
+def _service_calls():
+    async def blocking(listing_id: str):
+        # 旧写法：async def 里直接调用同步函数，整个事件循环被阻塞
+        return evaluate_by_listing_id(listing_id)
+
+    async def non_blocking(listing_id: str):
+        return await evaluate_by_listing_id_async(listing_id)
+
+    return {"sync-in-loop": blocking, "async": non_blocking}
+
+
+def _http_calls(base_url: str):
+    import httpx  # 仅压测 HTTP 时需要
+
+    client = httpx.AsyncClient(base_url=base_url, timeout=60)
+
+    async def http(listing_id: str):
+        resp = await client.get(f"/api/evaluate/{listing_id}")
+        resp.raise_for_status()
+
+    return {"http": http}
+
+
+async def main(listing_ids: List[str], levels: List[int], total: int, url: str = None):
+    calls = _http_calls(url) if url else _service_calls()
+
+    for name, call in calls.items():
+        await call(listing_ids[0])   # 预热：建连接、填 cohort 缓存
+        print(f"\n=== {name} ===")
+        print(f"{'concurrency':>11} {'req/s':>9} {'p50(ms)':>9} {'p99(ms)':>9}")
+        for c in levels:
+            r = await _run_level(call, listing_ids, c, total)
+            print(f"{c:>11} {r['rps']:>9.1f} {r['p50_ms']:>9.1f} {r['p99_ms']:>9.1f}")
+
+    if not url:
+        print(f"\ncohort cache: {cohort_cache.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="rehui api concurrency benchmark")
+    parser.add_argument("listing_ids", nargs="+", help="用于压测的 listing_id（循环使用）")
+    parser.add_argument("--levels", type=int, nargs="+", default=default_levels)
+    parser.add_argument("--requests", type=int, default=default_requests)
+    parser.add_argument("--url", default=None, help="压测已启动服务的地址，如 http://127.0.0.1:8000")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.listing_ids, args.levels, args.requests, args.url))
@@ -0,0 +1,92 @@
+# scripts/bench_bulk_load.py
+# -*- coding: utf-8 -*-
+"""
+批量写入基准：同一批合成记录分别用
+  - insert_batch：DataFrame + to_sql(method='multi')，每批 100 行（改造前）
+  - copy_records：COPY FROM STDIN 流式导入（生成器输入，不整体物化）
+  - upsert_records：COPY 到暂存表 + INSERT ... ON CONFLICT（对已有数据整体覆盖）
+写入一张临时基准表（结束后删除），输出行数、用时与速率。
+
+用法（项目根目录，需可连接的数据库）：
+    python -m scripts.bench_bulk_load
+    python -m scripts.bench_bulk_load --rows 500000 --skip-legacy
+"""
+
+import argparse
+import random
+import time
+from collections import OrderedDict
+
+from db.db import get_engine
+from utils.db_utils import copy_records, create_table_if_not_exists, drop_table_if_exists, insert_batch, upsert_records
+
+# ======== 参数变量 ========
+default_rows = 100000
+bench_table  = "bench_bulk_load_tmp"
+
+schema = OrderedDict([
+    ("listing_id",     "text PRIMARY KEY"),
+    ("full_key",       "text NOT NULL"),
+    ("year",           "integer NOT NULL"),
+    ("price",          "double precision"),
+    ("mileage",        "double precision"),
+    ("is_recommended", "boolean"),
+    ("summary",        "text"),
+])
+fields = list(schema)
+
+
+def make_records(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    for i in range(n):
+        yield {
+            "listing_id":     str(400000000 + i),
+            "full_key":       f"make_{i % 50}|model_{i % 400}|trim",
+            "year":           2015 + i % 10,
+            "price":          round(rng.uniform(8000, 60000), 2),
+            "mileage":        None if i % 17 == 0 else round(rng.uniform(1000, 150000), 1),
+            "is_recommended": i % 3 == 0,
+            "summary":        "价格比同款低，里程偏低\t适合通勤",
+        }
+
+
+def _reset(engine):
+    drop_table_if_exists(engine, bench_table, None)
+    create_table_if_not_exists(engine, bench_table, schema, None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="bulk load benchmark: insert_batch vs COPY")
+    parser.add_argument("--rows", type=int, default=default_rows)
+    parser.add_argument("--skip-legacy", action="store_true", help="不跑 insert_batch（行数很大时很慢）")
+    args = parser.parse_args()
+    n = args.rows
+
+    engine = get_engine()
+    results = []
+    try:
+        if not args.skip_legacy:
+            _reset(engine)
+            t0 = time.perf_counter()
+            insert_batch(engine, bench_table, list(make_records(n)), fields)
+            results.append(("insert_batch (to_sql multi, 100)", time.perf_counter() - t0))
+
+        _reset(engine)
+        copied = copy_records(engine, bench_table, make_records(n), fields)
+        results.append(("copy_records", copied["elapsed_sec"]))
+
+        upserted = upsert_records(engine, bench_table, make_records(n, seed=1), fields, ["listing_id"])
+        results.append((f"upsert_records (updated {upserted['updated']:,})", upserted["elapsed_sec"]))
+    finally:
+        drop_table_if_exists(engine, bench_table, None)
+        engine.dispose()
+
+    base = results[0][1]
+    print(f"{n:,} rows")
+    print(f"{'case':<36} {'seconds':>9} {'rows/s':>12} {'vs first':>9}")
+    for name, sec in results:
+        print(f"{name:<36} {sec:>9.2f} {n / sec:>12,.0f} {base / sec:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
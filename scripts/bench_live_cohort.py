@@ -0,0 +1,83 @@
+# scripts/bench_live_cohort.py
+# -*- coding: utf-8 -*-
+"""
+增量 cohort 维护基准：同一合成 cohort 上逐条上架 / 下架车源，对比
+  - LiveCohortStats.insert / remove：有序结构 O(log n) 更新 + 只重判阈值附近的车源
+  - 重建：CohortStats.from_frame + 整个 cohort 重新判定（改造前每次更新的代价）
+输出每次更新的平均耗时、翻转车源数，以及相对重建的倍数。
+
+用法（项目根目录，不需要数据库）：
+    python -m scripts.bench_live_cohort
+    python -m scripts.bench_live_cohort --sizes 1000 100000 --updates 2000
+"""
+
+import argparse
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from core.car_value_evaluator import _decide_cohort
+from core.cohort_stats import CohortStats
+from core.live_cohort import LiveCohortStats
+from scripts.synthetic_data import make_cohort
+
+# ======== 参数变量 ========
+default_sizes   = [1000, 10000, 100000]
+default_updates = 1000
+rebuild_rounds  = 5        # 重建很慢，只测几次取平均
+
+
+def _rebuild(df: pd.DataFrame) -> None:
+    stats = CohortStats.from_frame(df)
+    price = df["price_saving"].to_numpy(dtype="float64", na_value=np.nan)
+    mile  = df["mileage_saving"].to_numpy(dtype="float64", na_value=np.nan)
+    y     = df["y_pred"].to_numpy(dtype="float64", na_value=np.nan)
+    nb    = df["next_bin_avg_price"].to_numpy(dtype="float64", na_value=np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        _decide_cohort(df, stats, price, mile, (y - nb) / y)
+
+
+def bench(size: int, updates: int) -> dict:
+    df       = make_cohort(size)
+    arrivals = make_cohort(updates, seed=size + 1, listing_id_start=900000000).to_dict("records")
+
+    t0 = time.perf_counter()
+    live = LiveCohortStats.from_frame(df)
+    build_sec = time.perf_counter() - t0
+
+    # 交替上架新车源 / 下架最早的车源，cohort 规模保持不变
+    leaving = list(df["listing_id"])
+    flipped = 0
+    t0 = time.perf_counter()
+    for i, row in enumerate(arrivals):
+        flipped += len(live.insert(row["listing_id"], row)["flipped"])
+        flipped += len(live.remove(leaving[i])["flipped"])
+    update_sec = (time.perf_counter() - t0) / (2 * updates)
+
+    t0 = time.perf_counter()
+    for _ in range(rebuild_rounds):
+        _rebuild(df)
+    rebuild_sec = (time.perf_counter() - t0) / rebuild_rounds
+
+    return {"size": size, "build_sec": build_sec, "update_sec": update_sec, "rebuild_sec": rebuild_sec,
+            "flipped_per_update": flipped / (2 * updates)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="incremental cohort update vs full rebuild")
+    parser.add_argument("--sizes", type=int, nargs="+", default=default_sizes)
+    parser.add_argument("--updates", type=int, default=default_updates, help="上架 + 下架各多少次")
+    args = parser.parse_args()
+
+    warnings.simplefilter("ignore", RuntimeWarning)
+    print(f"{'cohort':>9} {'build':>9} {'update':>11} {'rebuild':>11} {'speedup':>9} {'flips/update':>13}")
+    for size in args.sizes:
+        r = bench(size, args.updates)
+        print(f"{size:>9,} {r['build_sec']:>8.2f}s {r['update_sec'] * 1e6:>9.1f}µs {r['rebuild_sec'] * 1e3:>9.1f}ms "
+              f"{r['rebuild_sec'] / r['update_sec']:>8.0f}x {r['flipped_per_update']:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# scripts/bench_logger.py
+# -*- coding: utf-8 -*-
+"""
+日志开销基准：每个"请求"打 2 行热路径日志（与 evaluate 接口一致），测调用线程上的耗时。
+  - legacy：FileHandler + StreamHandler 同步写，f-string 立即格式化（改造前）
+  - queue：DeferredQueueHandler 入队，格式化与 IO 在 QueueListener 线程，%-参数惰性格式化
+  - queue + sample：在 queue 基础上热路径 1/N 采样
+控制台输出重定向到临时文件，避免终端速度干扰；文件写入临时目录。
+
+用法（项目根目录）：
+    python -m scripts.bench_logger
+    python -m scripts.bench_logger --requests 50000 --sample-every 100
+"""
+
+import argparse
+import logging
+import queue
+import tempfile
+import time
+from logging.handlers import QueueListener
+
+from utils.logger import DailyFileHandler, DeferredQueueHandler, SampleFilter
+
+# ======== 参数变量 ========
+default_requests = 20000
+default_sample   = 100
+log_format       = "[%(asctime)s] %(levelname)s | %(filename)s | %(funcName)s | %(message)s"
+time_format      = "%H:%M:%S"
+
+listing_id = "412345678"
+summary    = "价格比同款低 2,350 刀，里程也偏低，整体很划算；电池质保还在，放心入。"
+
+
+def _handlers(tmp_dir: str, name: str):
+    formatter = logging.Formatter(fmt=log_format, datefmt=time_format)
+    file_handler   = DailyFileHandler(tmp_dir, name, retention_days=0)
+    stream_handler = logging.StreamHandler(open(f"{tmp_dir}/{name}_console.txt", "w", encoding="utf-8"))
+    for h in (file_handler, stream_handler):
+        h.setFormatter(formatter)
+    return [file_handler, stream_handler]
+
+
+def _fresh_logger(name: str) -> logging.Logger:
+    logger = logging.getLogger(f"bench_logger.{name}")
+    logger.handlers.clear()
+    logger.filters.clear()
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return logger
+
+
+def bench_legacy(tmp_dir: str, n: int) -> float:
+    logger = _fresh_logger("legacy")
+    for h in _handlers(tmp_dir, "legacy"):
+        logger.addHandler(h)
+
+    t0 = time.perf_counter()
+    for _ in range(n):
+        logger.info(f"🔍 按 listing_id 评估: {listing_id}")
+        logger.info(f"✅ evaluate done: {summary}")
+    elapsed = time.perf_counter() - t0
+
+    for h in logger.handlers:
+        h.close()
+    return elapsed
+
+
+def bench_queue(tmp_dir: str, n: int, sample_every: int = 1):
+    name   = "queue" if sample_every == 1 else "sampled"
+    logger = _fresh_logger(name)
+    if sample_every > 1:
+        logger.addFilter(SampleFilter(sample_every))
+    log_queue = queue.SimpleQueue()
+    handlers  = _handlers(tmp_dir, name)
+    listener  = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    logger.addHandler(DeferredQueueHandler(log_queue))
+    listener.start()
+
+    t0 = time.perf_counter()
+    for _ in range(n):
+        logger.info("🔍 按 listing_id 评估: %s", listing_id)
+        logger.info("✅ evaluate done: %s", summary)
+    elapsed = time.perf_counter() - t0
+
+    listener.stop()                                   # 等监听线程写完，统计总耗时
+    drained = time.perf_counter() - t0
+    for h in handlers:
+        h.close()
+    return elapsed, drained
+
+
+def main():
+    parser = argparse.ArgumentParser(description="rehui api logging overhead benchmark")
+    parser.add_argument("--requests", type=int, default=default_requests)
+    parser.add_argument("--sample-every", type=int, default=default_sample)
+    args = parser.parse_args()
+    n = args.requests
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        legacy            = bench_legacy(tmp_dir, n)
+        queued, q_drain   = bench_queue(tmp_dir, n)
+        sampled, s_drain  = bench_queue(tmp_dir, n, args.sample_every)
+
+    print(f"{n:,} requests × 2 log lines")
+    print(f"{'case':<28} {'µs/request (caller)':>20} {'vs legacy':>10} {'total incl. drain':>18}")
+    rows = [
+        ("legacy (sync, f-string)", legacy, legacy),
+        ("queue (lazy %-args)", queued, q_drain),
+        (f"queue + sample 1/{args.sample_every}", sampled, s_drain),
+    ]
+    for name, caller, total in rows:
+        print(f"{name:<28} {caller / n * 1e6:>20.2f} {legacy / caller:>9.1f}x {total:>17.2f}s")
+
+
+if __name__ == "__main__":
+    main()
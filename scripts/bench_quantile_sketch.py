@@ -0,0 +1,126 @@
+# scripts/bench_quantile_sketch.py
+# -*- coding: utf-8 -*-
+"""
+分位数草图对照：同一合成 cohort 分别用
+  - CohortStats（整列取回、排序，精确）
+  - CohortSketch（分片按块流式构建 → 序列化 → 合并）
+判定整个 cohort，比较推荐结论，并核对每个分位阈值的实际名次误差不超过草图报告的误差界。
+样本数 <= k 的 cohort 要求与精确结果逐条一致；任一检查不通过时退出码为 1。
+
+用法（项目根目录，不需要数据库）：
+    python -m scripts.bench_quantile_sketch
+    python -m scripts.bench_quantile_sketch --sizes 1000 1000000 --k 400 --shards 8
+"""
+
+import argparse
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from core.car_value_evaluator import _decide_cohort
+from core.cohort_stats import CohortStats, FIELD_DEPR_RATE, QUANTILE_LEVELS
+from core.quantile_sketch import DEFAULT_K, CohortSketch
+from scripts.synthetic_data import make_cohort
+
+# ======== 参数变量 ========
+default_sizes  = [150, 1000, 10000, 100000, 1000000]
+default_shards = 4
+chunk_size     = 5000       # 每个分片按块写入（模拟服务端游标分块）
+
+
+def _decide(df: pd.DataFrame, stats) -> list:
+    price = df["price_saving"].to_numpy(dtype="float64", na_value=np.nan)
+    mile  = df["mileage_saving"].to_numpy(dtype="float64", na_value=np.nan)
+    y     = df["y_pred"].to_numpy(dtype="float64", na_value=np.nan)
+    nb    = df["next_bin_avg_price"].to_numpy(dtype="float64", na_value=np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return _decide_cohort(df, stats, price, mile, (y - nb) / y)
+
+
+def _build_sketch(df: pd.DataFrame, k: int, shards: int) -> CohortSketch:
+    """每个分片各自按块构建，序列化后在"汇总端"合并"""
+    parts = []
+    for s, shard in enumerate(np.array_split(np.arange(len(df)), shards)):
+        sketch = CohortSketch(k, seed=10 * s)
+        for start in range(0, len(shard), chunk_size):
+            sketch.update_frame(df.iloc[shard[start:start + chunk_size]])
+        parts.append(sketch.to_bytes())
+    merged = CohortSketch.from_bytes(parts[0])
+    for blob in parts[1:]:
+        merged.merge(CohortSketch.from_bytes(blob))
+    return merged.precompute()
+
+
+def _threshold_rank_error(exact: CohortStats, sketch: CohortSketch, field: str, p: float) -> float:
+    """草图阈值在精确排序数组中的名次与目标名次 p*(m-1) 的距离（名次数）"""
+    arr = exact.sorted[field]
+    pos = p * (len(arr) - 1)
+    v   = sketch.quantile(field, p)
+    lo  = np.searchsorted(arr, v, side="left")
+    hi  = np.searchsorted(arr, v, side="right")
+    return float(max(0.0, (lo - 1) - pos, pos - hi))
+
+
+def compare(size: int, k: int, shards: int) -> dict:
+    df = make_cohort(size, seed=size)
+
+    t0 = time.perf_counter()
+    exact = CohortStats.from_frame(df)
+    exact_sec = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    sketch = _build_sketch(df, k, shards)
+    sketch_sec = time.perf_counter() - t0
+
+    ok = True
+    worst = 0.0
+    for field, levels in QUANTILE_LEVELS.items():
+        bound = sketch.sketches[field].rank_error_bound
+        for p in levels:
+            err = _threshold_rank_error(exact, sketch, field, p)
+            worst = max(worst, err / max(1, len(exact.sorted[field])))
+            ok &= err <= bound + 1
+
+    truth, approx = _decide(df, exact), _decide(df, sketch)
+    flips = sum(a[0] != b[0] for a, b in zip(truth, approx))
+    flag_diffs = sum(a[1] != b[1] for a, b in zip(truth, approx))
+    if sketch.is_exact:
+        ok &= flips == 0 and flag_diffs == 0 and all(
+            sketch.quantile(f, p) == exact.quantile(f, p) for f, ps in QUANTILE_LEVELS.items() for p in ps)
+        ok &= all(sketch.rank_asc(FIELD_DEPR_RATE, v) == exact.rank_asc(FIELD_DEPR_RATE, v)
+                  for v in exact.sorted[FIELD_DEPR_RATE][::max(1, size // 50)])
+
+    return {
+        "size": size, "ok": bool(ok), "exact": sketch.is_exact,
+        "flips": flips, "recommended": sum(d[0] for d in truth),
+        "worst_rank_err": worst, "bound": sketch.rank_error(),
+        "exact_kb": exact.nbytes / 1024, "sketch_kb": sketch.nbytes / 1024,
+        "exact_sec": exact_sec, "sketch_sec": sketch_sec,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="quantile sketch verdicts vs exact cohort stats")
+    parser.add_argument("--sizes", type=int, nargs="+", default=default_sizes)
+    parser.add_argument("--k", type=int, default=DEFAULT_K)
+    parser.add_argument("--shards", type=int, default=default_shards)
+    args = parser.parse_args()
+
+    warnings.simplefilter("ignore", RuntimeWarning)
+    print(f"k={args.k} shards={args.shards} chunk={chunk_size}")
+    print(f"{'cohort':>9} {'exact?':>6} {'flips':>13} {'thr err':>8} {'bound':>7} "
+          f"{'mem exact':>10} {'sketch':>8} {'build':>15} {'check':>6}")
+    failed = False
+    for size in args.sizes:
+        r = compare(size, args.k, args.shards)
+        failed |= not r["ok"]
+        print(f"{size:>9,} {'yes' if r['exact'] else 'no':>6} {r['flips']:>6}/{r['recommended']:<6} "
+              f"{r['worst_rank_err']:>7.3%} {r['bound']:>6.2%} {r['exact_kb']:>8.0f}KB {r['sketch_kb']:>6.0f}KB "
+              f"{r['exact_sec']:>6.2f}s/{r['sketch_sec']:>5.2f}s {'ok' if r['ok'] else 'FAIL':>6}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
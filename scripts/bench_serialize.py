@@ -0,0 +1,92 @@
+# scripts/bench_serialize.py
+# -*- coding: utf-8 -*-
+"""
+序列化微基准：旧 to_native（isinstance 链）+ FastAPI jsonable_encoder + json.dumps
+vs 新 to_native（类型分派）vs dumps（orjson 单次编码），负载为真实形状的 evaluate 输出。
+
+用法（项目根目录，无需数据库）：
+    python -m scripts.bench_serialize
+"""
+
+import json
+import timeit
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+from core.car_value_evaluator import evaluate
+from scripts.synthetic_data import make_cohort
+from utils.serialize import dumps, to_native
+
+# ======== 参数变量 ========
+cohort_size  = 200      # 合成 cohort 样本数
+batch_sizes  = [1, 50]  # 单条 / 批量（batch 接口）负载
+repeat       = 5
+number       = 200
+
+
+# ======== 旧实现（基线，保持与改造前完全一致） ========
+def to_native_legacy(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        return {to_native_legacy(k): to_native_legacy(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple, set)):
+        return [to_native_legacy(x) for x in obj]
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, np.floating):
+        return float(obj)
+    if isinstance(obj, np.bool_):
+        return bool(obj)
+    if isinstance(obj, pd.Timestamp):
+        return obj.isoformat()
+    if obj is pd.NaT:
+        return None
+    if isinstance(obj, pd.Series):
+        return to_native_legacy(obj.to_dict())
+    if isinstance(obj, pd.DataFrame):
+        return [to_native_legacy(r) for r in obj.to_dict(orient="records")]
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    return obj
+
+
+def _payloads() -> dict:
+    df = make_cohort(cohort_size)
+    results = [evaluate(df, df.iloc[i]) for i in range(max(batch_sizes))]
+    return {
+        f"batch={b}": (results[0] if b == 1 else {"count": b, "results": results[:b], "errors": []})
+        for b in batch_sizes
+    }
+
+
+def main():
+    from fastapi.encoders import jsonable_encoder
+
+    def legacy_path(p):   # 改造前：to_native → jsonable_encoder → json.dumps（starlette JSONResponse）
+        return json.dumps(jsonable_encoder(to_native_legacy(p)), ensure_ascii=False, separators=(",", ":")).encode()
+
+    cases = {
+        "legacy to_native":               lambda p: to_native_legacy(p),
+        "to_native (dispatch)":           lambda p: to_native(p),
+        "legacy endpoint path":           legacy_path,
+        "to_native + json.dumps":         lambda p: json.dumps(to_native(p), ensure_ascii=False, separators=(",", ":")).encode(),
+        "dumps (single pass)":            lambda p: dumps(p),
+    }
+
+    for name, payload in _payloads().items():
+        print(f"\n=== payload {name} ({len(dumps(payload)):,} bytes) ===")
+        print(f"{'case':<26} {'µs/op':>10} {'ops/s':>12}")
+        for case, fn in cases.items():
+            best = min(timeit.repeat(lambda: fn(payload), repeat=repeat, number=number)) / number
+            print(f"{case:<26} {best * 1e6:>10.1f} {1 / best:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
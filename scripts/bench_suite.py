@@ -0,0 +1,231 @@
+# scripts/bench_suite.py
+# -*- coding: utf-8 -*-
+"""
+热路径基准套件：按 cohort 规模（默认 10 ~ 10万）测量
+  - evaluate（pandas 扫描 / CohortStats 查表）、各 eval_* 函数、decide_is_recommended
+  - evaluate_cohort（整 cohort 向量化）、CohortStats 构建
+  - compose_advice、to_native、dumps
+  - 端到端：FastAPI 路由 → service → evaluator → 序列化（本地替身库，不连真实数据库）
+输出 ops/s、µs/op、峰值内存（tracemalloc），可保存为 JSON 并与基线对比，回归一目了然。
+
+用法（项目根目录）：
+    python -m scripts.bench_suite
+    python -m scripts.bench_suite --sizes 10 1000 100000 --only evaluate
+    python -m scripts.bench_suite --save bench_base.json
+    python -m scripts.bench_suite --baseline bench_base.json      # 显示与基线的差异
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from scripts.synthetic_data import make_cohort
+
+# ======== 参数变量 ========
+default_sizes   = [10, 100, 1000, 10000, 100000]
+min_time_sec    = 0.2     # 每个 case 至少计时多久
+regress_warn    = 0.10    # 与基线相比变慢超过 10% 标记
+
+
+def _time_op(fn: Callable[[], object]) -> float:
+    """返回每次调用的秒数（自动放大循环次数直到总耗时 ≥ min_time_sec）"""
+    fn()  # 预热
+    number = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_time_sec:
+            return elapsed / number
+        number *= 2 if elapsed <= 0 else max(2, int(min_time_sec / elapsed * 1.2))
+
+
+def _peak_memory(fn: Callable[[], object]) -> int:
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+# ======== case 定义：每个 case 返回 {name: 无参函数} ========
+def _evaluator_cases(size: int) -> Dict[str, Callable[[], object]]:
+    from core import car_value_evaluator as ev
+    from core.cohort_stats import CohortStats
+    from core.textgen.advice_writer import compose_advice
+    from utils.serialize import dumps, to_native
+
+    df     = make_cohort(size)
+    row    = df.iloc[len(df) // 2]
+    stats  = CohortStats.from_frame(df)
+    result = ev.evaluate(df, row, stats)
+    _, flags = ev.decide_is_recommended(df, row, stats)
+    metrics = {
+        "price_saving":   result["evaluations"]["price_saving"]["value"],
+        "mileage_saving": result["evaluations"]["mileage_saving"]["value"],
+        "depr_rate":      result["evaluations"]["expected_depreciation"]["depreciation_rate"],
+        "heat_rank":      result["evaluations"]["heat_rank"]["value"],
+    }
+
+    return {
+        "evaluate (pandas scan)":       lambda: ev.evaluate(df, row),
+        "evaluate (CohortStats)":       lambda: ev.evaluate(df, row, stats),
+        "CohortStats.from_frame":       lambda: CohortStats.from_frame(df),
+        "evaluate_cohort (whole)":      lambda: ev.evaluate_cohort(df, stats),
+        "eval_price_saving":            lambda: ev.eval_price_saving(df, row),
+        "eval_mileage_saving":          lambda: ev.eval_mileage_saving(df, row),
+        "eval_expected_depreciation":   lambda: ev.eval_expected_depreciation(df, row),
+        "eval_heat_rank":               lambda: ev.eval_heat_rank(df, row),
+        "eval_trustworthiness":         lambda: ev.eval_trustworthiness(row),
+        "eval_options":                 lambda: ev.eval_options(row),
+        "eval_safety_features":         lambda: ev.eval_safety_features(row),
+        "decide_is_recommended":        lambda: ev.decide_is_recommended(df, row),
+        "decide_is_recommended (stats)": lambda: ev.decide_is_recommended(df, row, stats),
+        "compose_advice":               lambda: compose_advice(
+            listing_id=result["listing_id"], full_key=result["full_key"], flags=flags,
+            metrics=metrics, is_recommended=result["is_recommended"]),
+        "to_native":                    lambda: to_native(result),
+        "dumps":                        lambda: dumps(result),
+    }
+
+
+def _install_stand_in(service, df) -> None:
+    """
+    本地替身库：用内存 DataFrame 替换 service 的数据访问函数（接口与返回类型保持一致），
+    端到端覆盖 路由 → 缓存 → evaluator → 序列化，只去掉网络与 Postgres 本身。
+    """
+    by_id = {lid: i for i, lid in enumerate(df["listing_id"])}
+
+    def fetch_row(listing_id: str):
+        if listing_id not in by_id:
+            raise ValueError(f"No vehicle found with listing_id = {listing_id}")
+        return df[service.ROW_COLUMNS].iloc[by_id[listing_id]]
+
+    def fetch_cohort(full_key: str, year: int):
+        mask = (df["full_key"] == full_key) & (df["year"] == int(year))
+        return df.loc[mask, service.COHORT_COLUMNS].reset_index(drop=True)
+
+    def fetch_row_record(listing_id: str):
+        return fetch_row(listing_id).to_dict()
+
+    def fetch_cohort_records(full_key: str, year: int):
+        cohort = fetch_cohort(full_key, year)
+        return list(cohort.itertuples(index=False, name=None)), list(cohort.columns)
+
+    async def fetch_row_async(listing_id: str):
+        return fetch_row(listing_id)
+
+    async def fetch_cohort_async(full_key: str, year: int):
+        return fetch_cohort(full_key, year)
+
+    async def fetch_row_record_async(listing_id: str):
+        return fetch_row_record(listing_id)
+
+    async def fetch_cohort_records_async(full_key: str, year: int):
+        return fetch_cohort_records(full_key, year)
+
+    async def version_async():
+        return "bench"
+
+    async def no_verdict_async(listing_id: str):
+        return None
+
+    service._fetch_row_by_listing_id        = fetch_row
+    service._fetch_cohort                   = fetch_cohort
+    service._fetch_row_by_listing_id_async  = fetch_row_async
+    service._fetch_cohort_async             = fetch_cohort_async
+    service._fetch_row_record               = fetch_row_record
+    service._fetch_cohort_records           = fetch_cohort_records
+    service._fetch_row_record_async         = fetch_row_record_async
+    service._fetch_cohort_records_async     = fetch_cohort_records_async
+    service._current_data_version           = lambda: "bench"
+    service._current_data_version_async     = version_async
+    service._fetch_verdict                  = lambda listing_id: None   # 不读预计算结果表，始终在线计算
+    service._fetch_verdict_async            = no_verdict_async
+
+
+def _e2e_cases(size: int) -> Dict[str, Callable[[], object]]:
+    # 替身库模式不连接数据库（引擎按需创建），启动时也不预热连接池
+    os.environ.setdefault("DB_POOL_WARMUP", "0")
+
+    from fastapi.testclient import TestClient
+    from api.main_api import app
+    from services import car_value_analysis_service as service
+
+    df = make_cohort(size)
+    _install_stand_in(service, df)
+    listing_id = df["listing_id"].iloc[len(df) // 2]
+    client = TestClient(app)
+    client.__enter__()   # 单个事件循环贯穿整个基准（与 uvicorn worker 一致）
+
+    def cold():
+        service.response_cache.clear()
+        client.get(f"/api/evaluate/{listing_id}").raise_for_status()
+
+    def warm():
+        client.get(f"/api/evaluate/{listing_id}").raise_for_status()
+
+    etag = client.get(f"/api/evaluate/{listing_id}").headers["etag"]
+
+    def not_modified():
+        assert client.get(f"/api/evaluate/{listing_id}", headers={"If-None-Match": etag}).status_code == 304
+
+    return {
+        "e2e GET evaluate (no response cache)": cold,
+        "e2e GET evaluate (response cache)":    warm,
+        "e2e GET evaluate (304)":               not_modified,
+    }
+
+
+# ======== 运行 & 报告 ========
+def run(sizes: List[int], only: str = "", with_memory: bool = True) -> Dict[str, dict]:
+    logging.getLogger("rehui_api").setLevel(logging.WARNING)   # 基准不计日志 IO（见 scripts/bench_logger.py）
+
+    results: Dict[str, dict] = {}
+    for size in sizes:
+        cases = {**_evaluator_cases(size), **_e2e_cases(size)}
+        for name, fn in cases.items():
+            if only and only not in name:
+                continue
+            sec  = _time_op(fn)
+            peak = _peak_memory(fn) if with_memory else 0
+            results[f"{name} @ n={size}"] = {"us_per_op": sec * 1e6, "ops_per_sec": 1 / sec, "peak_bytes": peak}
+    return results
+
+
+def report(results: Dict[str, dict], baseline: Dict[str, dict] = None) -> None:
+    header = f"{'case':<52} {'ops/s':>12} {'µs/op':>12} {'peak KiB':>10}"
+    if baseline:
+        header += f" {'vs base':>9}"
+    print(header)
+    for key, r in results.items():
+        line = f"{key:<52} {r['ops_per_sec']:>12,.0f} {r['us_per_op']:>12.1f} {r['peak_bytes'] / 1024:>10.1f}"
+        if baseline and key in baseline:
+            delta = r["us_per_op"] / baseline[key]["us_per_op"] - 1
+            flag  = "  ⚠️" if delta > regress_warn else ""
+            line += f" {delta:>+8.1%}{flag}"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="rehui api hot-path benchmark suite")
+    parser.add_argument("--sizes", type=int, nargs="+", default=default_sizes, help="cohort 规模")
+    parser.add_argument("--only", default="", help="只跑名称包含该子串的 case")
+    parser.add_argument("--no-memory", action="store_true", help="跳过 tracemalloc 峰值内存测量")
+    parser.add_argument("--save", default=None, help="结果保存为 JSON")
+    parser.add_argument("--baseline", default=None, help="与之前保存的 JSON 基线对比")
+    args = parser.parse_args()
+
+    res = run(args.sizes, args.only, with_memory=not args.no_memory)
+    base = json.load(open(args.baseline, encoding="utf-8")) if args.baseline else None
+    report(res, base)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(res, f, indent=2)
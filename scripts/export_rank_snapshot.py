@@ -0,0 +1,89 @@
+# scripts/export_rank_snapshot.py
+# -*- coding: utf-8 -*-
+"""
+导出排名表的只读列式快照（services/rank_snapshot.py），供 DATA_SOURCE=snapshot 的 API worker 内存映射读取。
+服务端游标按 (full_key, year, listing_id) 排序分块读取，逐块追加写文件，内存只占一个分块；
+写完后校验数据版本未变化，再原子切换 CURRENT，并清理多余的旧版本目录。
+
+表每天更新一次，建议接在夜间数据任务之后执行：
+    python -m scripts.export_rank_snapshot
+    python -m scripts.export_rank_snapshot --snapshot-dir /srv/rehui/snapshot --keep 3
+"""
+
+import argparse
+import os
+import shutil
+import time
+
+from db.db import get_engine
+from services.car_value_analysis_service import (
+    TABLE_NAME, FIELD_FULL_KEY, FIELD_YEAR, FIELD_LISTING_ID, ROW_COLUMNS, ROW_SELECT, read_data_version,
+)
+from services.rank_snapshot import SNAPSHOT_DIR, SnapshotWriter, column_kinds, prune_snapshots, publish_snapshot
+from utils.db_utils import iter_query_chunks
+from utils.logger import Logger
+
+# ======== 参数变量 ========
+default_chunk_size = 50000    # 服务端游标每块行数
+default_keep       = 2        # 保留的快照版本数（含当前）
+
+logger = Logger.get_global_logger()
+
+
+def run(snapshot_dir: str = SNAPSHOT_DIR, chunk_size: int = default_chunk_size, keep: int = default_keep) -> dict:
+    engine = get_engine()
+    os.makedirs(snapshot_dir, exist_ok=True)
+    with engine.connect() as conn:
+        data_version = read_data_version(conn)
+        columns      = column_kinds(conn, TABLE_NAME, ROW_COLUMNS)
+
+    name   = time.strftime("%Y%m%dT%H%M%S")
+    path   = os.path.join(snapshot_dir, name)
+    writer = SnapshotWriter(path, columns, TABLE_NAME, data_version,
+                            key_columns=(FIELD_FULL_KEY, FIELD_YEAR), id_column=FIELD_LISTING_ID)
+    logger.info("🏁 快照导出开始: %s → %s（data_version=%s）", TABLE_NAME, path, data_version)
+
+    t_start = time.perf_counter()
+    sql = f"""
+        SELECT {ROW_SELECT}
+        FROM {TABLE_NAME}
+        ORDER BY {FIELD_FULL_KEY}, {FIELD_YEAR}, {FIELD_LISTING_ID}
+    """
+    try:
+        for chunk in iter_query_chunks(engine, sql, chunk_size=chunk_size, fmt="records"):
+            writer.append(chunk)
+        manifest = writer.close()
+
+        with engine.connect() as conn:
+            end_version = read_data_version(conn)
+    except Exception:
+        shutil.rmtree(path, ignore_errors=True)
+        raise
+    finally:
+        engine.dispose()
+
+    # ======== 发布：版本一致才切换 CURRENT ========
+    elapsed = time.perf_counter() - t_start
+    if end_version != data_version:
+        shutil.rmtree(path, ignore_errors=True)
+        logger.warning("⚠️ 导出期间源表已变化（%s → %s），快照未发布，请重跑", data_version, end_version)
+        return {"published": False, "elapsed_sec": elapsed, **manifest}
+
+    publish_snapshot(snapshot_dir, name)
+    removed = prune_snapshots(snapshot_dir, keep)
+    size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+    logger.info(
+        "✅ 快照已发布: %s rows=%d cohorts=%d 大小 %.1fMB 用时 %.1fs（清理旧版本 %d 个）",
+        name, manifest["rows"], manifest["cohorts"], size / 2 ** 20, elapsed, len(removed),
+    )
+    return {"published": True, "name": name, "bytes": size, "elapsed_sec": elapsed, **manifest}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="export the ranking table to a memory-mapped columnar snapshot")
+    parser.add_argument("--snapshot-dir", default=SNAPSHOT_DIR, help="快照根目录（API 的 SNAPSHOT_DIR）")
+    parser.add_argument("--chunk-size", type=int, default=default_chunk_size, help="服务端游标每块行数")
+    parser.add_argument("--keep", type=int, default=default_keep, help="保留的版本数（含当前）")
+    args = parser.parse_args()
+
+    run(snapshot_dir=args.snapshot_dir, chunk_size=args.chunk_size, keep=args.keep)
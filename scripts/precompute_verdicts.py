@@ -0,0 +1,151 @@
+# scripts/precompute_verdicts.py
+# -*- coding: utf-8 -*-
+"""
+夜间批量预计算：按 (full_key, year) 顺序流式读取 dws_rehui_rank_cargurus（服务端游标），
+每个 cohort 用 evaluate_cohort 向量化评估，结果 JSON + 关键 flags 经 COPY 暂存表批量 upsert 到结果表。
+API 按 listing_id 主键直接读取当前数据版本的结果，未命中才在线计算。
+
+可重跑：每个 cohort 在同一事务内写完，提交后记入进度表；重跑时跳过进度表中当前数据版本已完成的 cohort。
+全部完成后删除旧版本的行；若计算期间源表发生变化，给出告警（结果版本不匹配，API 不会使用）。
+
+用法（项目根目录）：
+    python -m scripts.precompute_verdicts
+    python -m scripts.precompute_verdicts --force              # 忽略已完成进度，全部重算
+    python -m scripts.precompute_verdicts --write-batch 5000
+"""
+
+import argparse
+import time
+from typing import Iterator, List, Tuple
+
+import pandas as pd
+
+from core.car_value_evaluator import evaluate_cohort
+from core.cohort_stats import CohortStats
+from db.db import get_engine
+from services.car_value_analysis_service import (
+    TABLE_NAME, FIELD_FULL_KEY, FIELD_YEAR, ROW_SELECT, read_data_version,
+)
+from services.verdict_store import (
+    FIELD_LISTING_ID, VERDICT_TABLE, completed_cohorts, delete_stale_verdicts, ensure_verdict_table,
+    mark_cohorts_completed, verdict_record, verdict_table,
+)
+from utils.db_utils import upsert_records
+from utils.logger import Logger
+
+# ======== 参数变量 ========
+default_fetch_size   = 10000    # 服务端游标每次取回的行数
+default_write_batch  = 2000     # 每个写事务累计的行数（按整 cohort 累计，不拆 cohort）
+progress_every_sec   = 10       # 进度日志间隔
+
+logger = Logger.get_global_logger()
+
+
+def iter_cohorts(conn, fetch_size: int) -> Iterator[Tuple[Tuple[str, int], pd.DataFrame]]:
+    """按 (full_key, year) 排序流式读取整表，逐个产出 cohort DataFrame（与 pd.read_sql 同口径）"""
+    sql = f"""
+        SELECT {ROW_SELECT}
+        FROM {TABLE_NAME}
+        ORDER BY {FIELD_FULL_KEY}, {FIELD_YEAR}
+    """
+    result  = conn.execution_options(stream_results=True, max_row_buffer=fetch_size).exec_driver_sql(sql)
+    columns = list(result.keys())
+    key_idx, year_idx = columns.index(FIELD_FULL_KEY), columns.index(FIELD_YEAR)
+
+    current, rows = None, []
+    for part in result.partitions(fetch_size):
+        for r in part:
+            key = (r[key_idx], int(r[year_idx]))
+            if key != current:
+                if rows:
+                    yield current, pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+                current, rows = key, []
+            rows.append(tuple(r))
+    if rows:
+        yield current, pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+
+
+def run(force: bool = False, fetch_size: int = default_fetch_size, write_batch: int = default_write_batch,
+        cleanup: bool = True) -> dict:
+    engine = get_engine()
+    with engine.begin() as conn:
+        ensure_verdict_table(conn)
+        data_version = read_data_version(conn)
+        done = set() if force else completed_cohorts(conn, data_version)
+        total_cohorts = conn.exec_driver_sql(
+            f"SELECT count(*) FROM (SELECT DISTINCT {FIELD_FULL_KEY}, {FIELD_YEAR} FROM {TABLE_NAME}) t"
+        ).scalar()
+    logger.info("🏁 预计算开始: data_version=%s cohorts=%d 已完成=%d", data_version, total_cohorts, len(done))
+
+    verdict_fields = [c.name for c in verdict_table.columns]
+    stats = {"cohorts": 0, "skipped": 0, "listings": 0, "eval_sec": 0.0, "write_sec": 0.0}
+    pending: List[dict] = []
+    pending_cohorts: List[Tuple[str, int]] = []
+    t_start = last_report = time.perf_counter()
+
+    def flush():
+        # 一批（若干个完整 cohort）一个事务：COPY 到暂存表后 ON CONFLICT 合并；提交后再记进度
+        loaded = upsert_records(engine, VERDICT_TABLE, pending, verdict_fields, [FIELD_LISTING_ID])
+        with engine.begin() as wconn:
+            mark_cohorts_completed(wconn, pending_cohorts, data_version)
+        stats["write_sec"] += loaded["elapsed_sec"]
+        pending.clear()
+        pending_cohorts.clear()
+
+    with engine.connect() as rconn:                   # 读连接单独持有服务端游标，写事务提交不影响读取
+        for key, df in iter_cohorts(rconn, fetch_size):
+            if key in done:
+                stats["skipped"] += 1
+                continue
+
+            t0 = time.perf_counter()
+            results = evaluate_cohort(df, CohortStats.from_frame(df))
+            pending.extend(verdict_record(r, data_version) for r in results)
+            pending_cohorts.append(key)
+            stats["eval_sec"] += time.perf_counter() - t0
+            stats["cohorts"]  += 1
+            stats["listings"] += len(results)
+
+            if len(pending) >= write_batch:
+                flush()
+
+            now = time.perf_counter()
+            if now - last_report >= progress_every_sec:
+                last_report = now
+                logger.info(
+                    "⏳ 进度: cohorts %d/%d（跳过 %d） listings=%d  %.0f listings/s",
+                    stats["cohorts"] + stats["skipped"], total_cohorts, stats["skipped"],
+                    stats["listings"], stats["listings"] / (now - t_start),
+                )
+        if pending:
+            flush()
+
+    # ======== 收尾：版本一致性检查 + 清理旧版本 ========
+    with engine.begin() as conn:
+        end_version = read_data_version(conn)
+        if end_version != data_version:
+            logger.warning("⚠️ 计算期间源表已变化（%s → %s），本次结果不会被 API 使用，请重跑", data_version, end_version)
+        elif cleanup:
+            stats["deleted_stale"] = delete_stale_verdicts(conn, data_version)
+
+    elapsed = time.perf_counter() - t_start
+    stats.update(elapsed_sec=elapsed, data_version=data_version,
+                 listings_per_sec=stats["listings"] / elapsed if elapsed > 0 else 0.0)
+    logger.info(
+        "✅ 预计算完成 → %s: cohorts=%d skipped=%d listings=%d 用时 %.1fs（评估 %.1fs / 写入 %.1fs） %.0f listings/s",
+        VERDICT_TABLE, stats["cohorts"], stats["skipped"], stats["listings"],
+        elapsed, stats["eval_sec"], stats["write_sec"], stats["listings_per_sec"],
+    )
+    engine.dispose()
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="precompute every listing's verdict into the results table")
+    parser.add_argument("--force", action="store_true", help="忽略已完成进度，全部重算")
+    parser.add_argument("--fetch-size", type=int, default=default_fetch_size, help="服务端游标每批行数")
+    parser.add_argument("--write-batch", type=int, default=default_write_batch, help="每个写事务的行数")
+    parser.add_argument("--no-cleanup", action="store_true", help="完成后不删除旧版本的行")
+    args = parser.parse_args()
+
+    run(force=args.force, fetch_size=args.fetch_size, write_batch=args.write_batch, cleanup=not args.no_cleanup)
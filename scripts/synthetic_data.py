@@ -0,0 +1,91 @@
+# scripts/synthetic_data.py
+# -*- coding: utf-8 -*-
+"""
+合成数据：生成与 dws_rehui_rank_cargurus 同形状的 DataFrame（基准测试 / 本地替身库用）。
+字段、类型、缺失值比例与线上表保持一致；options / safety_features 为 JSON 字符串。
+"""
+
+import json
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+__all__ = ["make_cohort", "make_table", "DEFAULT_FULL_KEYS"]
+
+# ======== 参数变量 ========
+DEFAULT_FULL_KEYS = [
+    "honda_civic_ex_gasoline",
+    "toyota_rav4_le_hybrid",
+    "tesla_model 3_standard_range_plus_rwd_electric",
+    "volkswagen_golf_tdi_diesel",
+    "ford_f-150_xlt_gasoline",
+]
+option_pool = [
+    "Leather Seats", "Navigation System", "Sunroof/Moonroof", "Heated Seats", "Heated Steering Wheel",
+    "Remote Start", "Third Row Seating", "Premium Sound System", "Adaptive Cruise Control",
+    "Ventilated Seats", "Heads-Up Display", "Multi Zone Climate Control", "Bluetooth", "Alloy Wheels",
+]
+safety_pool = [
+    "Automatic Emergency Braking", "Lane Departure Warning", "Blind Spot Monitoring", "Rear Cross Traffic Alert",
+    "Adaptive Cruise Control", "Parking Sensors", "Backup Camera", "Curtain Airbags",
+    "Frontal Collision Warning", "ABS Brakes", "Stability Control",
+]
+heat_rank_null_ratio = 0.10     # 热度缺失比例
+as_is_ratio          = 0.03     # AS-IS 比例
+
+
+def _json_lists(rng: np.random.Generator, pool: List[str], n: int, max_items: int) -> List[str]:
+    counts = rng.integers(0, max_items + 1, n)
+    return [json.dumps(list(rng.choice(pool, size=int(k), replace=False))) for k in counts]
+
+
+def make_cohort(n: int, full_key: str = DEFAULT_FULL_KEYS[0], year: int = 2019,
+                seed: int = 7, listing_id_start: int = 400000000) -> pd.DataFrame:
+    """生成单个 (full_key, year) cohort，共 n 行"""
+    rng     = np.random.default_rng(seed)
+    ids     = np.arange(listing_id_start + 1, listing_id_start + n + 1)
+    y_pred  = rng.normal(25000, 4000, n)
+    actual  = y_pred + rng.normal(0, 2000, n)
+    mileage = rng.integers(10000, 150000, n).astype("float64")
+    m_pred  = mileage + rng.normal(0, 15000, n)
+    nb      = y_pred * rng.uniform(0.90, 0.99, n)
+    heat    = np.where(rng.random(n) > heat_rank_null_ratio, rng.integers(1, 5000, n), np.nan)
+
+    return pd.DataFrame({
+        "listing_id": ids.astype(str),
+        "full_key": full_key,
+        "year": year,
+        "url": [f"https://www.cargurus.ca/Cars/inventorylisting/x#listing={i}/NONE/DEFAULT" for i in ids],
+        "price_saving": (y_pred - actual).round(2),
+        "actual_price": actual.round(2),
+        "y_pred": y_pred.round(2),
+        "mileage_saving": ((m_pred - mileage) * 0.08).round(2),
+        "mileage": mileage,
+        "mileage_y_pred": m_pred.round(1),
+        "price_per_km": 0.08,
+        "expected_depreciation": (y_pred - nb).round(2),
+        "next_bin_avg_price": nb.round(2),
+        "heat_rank": heat,
+        "mileage_bin": (mileage // 20000).astype("int64"),
+        "certified": rng.random(n) < 0.2,
+        "accident_free": rng.random(n) < 0.5,
+        "carfax": rng.random(n) < 0.5,
+        "as_is": rng.random(n) < as_is_ratio,
+        "options": _json_lists(rng, option_pool, n, 6),
+        "safety_features": _json_lists(rng, safety_pool, n, 5),
+    })
+
+
+def make_table(cohorts: Optional[Iterable[Tuple[str, int, int]]] = None, seed: int = 7) -> pd.DataFrame:
+    """
+    生成多 cohort 的整表：cohorts = [(full_key, year, size), ...]
+    默认 5 个车型 × 不同规模（10 ~ 1000）。listing_id 全表唯一。
+    """
+    if cohorts is None:
+        cohorts = [(k, 2015 + i, size) for i, (k, size) in enumerate(zip(DEFAULT_FULL_KEYS, [10, 50, 200, 400, 1000]))]
+    frames, start = [], 400000000
+    for i, (full_key, year, size) in enumerate(cohorts):
+        frames.append(make_cohort(size, full_key, year, seed=seed + i, listing_id_start=start))
+        start += size
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,69 @@
+import re
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+from utils.db_utils import _CopyStream, _copy_value
+
+_UNESCAPE = {"\\": "\\", "t": "\t", "n": "\n", "r": "\r", "b": "\b", "f": "\f", "v": "\v"}
+
+
+def _parse_copy_text(data: bytes) -> list:
+    """按 PostgreSQL COPY text 格式解码（字段以制表符分隔、行以换行结束，\\N 为 NULL）"""
+    rows = []
+    for line in data.decode("utf-8").split("\n")[:-1]:
+        row = []
+        for field in line.split("\t"):
+            if field == "\\N":
+                row.append(None)
+            else:
+                row.append(re.sub(r"\\(.)", lambda m: _UNESCAPE.get(m.group(1), m.group(1)), field))
+        rows.append(row)
+    return rows
+
+
+def test_copy_value_escaping():
+    assert _copy_value(None) == "\\N"
+    assert _copy_value(pd.NA) == "\\N" and _copy_value(pd.NaT) == "\\N"
+    assert _copy_value(float("nan")) == "\\N" and _copy_value(np.float64("nan")) == "\\N"
+    assert _copy_value(True) == "t" and _copy_value(False) == "f"
+    assert _copy_value(1.5) == "1.5" and _copy_value(np.float64(0.1)) == "0.1" and _copy_value(Decimal("2.50")) == "2.50"
+    assert _copy_value("a\tb\nc\\d\re") == "a\\tb\\nc\\\\d\\re"
+    assert _copy_value("\\N") == "\\\\N"                      # 字面量 "\N" 不能被当成 NULL
+    assert _copy_value({"k": "x\ty"}) == '{"k": "x\\\\ty"}'         # JSON 转义出的反斜杠再按 COPY 转义
+
+
+def test_copy_stream_round_trip():
+    # ======== 参数变量 ========
+    fields  = ["id", "text", "value", "flag"]
+    records = [
+        {"id": 1, "text": "tab\there", "value": 1.25, "flag": True},
+        {"id": 2, "text": "line\nbreak\r\n", "value": float("nan"), "flag": False},
+        (3, "back\\slash \\t \\N", None, None),
+        (4, "\\N", np.float64(-0.0), True),
+        {"id": 5, "text": "中文\t😀", "value": 1e-300},          # 缺失字段按 NULL
+        {"id": 6, "text": "", "value": float("inf"), "flag": None},
+    ]
+    expected = [
+        ["1", "tab\there", "1.25", "t"],
+        ["2", "line\nbreak\r\n", None, "f"],
+        ["3", "back\\slash \\t \\N", None, None],
+        ["4", "\\N", "-0.0", "t"],
+        ["5", "中文\t😀", "1e-300", None],
+        ["6", "", "inf", None],
+    ]
+
+    whole = _CopyStream(records, fields).read()
+    assert _parse_copy_text(whole) == expected
+
+    # 小块读取（跨行、跨多字节字符切分）拼接后与一次读完完全相同
+    stream, chunks = _CopyStream(records, fields), []
+    while chunk := stream.read(7):
+        chunks.append(chunk)
+    assert b"".join(chunks) == whole and stream.rows == len(records)
+
+
+if __name__ == "__main__":
+    test_copy_value_escaping()
+    test_copy_stream_round_trip()
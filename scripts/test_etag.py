@@ -0,0 +1,50 @@
+from starlette.requests import Request
+
+from api.main_api import cached_json_response, etag_matches
+
+
+def _request(if_none_match: str = None) -> Request:
+    headers = [] if if_none_match is None else [(b"if-none-match", if_none_match.encode())]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def test_etag_matches():
+    # ======== 参数变量 ========
+    etag = '"abc123"'
+
+    assert etag_matches('"abc123"', etag)
+    assert etag_matches("*", etag)
+    assert etag_matches('W/"abc123"', etag)                       # 弱比较：忽略 W/ 前缀
+    assert etag_matches('"zzz", W/"abc123"', etag)                # 多值，任一匹配即可
+    assert etag_matches('"zzz" ,  "abc123" ', etag)               # 逗号两侧空白
+    assert etag_matches('"zzz", *', etag)
+
+    assert not etag_matches("", etag)
+    assert not etag_matches('"zzz"', etag)
+    assert not etag_matches("abc123", etag)                       # 缺引号不是同一个实体标签
+    assert not etag_matches('"abc"', etag)
+    assert not etag_matches('W/"zzz", "abc1234"', etag)
+
+
+def test_cached_json_response():
+    # ======== 参数变量 ========
+    body = b'{"ok":true}'
+    etag = '"abc123"'
+
+    fresh = cached_json_response(_request(), body, etag)
+    assert fresh.status_code == 200 and fresh.body == body
+    assert fresh.headers["etag"] == etag and fresh.headers["content-type"] == "application/json"
+    assert "cache-control" in fresh.headers
+
+    for header in ('"abc123"', 'W/"abc123"', '"x", "abc123"', "*"):
+        hit = cached_json_response(_request(header), body, etag)
+        assert hit.status_code == 304 and hit.body == b"", header
+        assert hit.headers["etag"] == etag, header
+
+    miss = cached_json_response(_request('"other"'), body, etag)
+    assert miss.status_code == 200 and miss.body == body
+
+
+if __name__ == "__main__":
+    test_etag_matches()
+    test_cached_json_response()
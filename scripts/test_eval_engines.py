@@ -0,0 +1,98 @@
+import os
+import tempfile
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from core.car_value_evaluator import evaluate, evaluate_cohort
+from core.cohort_stats import CohortStats
+import services.car_value_analysis_service as service
+from services.car_value_analysis_service import ROW_COLUMNS, _record_from_row
+from services.rank_snapshot import RankSnapshot, SnapshotWriter
+from scripts.synthetic_data import make_cohort
+from utils.serialize import dumps
+
+
+def _db_values(df: pd.DataFrame, i: int) -> list:
+    """模拟游标返回的一行：NULL → None，其余为 Python 标量"""
+    return [None if (isinstance(v, float) and v != v) else (v.item() if isinstance(v, np.generic) else v)
+            for v in df.iloc[i].tolist()]
+
+
+def _snapshot_kinds(df: pd.DataFrame) -> list:
+    kinds = {"b": "bool", "i": "int", "f": "float"}
+    return [(c, kinds.get(df[c].dtype.kind, "text")) for c in df.columns]
+
+
+def _outcome(fn, *args) -> bytes:
+    try:
+        return dumps(fn(*args))
+    except Exception as e:                       # 两个引擎应以相同方式失败
+        return type(e).__name__.encode()
+
+
+def _cohort_with_zero_rows(size: int, zero_rows: dict) -> pd.DataFrame:
+    df = make_cohort(size, seed=11)
+    for i, (y_pred, next_bin) in zero_rows.items():
+        df.loc[i, "y_pred"], df.loc[i, "next_bin_avg_price"] = y_pred, next_bin
+    return df
+
+
+def test_eval_engines():
+    # ======== 参数变量 ========
+    cohort_size = 300                              # 合成 cohort 行数
+    zero_rows   = {5: (0.0, 12000.0),              # y_pred = 0 → 贬值率 -inf
+                   6: (0.0, 0.0)}                  # 0 / 0 → NaN
+
+    df = _cohort_with_zero_rows(cohort_size, zero_rows)
+    keys  = list(df.columns)
+    stats = CohortStats.from_frame(df)
+
+    # ======== 逐行对照：pandas 引擎（单行 read_sql）/ 游标 dict 行 / 整 cohort 向量化 ========
+    warnings.simplefilter("ignore", RuntimeWarning)
+    cohort = evaluate_cohort(df, stats)
+    for i in range(cohort_size):
+        values     = _db_values(df, i)
+        pandas_row = pd.DataFrame.from_records([values], columns=keys, coerce_float=True).iloc[0]
+        record     = _record_from_row(keys, values)
+        expected   = _outcome(evaluate, df, pandas_row, stats)
+        assert _outcome(evaluate, None, record, stats) == expected, f"row {i}: dict row differs from pandas row"
+        if i in zero_rows:
+            assert expected == dumps(cohort[i]), f"row {i}: single-row result differs from evaluate_cohort"
+
+
+def test_eval_engines_snapshot():
+    # ======== 参数变量 ========
+    cohort_size = 60
+    zero_rows   = {5: (0.0, 12000.0), 6: (0.0, 0.0)}
+
+    df    = _cohort_with_zero_rows(cohort_size, zero_rows)[ROW_COLUMNS]
+    stats = CohortStats.from_frame(df)
+    warnings.simplefilter("ignore", RuntimeWarning)
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        # ======== 导出快照，服务层改为从快照取行 ========
+        path   = os.path.join(snapshot_dir, "test")
+        writer = SnapshotWriter(path, _snapshot_kinds(df), "test", "v1", ("full_key", "year"), "listing_id")
+        writer.append([tuple(_db_values(df, i)) for i in range(cohort_size)])
+        writer.close()
+        snapshot = RankSnapshot(path)
+        get_snapshot, engine = service.get_snapshot, service.EVAL_ENGINE
+        service.get_snapshot = lambda: snapshot
+        try:
+            for i in range(cohort_size):
+                listing_id = str(df["listing_id"].iloc[i])
+                service.EVAL_ENGINE = "pandas"
+                expected = _outcome(evaluate, df, service._fetch_row_snapshot(listing_id), stats)
+                service.EVAL_ENGINE = "numpy"
+                record = service._fetch_row_snapshot(listing_id)
+                assert _outcome(evaluate, None, record, stats) == expected, f"row {i}: snapshot dict row differs"
+                if i in zero_rows:
+                    assert b"ZeroDivisionError" not in expected, f"row {i}"
+        finally:
+            service.get_snapshot, service.EVAL_ENGINE = get_snapshot, engine
+
+
+if __name__ == "__main__":
+    test_eval_engines()
+    test_eval_engines_snapshot()
@@ -0,0 +1,89 @@
+import asyncio
+import os
+import tempfile
+
+import services.car_value_analysis_service as service
+from core.listing_index import ListingIndexBuilder
+from scripts.bench_suite import _install_stand_in
+from scripts.synthetic_data import make_cohort
+from utils.serialize import dumps
+
+
+def _build(rows: list, with_rows: bool = True):
+    builder = ListingIndexBuilder()
+    for row_no, (listing_id, full_key, year) in enumerate(rows):
+        builder.add(listing_id, full_key, year, row_no)
+    return builder.build(with_rows=with_rows, version="v1")
+
+
+def test_listing_index_lookup():
+    # ======== 参数变量 ========
+    rows = [
+        ("300", "Honda|Civic", 2020),
+        ("12", "Toyota|Camry", 2019),
+        ("007", "Honda|Civic", 2020),        # 非规范数字：前导 0，走兜底字典
+        ("abc-1", "Toyota|Camry", 2019),
+        ("12", "Honda|Civic", 2021),          # 重复 id：保留先出现的一行
+        ("41", None, 2020),                   # full_key 为 NULL：无 cohort
+        ("١٢", "Ford|F-150", 2018),           # 阿拉伯-印度数字：不能当成 "12"
+        ("²", "Ford|F-150", 2018),            # 上标 2：isdigit 为 True，但 int() 报错
+        (None, "Ford|F-150", 2018),           # listing_id 为 NULL：跳过
+    ]
+
+    index = _build(rows)
+    assert len(index) == 7 and index.version == "v1"           # 3 个数字 id + 4 个兜底
+    assert index.cohort_of("300") == ("Honda|Civic", 2020) and index.row_of("300") == 0
+    assert index.cohort_of("12") == ("Toyota|Camry", 2019) and index.row_of("12") == 1
+    assert index.cohort_of(12) == ("Toyota|Camry", 2019)
+    assert index.cohort_of("007") == ("Honda|Civic", 2020) and index.row_of("007") == 2
+    assert "7" not in index and "0012" not in index
+    assert index.cohort_of("abc-1") == ("Toyota|Camry", 2019)
+    assert "41" in index and index.cohort_of("41") is None
+    assert index.cohort_of("١٢") == ("Ford|F-150", 2018) and index.row_of("١٢") == 6
+    assert index.cohort_of("²") == ("Ford|F-150", 2018) and "2" not in index
+
+    # 未命中
+    for missing in ("999", "1", "", "12 ", "-12", "1" * 30, "abc"):
+        assert missing not in index and index.cohort_of(missing) is None and index.row_of(missing) is None, missing
+
+    # 数据库模式不记行号
+    assert _build(rows, with_rows=False).row_of("300") is None
+
+
+def test_listing_index_save_load():
+    index = _build([(str(i * 7), f"key{i % 3}", 2000 + i % 5) for i in range(500)] + [("x1", "key0", 2001)])
+    with tempfile.TemporaryDirectory() as path:
+        prefix = os.path.join(path, "listing_index")
+        index.save(prefix)
+        for mmap in (True, False):
+            back = type(index).load(prefix, mmap=mmap)
+            assert len(back) == len(index) and back.version == index.version and back.nbytes == index.nbytes
+            for listing_id in ("0", "7", "3493", "x1", "8", "y"):
+                assert back.cohort_of(listing_id) == index.cohort_of(listing_id), listing_id
+                assert back.row_of(listing_id) == index.row_of(listing_id), listing_id
+
+
+def test_stale_index_falls_back_to_row_cohort():
+    # ======== 参数变量 ========
+    df = make_cohort(40, seed=3)
+    df.loc[20:, "year"] = int(df["year"].iloc[0]) + 1              # 两个 cohort
+    listing_id = str(df["listing_id"].iloc[25])
+
+    names    = [n for n in dir(service) if n.startswith(("_fetch", "_current_data_version"))] + ["_listing_index"]
+    original = {n: getattr(service, n) for n in names}
+    _install_stand_in(service, df)
+    try:
+        fresh = dumps(asyncio.run(service.evaluate_by_listing_id_async(listing_id)))
+        # 索引落后于数据：仍指向车源旧的 cohort，结果应以行数据里的 cohort 为准
+        service._listing_index = _build([(listing_id, df["full_key"].iloc[0], int(df["year"].iloc[0]))])
+        assert service._indexed_cohort(listing_id) != (df["full_key"].iloc[25], int(df["year"].iloc[25]))
+        assert dumps(asyncio.run(service.evaluate_by_listing_id_async(listing_id))) == fresh
+    finally:
+        for n, v in original.items():
+            setattr(service, n, v)
+
+
+if __name__ == "__main__":
+    test_listing_index_lookup()
+    test_listing_index_save_load()
+    test_stale_index_falls_back_to_row_cohort()
@@ -0,0 +1,132 @@
+import bisect
+import random
+import warnings
+
+import pandas as pd
+
+from core.car_value_evaluator import decide_is_recommended
+from core.cohort_stats import CohortStats, QUANTILE_LEVELS
+from core.live_cohort import DECISION_FIELDS, LiveCohortStats, _SortedKeys
+from scripts.synthetic_data import make_cohort
+
+
+def _same(a: float, b: float) -> bool:
+    return a == b or (a != a and b != b)
+
+
+def _random_row(rng: random.Random, listing_id: str) -> dict:
+    """随机车源：含 NULL、y_pred = 0（贬值率 ±inf）、热度缺失 / NaN、AS-IS"""
+    y_pred = 25000.0 + rng.gauss(0, 4000)
+    if rng.random() < 0.05:
+        y_pred = rng.choice([0.0, None])
+    return {
+        "listing_id":         listing_id,
+        "price_saving":       None if rng.random() < 0.05 else round(rng.gauss(0, 2000), 2),
+        "mileage_saving":     None if rng.random() < 0.05 else (0.0 if rng.random() < 0.1 else round(rng.gauss(0, 1200), 2)),
+        "y_pred":             y_pred,
+        "next_bin_avg_price": None if y_pred is None else (y_pred or 1.0) * rng.uniform(0.9, 0.99),
+        "heat_rank":          rng.choice([None, float("nan"), rng.randrange(1, 50), rng.randrange(1, 5000)]),
+        "certified":          rng.random() < 0.2,
+        "accident_free":      rng.random() < 0.5,
+        "carfax":             rng.random() < 0.5,
+        "as_is":              rng.random() < 0.03,
+    }
+
+
+def _rebuild(rows: dict):
+    """从零重建：CohortStats + 逐条 decide_is_recommended（参照结果）"""
+    df = pd.DataFrame.from_records([{**r, "listing_id": lid} for lid, r in rows.items()],
+                                   columns=["listing_id", *DECISION_FIELDS], coerce_float=True)
+    stats = CohortStats.from_frame(df)
+    verdicts = {lid: decide_is_recommended(None, {c: df[c].iloc[i] for c in DECISION_FIELDS}, stats)
+                for i, lid in enumerate(df["listing_id"])}
+    return stats, verdicts
+
+
+def test_sorted_keys():
+    # ======== 参数变量 ========
+    rng        = random.Random(1)
+    operations = 3000                  # 随机插入 / 删除次数
+    value_span = 50                    # 取值范围小，制造大量重复值
+    bucket     = 4                     # 小桶：频繁拆分 / 合并
+
+    keys, ref = _SortedKeys(load=bucket), []
+    for i in range(operations):
+        if ref and rng.random() < 0.45:
+            key = ref.pop(rng.randrange(len(ref)))
+            keys.remove(key)
+        else:
+            key = (float(rng.randrange(value_span)), i)
+            keys.add(key)
+            bisect.insort(ref, key)
+        if i % 97 == 0:
+            assert len(keys) == len(ref) and [keys[j] for j in range(len(ref))] == ref
+            lo, hi = sorted((rng.randrange(value_span), rng.randrange(value_span)))
+            assert sorted(keys.irange(lo, hi)) == sorted(no for v, no in ref if lo <= v <= hi)
+            probe = (rng.randrange(value_span) + 0.5, 0)
+            assert keys.bisect_left(probe) == bisect.bisect_left(ref, probe)
+            assert keys.bisect_right(probe) == bisect.bisect_right(ref, probe)
+
+
+def test_live_cohort_matches_rebuild():
+    # ======== 参数变量 ========
+    rng           = random.Random(2)
+    initial_sizes = [0, 5, 19, 25, 300]      # 覆盖 RECOMMEND_MIN_SAMPLES（20）两侧
+    steps         = 150                      # 每个 cohort 的随机更新次数
+    probe_values  = (0.0, 123.4, -50.0, float("nan"))
+
+    warnings.simplefilter("ignore", RuntimeWarning)
+    for size in initial_sizes:
+        df   = make_cohort(max(size, 1), seed=size).iloc[:size]
+        live = LiveCohortStats.from_frame(df)
+        rows = {str(r["listing_id"]): {c: r[c] for c in DECISION_FIELDS} for r in df.to_dict("records")}
+        _, before = _rebuild(rows)
+        assert all(live.verdict(lid)[0] == v[0] for lid, v in before.items()), f"initial verdicts, size={size}"
+
+        for step in range(steps):
+            # ======== 随机操作：删除 / 更新已有车源 / 新车源上架 ========
+            r = rng.random()
+            if rows and r < 0.35:
+                listing_id = rng.choice(list(rows))
+                out = live.remove(listing_id)
+                del rows[listing_id]
+            else:
+                listing_id = rng.choice(list(rows)) if rows and r < 0.5 else f"{size}-{step}"
+                row = _random_row(rng, listing_id)
+                rows[listing_id] = {c: row[c] for c in DECISION_FIELDS}
+                out = live.insert(listing_id, row)
+
+            # ======== 与从零重建逐项对照 ========
+            stats, after = _rebuild(rows)
+            where = f"size={size} step={step}"
+            assert live.n == stats.n == out["n"], where
+            for field, levels in QUANTILE_LEVELS.items():
+                for p in levels:
+                    assert _same(live.quantile(field, p), stats.quantile(field, p)), f"quantile {field}@{p}, {where}"
+                for v in probe_values:
+                    assert live.rank_desc(field, v) == stats.rank_desc(field, v), f"rank_desc {field}, {where}"
+                    assert live.rank_asc(field, v) == stats.rank_asc(field, v), f"rank_asc {field}, {where}"
+            for lid, (is_rec, flags) in after.items():
+                assert live.verdict(lid) == (is_rec, flags), f"verdict {lid}, {where}"
+
+            # 翻转报告 = 除本次操作的车源外，结论发生变化的全部车源（不多也不少）
+            expected = {lid for lid in after if lid in before and lid != listing_id and after[lid][0] != before[lid][0]}
+            reported = {f["listing_id"] for f in out["flipped"]}
+            assert reported == expected, f"flipped {reported ^ expected}, {where}"
+            assert all(f["is_recommended"] == after[f["listing_id"]][0] for f in out["flipped"]), where
+            before = after
+
+
+def test_remove_missing_raises():
+    live = LiveCohortStats.from_frame(make_cohort(3))
+    try:
+        live.remove("missing")
+    except KeyError:
+        return
+    raise AssertionError("remove() of an unknown listing_id should raise KeyError")
+
+
+if __name__ == "__main__":
+    test_sorted_keys()
+    test_live_cohort_matches_rebuild()
+    test_remove_missing_raises()
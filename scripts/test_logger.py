@@ -1,4 +1,9 @@
-from utils.logger import Logger
+import logging
+import os
+import queue
+import tempfile
+
+from utils.logger import DailyFileHandler, DeferredQueueHandler, Logger
 
 
 def test_logger():
@@ -14,5 +19,33 @@ def test_logger():
     logger.error(message_error)
 
 
+def test_deferred_handler_snapshots_mutable_args():
+    # ======== 参数变量 ========
+    log_queue = queue.SimpleQueue()
+    logger    = logging.getLogger("test_deferred_handler")
+    payload   = {"price": 1}
+
+    logger.propagate = False
+    logger.addHandler(DeferredQueueHandler(log_queue))
+    logger.warning("payload=%s", payload)
+    logger.warning("n=%d s=%s", 3, "x")
+    payload["price"] = 2                                 # 入队后修改：不应影响已记录的内容
+
+    mutable, primitive = log_queue.get_nowait(), log_queue.get_nowait()
+    assert mutable.getMessage() == "payload={'price': 1}" and mutable.args is None
+    assert primitive.args == (3, "x") and primitive.getMessage() == "n=3 s=x"
+
+
+def test_daily_handler_keeps_files_on_construction():
+    with tempfile.TemporaryDirectory() as log_dir:
+        old = os.path.join(log_dir, "app_20000101.log")
+        open(old, "w").close()
+        handler = DailyFileHandler(log_dir, "app", retention_days=1)
+        handler.close()
+        assert os.path.exists(old)                       # 只在跨零点切换时清理
+
+
 if __name__ == "__main__":
     test_logger()
+    test_deferred_handler_snapshots_mutable_args()
+    test_daily_handler_keeps_files_on_construction()
@@ -0,0 +1,35 @@
+from utils.lru_cache import LRUCache
+
+
+def test_lru_cache_stale_put():
+    # ======== 参数变量 ========
+    cache = LRUCache("test", max_entries=10, max_bytes=1 << 20, ttl_seconds=60)
+
+    cache.check_version("v1")
+    assert cache.put("a", 1, "v1") and cache.get("a") == 1
+
+    # 计算在 v1 下开始，期间数据版本切换到 v2（check_version 清空缓存），之后才写入：丢弃
+    cache.check_version("v2")
+    assert cache.get("a") is None
+    assert not cache.put("b", "stale", "v1")
+    assert cache.get("b") is None and cache.stats()["stale_puts"] == 1
+
+    # 当前版本 / 不校验版本的写入照常生效
+    assert cache.put("b", "fresh", "v2") and cache.get("b") == "fresh"
+    assert cache.put("c", 3) and cache.get("c") == 3
+
+
+def test_lru_cache_limits():
+    cache = LRUCache("test", max_entries=2, max_bytes=10, ttl_seconds=0, sizeof=len)
+    cache.put("a", "xxxx")
+    cache.put("b", "yyyy")
+    cache.get("a")                                   # a 变为最近使用
+    cache.put("c", "zz")                             # 超过条目数：淘汰最久未用的 b
+    assert cache.get("b") is None and cache.get("a") == "xxxx" and cache.get("c") == "zz"
+    assert not cache.put("big", "x" * 11)            # 单条超过字节上限：不缓存
+    assert cache.stats()["evictions"] == 1
+
+
+if __name__ == "__main__":
+    test_lru_cache_stale_put()
+    test_lru_cache_limits()
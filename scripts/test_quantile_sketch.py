@@ -0,0 +1,150 @@
+import itertools
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from core.car_value_evaluator import _decide_cohort, evaluate_cohort
+from core.cohort_stats import CohortStats, QUANTILE_LEVELS
+from core.quantile_sketch import CohortSketch, KLLSketch, SKETCH_FIELDS
+from scripts.synthetic_data import make_cohort
+from utils.serialize import dumps
+
+
+def _decide(df: pd.DataFrame, stats) -> list:
+    price = df["price_saving"].to_numpy(dtype="float64", na_value=np.nan)
+    mile  = df["mileage_saving"].to_numpy(dtype="float64", na_value=np.nan)
+    y     = df["y_pred"].to_numpy(dtype="float64", na_value=np.nan)
+    nb    = df["next_bin_avg_price"].to_numpy(dtype="float64", na_value=np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return _decide_cohort(df, stats, price, mile, (y - nb) / y)
+
+
+def _shards(df: pd.DataFrame, count: int, k: int, chunk: int) -> list:
+    """每个分片按块流式构建（模拟各自读取游标分块）"""
+    out = []
+    for s, rows in enumerate(np.array_split(np.arange(len(df)), count)):
+        sketch = CohortSketch(k, seed=7 * s + 1)
+        for start in range(0, len(rows), chunk):
+            sketch.update_frame(df.iloc[rows[start:start + chunk]])
+        out.append(sketch)
+    return out
+
+
+def _merged(blobs: list) -> CohortSketch:
+    merged = CohortSketch.from_bytes(blobs[0])
+    for blob in blobs[1:]:
+        merged.merge(CohortSketch.from_bytes(blob))
+    return merged
+
+
+def _cohort_with_zero_pred(size: int, seed: int) -> pd.DataFrame:
+    df = make_cohort(size, seed=seed)
+    df.loc[1, "y_pred"] = 0.0                                   # 贬值率 -inf
+    df.loc[2, "price_saving"] = np.nan
+    return df
+
+
+def test_exact_mode_identity():
+    # ======== 参数变量 ========
+    k     = 200                                                 # 样本数 <= k：从未压缩
+    sizes = [25, 120, 200]
+
+    warnings.simplefilter("ignore", RuntimeWarning)
+    for size in sizes:
+        df     = _cohort_with_zero_pred(size, seed=size)
+        exact  = CohortStats.from_frame(df)
+        sketch = CohortSketch.from_chunks([df.iloc[:size // 3], df.iloc[size // 3:]], k=k)
+        assert sketch.is_exact and sketch.n == exact.n, f"size={size}"
+        for field, levels in QUANTILE_LEVELS.items():
+            for p in levels:
+                assert sketch.quantile(field, p) == exact.quantile(field, p), f"quantile {field}@{p}, size={size}"
+            for v in exact.sorted[field]:
+                assert sketch.rank_desc(field, v) == exact.rank_desc(field, v), f"rank_desc {field}, size={size}"
+                assert sketch.rank_asc(field, v) == exact.rank_asc(field, v), f"rank_asc {field}, size={size}"
+        assert _decide(df, sketch) == _decide(df, exact), f"verdicts, size={size}"
+        assert dumps(evaluate_cohort(df, sketch)) == dumps(evaluate_cohort(df, exact)), f"evaluate_cohort, size={size}"
+
+
+def test_threshold_error_within_bound():
+    # ======== 参数变量 ========
+    k      = 64                                                 # 小 k：确保发生多层压缩
+    sizes  = [500, 5000, 30000]
+    shards = 3
+    chunk  = 700
+
+    warnings.simplefilter("ignore", RuntimeWarning)
+    for size in sizes:
+        df     = _cohort_with_zero_pred(size, seed=size)
+        exact  = CohortStats.from_frame(df)
+        sketch = _merged([s.to_bytes() for s in _shards(df, shards, k, chunk)])
+        assert not sketch.is_exact and sketch.n == size
+        for field, levels in QUANTILE_LEVELS.items():
+            arr   = exact.sorted[field]
+            bound = sketch.sketches[field].rank_error_bound
+            assert sketch.sketches[field].count == len(arr)
+            for p in levels:
+                # 草图阈值在精确排序数组中的位置区间 [lo-1, hi] 与目标位置 p*(m-1) 的距离
+                pos = p * (len(arr) - 1)
+                v   = sketch.quantile(field, p)
+                lo  = np.searchsorted(arr, v, side="left")
+                hi  = np.searchsorted(arr, v, side="right")
+                assert max(0.0, (lo - 1) - pos, pos - hi) <= bound + 1, f"{field}@{p}, size={size}"
+            # 任意查询值的估计名次误差不超过误差界
+            probes = arr[::max(1, len(arr) // 200)]
+            est    = sketch.ranks_asc(field, probes) - 1
+            assert np.abs(est - np.searchsorted(arr, probes, side="left")).max() <= bound, f"{field}, size={size}"
+
+        verdicts = _decide(df, sketch)
+        assert len(verdicts) == size
+        agree = sum(a[0] == b[0] for a, b in zip(verdicts, _decide(df, exact)))
+        assert agree / size >= 0.95, f"only {agree}/{size} verdicts agree, size={size}"
+
+
+def test_serialization_round_trip():
+    warnings.simplefilter("ignore", RuntimeWarning)
+    df = _cohort_with_zero_pred(8000, seed=3)
+    for sketch in (CohortSketch.from_frame(df.iloc[:50], k=64), _shards(df, 1, 64, 900)[0]):
+        blob = sketch.to_bytes()
+        back = CohortSketch.from_bytes(blob)
+        assert back.to_bytes() == blob and back.n == sketch.n and back.is_exact == sketch.is_exact
+        for field in SKETCH_FIELDS:
+            a, b = sketch.sketches[field], back.sketches[field]
+            assert (a.count, a.rank_error_bound, a.k) == (b.count, b.rank_error_bound, b.k)
+            assert all(np.array_equal(x, y) for x, y in zip(a.levels, b.levels)) and len(a.levels) == len(b.levels)
+        for field, levels in QUANTILE_LEVELS.items():
+            for p in levels:
+                assert back.quantile(field, p) == sketch.quantile(field, p)
+        assert _decide(df, back) == _decide(df, sketch)
+
+    single = KLLSketch(32, seed=5).update([1.0, np.inf, -np.inf, np.nan, 2.5] * 40)
+    assert KLLSketch.from_bytes(single.to_bytes()).to_bytes() == single.to_bytes()
+
+
+def test_merge_order_independent():
+    # ======== 参数变量 ========
+    k      = 64
+    shards = 4
+
+    warnings.simplefilter("ignore", RuntimeWarning)
+    df    = _cohort_with_zero_pred(12000, seed=9)
+    blobs = [s.to_bytes() for s in _shards(df, shards, k, 800)]
+    results = {_merged([blobs[i] for i in order]).to_bytes() for order in itertools.permutations(range(shards))}
+    assert len(results) == 1, f"{len(results)} distinct results across merge orders"
+
+    merged, exact = CohortSketch.from_bytes(results.pop()), CohortStats.from_frame(df)
+    assert merged.n == exact.n
+    assert all(merged.sketches[f].count == len(exact.sorted[f]) for f in SKETCH_FIELDS)
+
+    try:
+        KLLSketch(64).merge(KLLSketch(32))
+    except ValueError:
+        return
+    raise AssertionError("merging sketches with different k should raise ValueError")
+
+
+if __name__ == "__main__":
+    test_exact_mode_identity()
+    test_threshold_error_within_bound()
+    test_serialization_round_trip()
+    test_merge_order_independent()
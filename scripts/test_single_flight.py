@@ -0,0 +1,119 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.single_flight import AsyncSingleFlight, SingleFlight
+
+
+def _wait_until(predicate, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def _sync_round(flight: SingleFlight, callers: int, fail: bool) -> list:
+    """callers 个线程同时对同一 key 调用 do()，执行体等到全部调用方都已合并进来才返回"""
+    release, calls = threading.Event(), []
+    base = flight.stats()["coalesced"]
+
+    def loader(x):
+        calls.append(x)
+        release.wait(5)
+        if fail:
+            raise RuntimeError("boom")
+        return {"value": x}
+
+    def call(i):
+        try:
+            return flight.do("k", loader, i)
+        except RuntimeError as e:
+            return e
+
+    with ThreadPoolExecutor(callers) as pool:
+        futures = [pool.submit(call, i) for i in range(callers)]
+        _wait_until(lambda: flight.stats()["coalesced"] - base == callers - 1)
+        release.set()
+        outcomes = [f.result(5) for f in futures]
+    assert len(calls) == 1, f"loader ran {len(calls)} times"
+    return outcomes
+
+
+def test_single_flight_threads():
+    # ======== 参数变量 ========
+    callers = 16
+    flight  = SingleFlight("test")
+
+    outcomes = _sync_round(flight, callers, fail=False)
+    assert sum(shared for _, shared in outcomes) == callers - 1
+    first = outcomes[0][0]
+    assert all(result is first for result, _ in outcomes)             # 共享同一个结果对象
+
+    # 异常传给每一个等待者；结束后 key 不残留，下一次调用重新执行
+    errors = _sync_round(flight, callers, fail=True)
+    assert all(isinstance(e, RuntimeError) for e in errors) and len({id(e) for e in errors}) == 1
+    assert flight.do("k", lambda: 42) == (42, False)
+
+    stats = flight.stats()
+    assert stats["in_flight"] == 0 and stats["errors"] == 1
+    assert stats["executions"] == 3 and stats["coalesced"] == 2 * (callers - 1)
+
+
+def test_async_single_flight():
+    # ======== 参数变量 ========
+    callers = 16
+
+    async def main():
+        flight, calls = AsyncSingleFlight("test"), []
+        release = asyncio.Event()
+
+        async def loader(x, fail=False):
+            calls.append(x)
+            await release.wait()
+            if fail:
+                raise RuntimeError("boom")
+            return {"value": x}
+
+        # ======== N 个并发调用方 → 执行一次 ========
+        tasks = [asyncio.ensure_future(flight.do("k", loader, i)) for i in range(callers)]
+        await asyncio.sleep(0)
+        release.set()
+        outcomes = await asyncio.gather(*tasks)
+        assert len(calls) == 1 and sum(shared for _, shared in outcomes) == callers - 1
+        assert all(result is outcomes[0][0] for result, _ in outcomes)
+
+        # ======== 异常传给所有等待者，key 被清理 ========
+        release.clear()
+        tasks = [asyncio.ensure_future(flight.do("e", loader, i, fail=True)) for i in range(callers)]
+        await asyncio.sleep(0)
+        release.set()
+        errors = await asyncio.gather(*tasks, return_exceptions=True)
+        assert all(isinstance(e, RuntimeError) for e in errors) and len(calls) == 2
+        assert flight.stats()["in_flight"] == 0 and flight.stats()["errors"] == 1
+
+        # ======== 发起者被取消（客户端断开）：执行体继续，其他等待者照常拿到结果 ========
+        release.clear()
+        initiator = asyncio.ensure_future(flight.do("c", loader, "c"))
+        await asyncio.sleep(0)
+        waiters = [asyncio.ensure_future(flight.do("c", loader, "c")) for _ in range(3)]
+        await asyncio.sleep(0)
+        initiator.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*waiters)
+        assert initiator.cancelled() and len(calls) == 3
+        assert all(result == {"value": "c"} and shared for result, shared in results)
+        assert flight.stats()["in_flight"] == 0
+
+        # 全部调用方都已结束，同一 key 重新执行
+        release.set()
+        assert await flight.do("c", loader, "again") == ({"value": "again"}, False)
+        assert flight.stats()["executions"] == 4
+
+    asyncio.run(main())
+
+
+if __name__ == "__main__":
+    test_single_flight_threads()
+    test_async_single_flight()
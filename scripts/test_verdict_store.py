@@ -0,0 +1,51 @@
+import itertools
+
+from services.verdict_store import _prefix_upper_bound, best_deals_query
+
+
+def _in_range(value: str, lo: str, hi) -> bool:
+    """text_pattern_ops 的 ~>=~ / ~<~：按 UTF-8 字节比较"""
+    b = value.encode("utf-8")
+    return b >= lo.encode("utf-8") and (hi is None or b < hi.encode("utf-8"))
+
+
+def test_prefix_upper_bound():
+    # ======== 参数变量 ========
+    top      = chr(0x10FFFF)
+    alphabet = ["a", "z", "\x7f", "\x80", "é", chr(0xD7FF), chr(0xE000), chr(0xFFFF), chr(0x10000), top]
+    prefixes = ["Honda|Civic", "a", "z" + top, top, top * 2, "a" + chr(0xD7FF), chr(0xD7FF) + top, "\x7f", "é"]
+
+    assert _prefix_upper_bound("Honda|") == "Honda}"
+    assert _prefix_upper_bound("a" + top + top) == "b"
+    assert _prefix_upper_bound("a" + chr(0xD7FF)) == "a" + chr(0xE000)
+    assert _prefix_upper_bound(top) is None and _prefix_upper_bound(top * 3) is None
+
+    # 以 prefix 开头的字符串恰好落在 [prefix, 上界) 区间内（穷举短字符串）
+    values = ["".join(p) for n in range(4) for p in itertools.product(alphabet, repeat=n)]
+    for prefix in prefixes:
+        hi = _prefix_upper_bound(prefix)
+        assert hi is None or hi.encode("utf-8"), prefix                  # 上界可编码（不含代理码位）
+        for value in values + [prefix + v for v in values]:
+            assert _in_range(value, prefix, hi) == value.startswith(prefix), (prefix, value)
+
+
+def test_best_deals_query_prefix():
+    top = chr(0x10FFFF)
+
+    sql, params = best_deals_query("v1", full_key_prefix="Honda|")
+    assert params["key_lo"] == "Honda|" and params["key_hi"] == "Honda}" and "~<~ :key_hi" in sql
+
+    sql, params = best_deals_query("v1", full_key_prefix=top)         # 没有上界：只保留下界条件
+    assert params["key_lo"] == top and "key_hi" not in params and "key_hi" not in sql
+
+    for bad in ("a\x00", "a" + chr(0xD800), chr(0xDFFF)):
+        try:
+            best_deals_query("v1", full_key_prefix=bad)
+        except ValueError:
+            continue
+        raise AssertionError(f"prefix {bad!r} should raise ValueError")
+
+
+if __name__ == "__main__":
+    test_prefix_upper_bound()
+    test_best_deals_query_prefix()
@@ -1,11 +1,31 @@
 # services/car_value_analysis_service.py
+import asyncio
+import hashlib
+import json
+import os
 import re
+import threading
+import time
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
 import pandas as pd
+from sqlalchemy import text
 
-from db.db           import get_engine
+from db.db           import get_shared_engine, get_shared_async_engine
 from utils.logger    import Logger
-from utils.serialize import to_native
+from utils.serialize import to_native, dumps
+from utils.lru_cache import LRUCache
+from utils.db_utils  import iter_query_chunks
+from utils.single_flight import SingleFlight, AsyncSingleFlight
+from utils.metrics   import span, set_request_label, cohort_bucket
 from core.car_value_evaluator import evaluate as build_result  # 你刚写的 evaluator（中文推荐理由）
+from core.car_value_evaluator import required_columns, iter_evaluate_cohort
+from core.cohort_stats import CohortStats, TargetAggregates, FIELD_DEPR_RATE, QUANTILE_LEVELS
+from core.listing_index import ListingIndex, ListingIndexBuilder
+from services.verdict_store import SELECT_SQL as VERDICT_SELECT_SQL, best_deals_query
+from services.rank_snapshot import RankSnapshot, current_snapshot
 
 # ======== 参数变量 ========
 TABLE_NAME         = "dws_rehui_rank_cargurus"
@@ -14,62 +34,872 @@ FIELD_FULL_KEY     = "full_key"
 FIELD_YEAR         = "year"
 FIELD_URL          = "url"
 LISTING_ID_PATTERN = r"[#&?]listing=(\d+)"
+BATCH_MAX_ITEMS    = 500                  # 单次批量评估上限（URL + listing_id 合计）
+FIELD_PRICE_SAVING   = "price_saving"
+FIELD_MILEAGE_SAVING = "mileage_saving"
+FIELD_Y_PRED         = "y_pred"
+FIELD_NEXT_BIN_AVG   = "next_bin_avg_price"
+
+# ======== 列投影（由 evaluator 的列声明自动生成；cohort 只取数值列） ========
+ROW_COLUMNS, COHORT_COLUMNS = required_columns()
+ROW_SELECT    = ", ".join(ROW_COLUMNS)
+COHORT_SELECT = ", ".join(COHORT_COLUMNS)
+
+# ======== 评估模式 ========
+# client：拉回 cohort 在进程内计算（默认，可用 cohort 缓存）
+# server：一条 CTE 在数据库里算好样本数/排名/分位阈值，只回传 1 行（远程库往返贵时用）
+EVAL_MODE = os.getenv("EVAL_MODE", "client").lower()
+
+# ======== 单条评估的取数引擎 ========
+# numpy：游标直接取 tuple → 目标行 dict + cohort 数值列 numpy 数组（CohortStats），不构建 DataFrame（默认）
+# pandas：pd.read_sql → DataFrame / Series（原实现，保留作对照与回退）
+# 两者输出完全一致；批量接口仍按 DataFrame 分组
+EVAL_ENGINE = os.getenv("EVAL_ENGINE", "numpy").lower()
+
+# ======== 数据来源 ========
+# postgres：按请求查库（默认）
+# snapshot：只读 scripts/export_rank_snapshot.py 导出的内存映射快照（SNAPSHOT_DIR），完全不连接 Postgres；
+#           不支持 EVAL_MODE=server 与预计算结果表，自动按 client 模式在线计算
+DATA_SOURCE  = os.getenv("DATA_SOURCE", "postgres").lower()
+USE_SNAPSHOT = DATA_SOURCE == "snapshot"
+
+# ======== listing_id → cohort 索引（数据库模式；API 启动时加载，数据版本变化后后台重建） ========
+# 命中时已知 cohort，异步接口把 row 与 cohort 两次查询并发执行；快照模式使用快照自带的索引
+LISTING_INDEX = os.getenv("LISTING_INDEX", "true").lower() == "true"
+
+# ======== 预计算结果（scripts/precompute_verdicts.py 写入；命中则不再在线计算） ========
+VERDICT_LOOKUP        = os.getenv("VERDICT_LOOKUP", "true").lower() == "true"
+VERDICT_RETRY_SECONDS = float(os.getenv("VERDICT_RETRY_SECONDS", "60"))   # 结果表不可用（如尚未建表）时暂停查询的时长
+
+# ======== best deals（全表推荐 Top-N，读预计算结果表的部分索引；结果随响应缓存按数据版本失效） ========
+BEST_DEALS_MAX_LIMIT = int(os.getenv("BEST_DEALS_MAX_LIMIT", "200"))
+
+# ======== cohort 流式评估（NDJSON）：读取分块决定内存占用，发送分块决定首字节时间 ========
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", "500"))   # 每次从游标/快照读取的行数
+STREAM_FLUSH_ROWS = int(os.getenv("STREAM_FLUSH_ROWS", "100"))   # 攒够多少行发送一次
+
+# ======== cohort 缓存参数（可用环境变量覆盖） ========
+COHORT_CACHE_MAX_ENTRIES  = int(os.getenv("COHORT_CACHE_MAX_ENTRIES", "256"))               # 最多缓存多少个 cohort
+COHORT_CACHE_MAX_BYTES    = int(os.getenv("COHORT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))  # 缓存总字节上限（默认 64MB）
+COHORT_CACHE_TTL_SECONDS  = float(os.getenv("COHORT_CACHE_TTL_SECONDS", "3600"))           # 单条过期时间
+# ======== 响应缓存参数（最终 JSON 字节 + ETag，按 listing_id；数据版本变化整体失效） ========
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "20000"))
+RESPONSE_CACHE_MAX_BYTES   = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))  # 默认 32MB
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+DATA_VERSION_CHECK_SECONDS = float(os.getenv("DATA_VERSION_CHECK_SECONDS", "30"))          # 数据版本探测间隔（节流）
+# 数据版本探针：默认用表的累计写入计数 + relid（TRUNCATE/重建/重写都会变化）；
+# 也可配置成 "SELECT max(load_ts) FROM ..." 或版本表查询，只要返回单行即可
+DATA_VERSION_SQL = os.getenv("DATA_VERSION_SQL", f"""
+    SELECT relid, n_tup_ins, n_tup_upd, n_tup_del
+    FROM pg_stat_user_tables
+    WHERE relname = '{TABLE_NAME}'
+""")
 
 # ======== 工具对象 ========
-engine = get_engine()
-logger = Logger.get_global_logger()
+# 数据库引擎按需创建（get_shared_engine / get_shared_async_engine），由 API lifespan 预热与释放
+logger     = Logger.get_global_logger()
+hot_logger = Logger.get_hot_logger()     # 每次评估都会打的日志（可采样），参数惰性格式化
+if USE_SNAPSHOT and EVAL_MODE == "server":
+    logger.warning("⚠️ DATA_SOURCE=snapshot 不支持 EVAL_MODE=server，改为 client 模式")
+    EVAL_MODE = "client"
+cohort_cache = LRUCache(
+    name="cohort",
+    max_entries=COHORT_CACHE_MAX_ENTRIES,
+    max_bytes=COHORT_CACHE_MAX_BYTES,
+    ttl_seconds=COHORT_CACHE_TTL_SECONDS,
+    sizeof=lambda item: (int(item[0].memory_usage(index=True, deep=True).sum()) if item[0] is not None else 0) + item[1].nbytes,
+)
+response_cache = LRUCache(
+    name="response",
+    max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+    max_bytes=RESPONSE_CACHE_MAX_BYTES,
+    ttl_seconds=RESPONSE_CACHE_TTL_SECONDS,
+    sizeof=lambda item: len(item[0]),
+)
+
+# 请求合并：同一 listing / 同一 cohort 的并发请求只执行一次取数与评估（热门车源被集中转发时）
+evaluate_flight     = AsyncSingleFlight("evaluate")    # key = (listing_id, 数据版本)：整条评估（取数 + 计算 + 编码）
+cohort_flight       = SingleFlight("cohort")           # key = ((full_key, year), 数据版本)：cohort 读取 + 统计构建
+cohort_flight_async = AsyncSingleFlight("cohort_async")
+
+# ======== 内部：数据版本（节流探测，排名表夜间重写后自动失效缓存） ========
+_version_lock       = threading.Lock()
+_version_value      = None
+_version_checked_at = 0.0
+
+def _version_is_fresh(now: float) -> bool:
+    return _version_value is not None and now - _version_checked_at < DATA_VERSION_CHECK_SECONDS
+
+def _version_from_row(row) -> str:
+    return "|".join(str(x) for x in row) if row is not None else "none"
+
+def read_data_version(conn) -> str:
+    """不经节流直接探测一次数据版本（离线任务用；与 API 的版本字符串口径一致）"""
+    return _version_from_row(conn.exec_driver_sql(DATA_VERSION_SQL).fetchone())
+
+def _store_version(row, error: Optional[Exception], now: float) -> str:
+    global _version_value, _version_checked_at
+    if error is not None:
+        logger.warning("⚠️ 数据版本探测失败，沿用旧版本: %s", error)
+        version = _version_value or "unknown"
+    else:
+        version = _version_from_row(row)
+    if version != _version_value:
+        logger.info("🔄 数据版本: %s → %s", _version_value, version)
+    _version_value      = version
+    _version_checked_at = now
+    if error is None:
+        _schedule_listing_index_refresh(version)
+    return version
+
+def get_snapshot() -> RankSnapshot:
+    """当前快照（DATA_SOURCE=snapshot；与数据版本探测同样节流检查是否有新版本）"""
+    return current_snapshot(DATA_VERSION_CHECK_SECONDS)
+
+def _current_data_version() -> str:
+    if USE_SNAPSHOT:
+        return get_snapshot().data_version
+    now = time.monotonic()
+    if _version_is_fresh(now):
+        return _version_value
+    with _version_lock:
+        if _version_is_fresh(now):
+            return _version_value
+        row, error = None, None
+        try:
+            with get_shared_engine().connect() as conn:
+                row = conn.exec_driver_sql(DATA_VERSION_SQL).fetchone()
+        except Exception as e:
+            error = e
+        return _store_version(row, error, now)
+
+async def _current_data_version_async() -> str:
+    if USE_SNAPSHOT:
+        return get_snapshot().data_version
+    now = time.monotonic()
+    if _version_is_fresh(now):
+        return _version_value
+    row, error = None, None
+    try:
+        async with get_shared_async_engine().connect() as conn:
+            row = (await conn.execute(text(DATA_VERSION_SQL))).fetchone()
+    except Exception as e:
+        error = e
+    with _version_lock:
+        return _store_version(row, error, now)
+
+# ======== 内部：listing_id 索引（二分查找 listing → cohort，无数据库往返） ========
+_listing_index: Optional[ListingIndex] = None
+_listing_index_lock     = threading.Lock()
+_listing_index_building = False
+_listing_index_wanted   = False       # 调用过 refresh_listing_index（API 启动）后才随数据版本自动重建
+
+def _build_listing_index(version: str) -> ListingIndex:
+    builder = ListingIndexBuilder()
+    sql = f"SELECT {FIELD_LISTING_ID}, {FIELD_FULL_KEY}, {FIELD_YEAR} FROM {TABLE_NAME}"
+    for chunk in iter_query_chunks(get_shared_engine(), sql, fmt="records"):     # 服务端游标分块，内存有界
+        for listing_id, full_key, year in chunk:
+            builder.add(listing_id, full_key, year)
+    return builder.build(with_rows=False, version=version)
+
+def refresh_listing_index() -> Optional[ListingIndex]:
+    """（重新）构建 listing_id 索引；同一时间只构建一次，失败时保留旧索引"""
+    global _listing_index, _listing_index_building, _listing_index_wanted
+    with _listing_index_lock:
+        _listing_index_wanted = True
+        if _listing_index_building:
+            return _listing_index
+        _listing_index_building = True
+    try:
+        t0    = time.perf_counter()
+        index = _build_listing_index(_current_data_version())
+        _listing_index = index
+        logger.info(
+            "🗂️ listing 索引已加载: %d 条 / %d 个 cohort，%.1fMB，用时 %.2fs",
+            len(index), len(index.cohort_keys), index.nbytes / 2 ** 20, time.perf_counter() - t0,
+        )
+    except Exception as e:
+        logger.warning("⚠️ listing 索引构建失败，沿用旧索引: %s", e)
+    finally:
+        with _listing_index_lock:
+            _listing_index_building = False
+    return _listing_index
+
+def _schedule_listing_index_refresh(version: str) -> None:
+    if not (LISTING_INDEX and _listing_index_wanted) or USE_SNAPSHOT or _listing_index_building:
+        return
+    if _listing_index is not None and _listing_index.version == version:
+        return
+    threading.Thread(target=refresh_listing_index, name="listing-index-refresh", daemon=True).start()
+
+def _indexed_cohort(listing_id: str) -> Optional[Tuple[str, int]]:
+    index = _listing_index
+    return index.cohort_of(listing_id) if index is not None else None
 
 # ======== 内部：查询工具 ========
 def _fetch_row_by_listing_id(listing_id: str) -> pd.Series:
     sql = f"""
-        SELECT *
+        SELECT {ROW_SELECT}
         FROM {TABLE_NAME}
         WHERE {FIELD_LISTING_ID} = %s
         LIMIT 1
     """
-    df = pd.read_sql(sql, engine, params=(listing_id,))
+    df = pd.read_sql(sql, get_shared_engine(), params=(listing_id,))
     if df.empty:
         raise ValueError(f"No vehicle found with {FIELD_LISTING_ID} = {listing_id}")
     return df.iloc[0]
 
+def _fetch_rows_by_listing_ids(listing_ids: List[str]) -> pd.DataFrame:
+    if USE_SNAPSHOT:
+        return _fetch_rows_snapshot(listing_ids)
+    sql = f"""
+        SELECT {ROW_SELECT}
+        FROM {TABLE_NAME}
+        WHERE {FIELD_LISTING_ID} = ANY(%s)
+    """
+    df = pd.read_sql(sql, get_shared_engine(), params=(list(listing_ids),))
+    return df.drop_duplicates(subset=[FIELD_LISTING_ID], keep="first")
+
 def _fetch_cohort(full_key: str, year: int) -> pd.DataFrame:
     sql = f"""
-        SELECT *
+        SELECT {COHORT_SELECT}
         FROM {TABLE_NAME}
         WHERE {FIELD_FULL_KEY} = %s
           AND {FIELD_YEAR} = %s
     """
-    return pd.read_sql(sql, engine, params=(full_key, int(year)))
+    return pd.read_sql(sql, get_shared_engine(), params=(full_key, int(year)))
 
-# ======== 对外：通过 URL 评估（只输出一个 JSON） ========
-def evaluate_from_url(url: str) -> dict:
-    # 1) 解析 listing_id
+# ======== 内部：游标直取（numpy 引擎；不经过 pandas） ========
+def _native(value: Any) -> Any:
+    # 数值转 numpy 标量，与 read_sql（coerce_float）得到的 Series 取值一致：
+    # 除零等按 IEEE 得到 ±inf / NaN（y_pred = 0 时贬值率），而不是 Python float 的 ZeroDivisionError
+    if isinstance(value, (Decimal, float)):
+        return np.float64(value)
+    if isinstance(value, int) and not isinstance(value, bool):
+        return np.int64(value)
+    return value
+
+def _record_from_row(keys: Sequence[str], values: Optional[Sequence[Any]]) -> Optional[Dict[str, Any]]:
+    if values is None:
+        return None
+    return {k: _native(v) for k, v in zip(keys, values)}
+
+def _fetch_row_record(listing_id: str) -> Dict[str, Any]:
+    sql = f"""
+        SELECT {ROW_SELECT}
+        FROM {TABLE_NAME}
+        WHERE {FIELD_LISTING_ID} = %s
+        LIMIT 1
+    """
+    with get_shared_engine().connect() as conn:
+        result = conn.exec_driver_sql(sql, (listing_id,))
+        record = _record_from_row(list(result.keys()), result.fetchone())
+    if record is None:
+        raise ValueError(f"No vehicle found with {FIELD_LISTING_ID} = {listing_id}")
+    return record
+
+def _fetch_cohort_records(full_key: str, year: int) -> Tuple[List[tuple], List[str]]:
+    sql = f"""
+        SELECT {COHORT_SELECT}
+        FROM {TABLE_NAME}
+        WHERE {FIELD_FULL_KEY} = %s
+          AND {FIELD_YEAR} = %s
+    """
+    with get_shared_engine().connect() as conn:
+        result = conn.exec_driver_sql(sql, (full_key, int(year)))
+        return result.fetchall(), list(result.keys())
+
+# ======== 内部：内存映射快照（DATA_SOURCE=snapshot；输出与查库完全一致） ========
+def _fetch_row_snapshot(listing_id: str) -> Mapping[str, Any]:
+    snapshot = get_snapshot()
+    i = snapshot.find(listing_id)
+    if i is None:
+        raise ValueError(f"No vehicle found with {FIELD_LISTING_ID} = {listing_id}")
+    values = tuple(snapshot.record(i, ROW_COLUMNS).values())
+    if EVAL_ENGINE == "pandas":
+        return pd.DataFrame.from_records([values], columns=ROW_COLUMNS, coerce_float=True).iloc[0]
+    return _record_from_row(ROW_COLUMNS, values)           # 与游标直取同样转 numpy 标量（y_pred = 0 不抛 ZeroDivisionError）
+
+def _fetch_rows_snapshot(listing_ids: List[str]) -> pd.DataFrame:
+    snapshot = get_snapshot()
+    rows = [snapshot.find(str(x)) for x in dict.fromkeys(listing_ids)]
+    records = [tuple(snapshot.record(i, ROW_COLUMNS).values()) for i in rows if i is not None]
+    return pd.DataFrame.from_records(records, columns=ROW_COLUMNS, coerce_float=True)
+
+def _load_cohort_snapshot(full_key: str, year: int) -> Tuple[Optional[pd.DataFrame], CohortStats]:
+    # float 列直接是 mmap 上的零拷贝切片，CohortStats 只复制剔除 NaN 后的排序数组
+    snapshot = get_snapshot()
+    with span("cohort_fetch"):
+        df = snapshot.cohort_frame(full_key, year, COHORT_COLUMNS) if EVAL_ENGINE == "pandas" else None
+    with span("cohort_stats"):
+        return df, snapshot.cohort_stats(full_key, year)
+
+def _fetch_row(listing_id: str) -> Mapping[str, Any]:
+    with span("row_lookup"):
+        if USE_SNAPSHOT:
+            return _fetch_row_snapshot(listing_id)
+        if EVAL_ENGINE == "pandas":
+            return _fetch_row_by_listing_id(listing_id)
+        return _fetch_row_record(listing_id)
+
+def _load_cohort(full_key: str, year: int) -> Tuple[Optional[pd.DataFrame], CohortStats]:
+    if USE_SNAPSHOT:
+        return _load_cohort_snapshot(full_key, year)
+    if EVAL_ENGINE == "pandas":
+        with span("cohort_fetch"):
+            df = _fetch_cohort(full_key, year)
+        with span("cohort_stats"):
+            return df, CohortStats.from_frame(df)
+    with span("cohort_fetch"):
+        records, keys = _fetch_cohort_records(full_key, year)
+    with span("cohort_stats"):
+        return None, CohortStats.from_records(records, keys)
+
+def _get_cohort(full_key: str, year: int) -> Tuple[Optional[pd.DataFrame], CohortStats]:
+    """
+    带缓存的 cohort 读取：key = (full_key, year)；数据版本变化时整体失效。
+    缓存内容为 (df, CohortStats)，排序/分位数每个 cohort 只算一次；numpy 引擎下 df 为 None。
+    """
+    version = _current_data_version()
+    cohort_cache.check_version(version)
+    key  = (full_key, int(year))
+    item = cohort_cache.get(key)
+    if item is None:
+        item, _ = cohort_flight.do((key, version), _load_and_cache_cohort, key, version)
+    set_request_label("cohort_bucket", cohort_bucket(item[1].n))
+    return item
+
+def _load_and_cache_cohort(key: Tuple[str, int], version: str) -> Tuple[Optional[pd.DataFrame], CohortStats]:
+    item = _load_cohort(*key)
+    cohort_cache.put(key, item, version)   # 读取期间数据版本已切换则不写入（本次请求仍用读到的结果）
+    return item
+
+# ======== 内部：异步查询（asyncpg；结果按 pd.read_sql 同样方式组装 DataFrame） ========
+def _frame_from_result(result) -> pd.DataFrame:
+    return pd.DataFrame.from_records(result.fetchall(), columns=list(result.keys()), coerce_float=True)
+
+async def _fetch_row_by_listing_id_async(listing_id: str) -> pd.Series:
+    sql = f"""
+        SELECT {ROW_SELECT}
+        FROM {TABLE_NAME}
+        WHERE {FIELD_LISTING_ID} = :listing_id
+        LIMIT 1
+    """
+    async with get_shared_async_engine().connect() as conn:
+        df = _frame_from_result(await conn.execute(text(sql), {"listing_id": listing_id}))
+    if df.empty:
+        raise ValueError(f"No vehicle found with {FIELD_LISTING_ID} = {listing_id}")
+    return df.iloc[0]
+
+async def _fetch_cohort_async(full_key: str, year: int) -> pd.DataFrame:
+    sql = f"""
+        SELECT {COHORT_SELECT}
+        FROM {TABLE_NAME}
+        WHERE {FIELD_FULL_KEY} = :full_key
+          AND {FIELD_YEAR} = :year
+    """
+    async with get_shared_async_engine().connect() as conn:
+        return _frame_from_result(await conn.execute(text(sql), {"full_key": full_key, "year": int(year)}))
+
+async def _fetch_row_record_async(listing_id: str) -> Dict[str, Any]:
+    sql = f"""
+        SELECT {ROW_SELECT}
+        FROM {TABLE_NAME}
+        WHERE {FIELD_LISTING_ID} = :listing_id
+        LIMIT 1
+    """
+    async with get_shared_async_engine().connect() as conn:
+        result = await conn.execute(text(sql), {"listing_id": listing_id})
+        record = _record_from_row(list(result.keys()), result.fetchone())
+    if record is None:
+        raise ValueError(f"No vehicle found with {FIELD_LISTING_ID} = {listing_id}")
+    return record
+
+async def _fetch_cohort_records_async(full_key: str, year: int) -> Tuple[List[tuple], List[str]]:
+    sql = f"""
+        SELECT {COHORT_SELECT}
+        FROM {TABLE_NAME}
+        WHERE {FIELD_FULL_KEY} = :full_key
+          AND {FIELD_YEAR} = :year
+    """
+    async with get_shared_async_engine().connect() as conn:
+        result = await conn.execute(text(sql), {"full_key": full_key, "year": int(year)})
+        return result.fetchall(), list(result.keys())
+
+async def _fetch_row_async(listing_id: str) -> Mapping[str, Any]:
+    with span("row_lookup"):
+        if USE_SNAPSHOT:
+            return _fetch_row_snapshot(listing_id)
+        if EVAL_ENGINE == "pandas":
+            return await _fetch_row_by_listing_id_async(listing_id)
+        return await _fetch_row_record_async(listing_id)
+
+async def _load_cohort_async(full_key: str, year: int) -> Tuple[Optional[pd.DataFrame], CohortStats]:
+    # 排序属于 CPU 计算，放到线程池
+    if USE_SNAPSHOT:
+        return await asyncio.to_thread(_load_cohort_snapshot, full_key, year)
+    if EVAL_ENGINE == "pandas":
+        with span("cohort_fetch"):
+            df = await _fetch_cohort_async(full_key, year)
+        with span("cohort_stats"):
+            return df, await asyncio.to_thread(CohortStats.from_frame, df)
+    with span("cohort_fetch"):
+        records, keys = await _fetch_cohort_records_async(full_key, year)
+    with span("cohort_stats"):
+        return None, await asyncio.to_thread(CohortStats.from_records, records, keys)
+
+async def _get_cohort_async(full_key: str, year: int) -> Tuple[Optional[pd.DataFrame], CohortStats]:
+    version = await _current_data_version_async()
+    cohort_cache.check_version(version)
+    key  = (full_key, int(year))
+    item = cohort_cache.get(key)
+    if item is None:
+        item, _ = await cohort_flight_async.do((key, version), _load_and_cache_cohort_async, key, version)
+    set_request_label("cohort_bucket", cohort_bucket(item[1].n))
+    return item
+
+async def _load_and_cache_cohort_async(key: Tuple[str, int], version: str) -> Tuple[Optional[pd.DataFrame], CohortStats]:
+    item = await _load_cohort_async(*key)
+    cohort_cache.put(key, item, version)
+    return item
+
+# ======== 内部：服务端聚合（1 次往返：目标 row + cohort 排名 + 分位阈值） ========
+AGG_PREFIX = "agg_"   # 聚合列前缀，避免与表字段重名
+
+def _depr_rate_sql(alias: str) -> str:
+    # 与 pandas 口径一致：y_pred = 0 时得到 ±Infinity（0/0 记为 NULL，同 NaN 一样不参与比较/分位）
+    y    = f"{alias}.{FIELD_Y_PRED}::float8"
+    diff = f"({alias}.{FIELD_Y_PRED}::float8 - {alias}.{FIELD_NEXT_BIN_AVG}::float8)"
+    return (
+        f"CASE WHEN {y} = 0 THEN CASE WHEN {diff} > 0 THEN 'Infinity'::float8 "
+        f"WHEN {diff} < 0 THEN '-Infinity'::float8 END ELSE {diff} / {y} END"
+    )
+
+def _quantile_column(field: str, p: float) -> str:
+    return f"{AGG_PREFIX}q_{field}_{int(round(p * 100))}"
+
+def _build_server_side_sql() -> str:
+    quantile_cols = []
+    for field, levels in QUANTILE_LEVELS.items():
+        expr = "c.depr_rate" if field == FIELD_DEPR_RATE else f"c.{field}::float8"
+        for p in levels:
+            quantile_cols.append(
+                f"percentile_cont({p}) WITHIN GROUP (ORDER BY {expr}) AS {_quantile_column(field, p)}"
+            )
+    quantile_sql = ",\n               ".join(quantile_cols)
+    return f"""
+        WITH target AS (
+            SELECT {ROW_SELECT}
+            FROM {TABLE_NAME}
+            WHERE {FIELD_LISTING_ID} = :listing_id
+            LIMIT 1
+        ),
+        cohort AS (
+            SELECT c.{FIELD_PRICE_SAVING}, c.{FIELD_MILEAGE_SAVING}, {_depr_rate_sql("c")} AS depr_rate
+            FROM {TABLE_NAME} c
+            JOIN target t ON c.{FIELD_FULL_KEY} = t.{FIELD_FULL_KEY} AND c.{FIELD_YEAR} = t.{FIELD_YEAR}
+        ),
+        agg AS (
+            SELECT count(*) AS {AGG_PREFIX}n,
+               count(*) FILTER (WHERE c.{FIELD_PRICE_SAVING} > t.{FIELD_PRICE_SAVING}) + 1 AS {AGG_PREFIX}rank_{FIELD_PRICE_SAVING},
+               count(*) FILTER (WHERE c.{FIELD_MILEAGE_SAVING} > t.{FIELD_MILEAGE_SAVING}) + 1 AS {AGG_PREFIX}rank_{FIELD_MILEAGE_SAVING},
+               count(*) FILTER (WHERE c.depr_rate < {_depr_rate_sql("t")}) + 1 AS {AGG_PREFIX}rank_{FIELD_DEPR_RATE},
+               {quantile_sql}
+            FROM cohort c CROSS JOIN target t
+        )
+        SELECT target.*, agg.*
+        FROM target CROSS JOIN agg
+    """
+
+SERVER_SIDE_SQL = _build_server_side_sql()
+
+def _split_server_side_frame(df: pd.DataFrame, listing_id: str) -> Tuple[pd.Series, TargetAggregates]:
+    if df.empty:
+        raise ValueError(f"No vehicle found with {FIELD_LISTING_ID} = {listing_id}")
+    rec       = df.iloc[0]
+    row_cols  = [c for c in df.columns if not c.startswith(AGG_PREFIX)]
+    ranks     = {f: int(rec[f"{AGG_PREFIX}rank_{f}"]) for f in (FIELD_PRICE_SAVING, FIELD_MILEAGE_SAVING, FIELD_DEPR_RATE)}
+    quantiles = {
+        (field, p): rec[_quantile_column(field, p)]
+        for field, levels in QUANTILE_LEVELS.items() for p in levels
+    }
+    aggs = TargetAggregates(n=int(rec[f"{AGG_PREFIX}n"]), ranks=ranks, quantiles=quantiles)
+    return df[row_cols].iloc[0], aggs
+
+def _split_server_side_record(record: Optional[Dict[str, Any]], listing_id: str) -> Tuple[Dict[str, Any], TargetAggregates]:
+    if record is None:
+        raise ValueError(f"No vehicle found with {FIELD_LISTING_ID} = {listing_id}")
+    row       = {k: v for k, v in record.items() if not k.startswith(AGG_PREFIX)}
+    ranks     = {f: int(record[f"{AGG_PREFIX}rank_{f}"]) for f in (FIELD_PRICE_SAVING, FIELD_MILEAGE_SAVING, FIELD_DEPR_RATE)}
+    quantiles = {
+        (field, p): record[_quantile_column(field, p)]
+        for field, levels in QUANTILE_LEVELS.items() for p in levels
+    }
+    return row, TargetAggregates(n=int(record[f"{AGG_PREFIX}n"]), ranks=ranks, quantiles=quantiles)
+
+def _fetch_row_with_aggregates(listing_id: str) -> Tuple[Mapping[str, Any], TargetAggregates]:
+    with span("server_side_query"):
+        if EVAL_ENGINE == "pandas":
+            df = pd.read_sql(text(SERVER_SIDE_SQL), get_shared_engine(), params={"listing_id": listing_id})
+            row, aggs = _split_server_side_frame(df, listing_id)
+        else:
+            with get_shared_engine().connect() as conn:
+                result = conn.execute(text(SERVER_SIDE_SQL), {"listing_id": listing_id})
+                record = _record_from_row(list(result.keys()), result.fetchone())
+            row, aggs = _split_server_side_record(record, listing_id)
+    set_request_label("cohort_bucket", cohort_bucket(aggs.n))
+    return row, aggs
+
+async def _fetch_row_with_aggregates_async(listing_id: str) -> Tuple[Mapping[str, Any], TargetAggregates]:
+    with span("server_side_query"):
+        async with get_shared_async_engine().connect() as conn:
+            result = await conn.execute(text(SERVER_SIDE_SQL), {"listing_id": listing_id})
+            if EVAL_ENGINE == "pandas":
+                row, aggs = _split_server_side_frame(_frame_from_result(result), listing_id)
+            else:
+                record    = _record_from_row(list(result.keys()), result.fetchone())
+                row, aggs = _split_server_side_record(record, listing_id)
+    set_request_label("cohort_bucket", cohort_bucket(aggs.n))
+    return row, aggs
+
+# ======== 内部：预计算结果（按主键读取当前数据版本的结果 JSON；未命中或查询失败返回 None，走在线计算） ========
+_verdict_paused_until = 0.0
+
+def _verdict_active() -> bool:
+    return VERDICT_LOOKUP and not USE_SNAPSHOT and time.monotonic() >= _verdict_paused_until
+
+def _pause_verdict_lookup(error: Exception) -> None:
+    global _verdict_paused_until
+    _verdict_paused_until = time.monotonic() + VERDICT_RETRY_SECONDS
+    logger.warning("⚠️ 预计算结果表不可用，%.0f 秒内直接在线计算: %s", VERDICT_RETRY_SECONDS, error)
+
+def _verdict_found(stored: Optional[str]) -> Optional[str]:
+    if stored is not None:
+        set_request_label("cohort_bucket", "precomputed")
+    return stored
+
+def _fetch_verdict(listing_id: str) -> Optional[str]:
+    if not _verdict_active():
+        return None
+    params = {"listing_id": listing_id, "data_version": _current_data_version()}
+    try:
+        with span("verdict_lookup"):
+            with get_shared_engine().connect() as conn:
+                return _verdict_found(conn.execute(text(VERDICT_SELECT_SQL), params).scalar())
+    except Exception as e:   # 只是加速路径：任何失败（未建表、未配置数据库等）都退回在线计算
+        _pause_verdict_lookup(e)
+        return None
+
+async def _fetch_verdict_async(listing_id: str) -> Optional[str]:
+    if not _verdict_active():
+        return None
+    params = {"listing_id": listing_id, "data_version": await _current_data_version_async()}
+    try:
+        with span("verdict_lookup"):
+            async with get_shared_async_engine().connect() as conn:
+                return _verdict_found((await conn.execute(text(VERDICT_SELECT_SQL), params)).scalar())
+    except Exception as e:   # 同上
+        _pause_verdict_lookup(e)
+        return None
+
+def _listing_index_stats() -> Optional[dict]:
+    index = get_snapshot().listing_index if USE_SNAPSHOT else _listing_index
+    if index is None:
+        return None
+    return {"entries": len(index), "cohorts": len(index.cohort_keys), "bytes": index.nbytes, "version": index.version}
+
+def get_cache_stats() -> dict:
+    return {
+        "cohort": cohort_cache.stats(),
+        "response": response_cache.stats(),
+        "listing_index": _listing_index_stats(),
+        "single_flight": {f.name: f.stats() for f in (evaluate_flight, cohort_flight, cohort_flight_async)},
+    }
+
+# ======== 内部：URL 解析 ========
+def _parse_listing_id(url: str) -> str:
     m = re.search(LISTING_ID_PATTERN, url)
     if not m:
         raise ValueError(f"Invalid URL: listing_id not found in {url}")
-    listing_id = m.group(1)
+    return m.group(1)
+
+# ======== 对外：通过 URL 评估（只输出一个 JSON） ========
+def evaluate_from_url(url: str) -> dict:
+    # 1) 解析 listing_id
+    listing_id = _parse_listing_id(url)
+
+    if EVAL_MODE == "server":
+        return evaluate_by_listing_id(listing_id)
+
+    # 优先读预计算结果
+    stored = _fetch_verdict(listing_id)
+    if stored is not None:
+        return json.loads(stored)
 
     # 2) 查单条 row
-    row = _fetch_row_by_listing_id(listing_id)
+    row = _fetch_row(listing_id)
 
-    # 3) 查 cohort df（同 full_key + year）
-    df = _fetch_cohort(row[FIELD_FULL_KEY], int(row[FIELD_YEAR]))
+    # 3) 查 cohort df（同 full_key + year；优先走缓存）
+    df, stats = _get_cohort(row[FIELD_FULL_KEY], int(row[FIELD_YEAR]))
 
-    logger.info(
-        f"🔍 evaluating listing_id={listing_id} "
-        f"full_key={row[FIELD_FULL_KEY]} year={row[FIELD_YEAR]} (cohort_size={len(df)})"
+    hot_logger.info(
+        "🔍 evaluating listing_id=%s full_key=%s year=%s (cohort_size=%d)",
+        listing_id, row[FIELD_FULL_KEY], row[FIELD_YEAR], stats.n,
     )
 
     # 4) 交给 evaluator 产出唯一 JSON
-    result = build_result(df, row)
+    result = build_result(df, row, stats)
 
-    logger.info(f"✅ evaluate done: {result.get('summary')}")
-    return to_native(result)
+    hot_logger.info("✅ evaluate done: %s", result.get("summary"))
+    with span("serialize"):
+        return to_native(result)
 
 # ======== 可选：直接用 listing_id 评估（方便内部调用/单测） ========
 def evaluate_by_listing_id(listing_id: str) -> dict:
-    row = _fetch_row_by_listing_id(listing_id)
-    df  = _fetch_cohort(row[FIELD_FULL_KEY], int(row[FIELD_YEAR]))
-    result = build_result(df, row)
-    logger.info(f"✅ evaluate_by_listing_id done: {result.get('summary')}")
-    return to_native(result)
+    stored = _fetch_verdict(listing_id)
+    if stored is not None:
+        return json.loads(stored)
+
+    if EVAL_MODE == "server":
+        row, aggs = _fetch_row_with_aggregates(listing_id)
+        result = build_result(None, row, aggs)
+        hot_logger.info("✅ evaluate_by_listing_id done (server): %s", result.get("summary"))
+        with span("serialize"):
+            return to_native(result)
+
+    row = _fetch_row(listing_id)
+    df, stats = _get_cohort(row[FIELD_FULL_KEY], int(row[FIELD_YEAR]))
+    result = build_result(df, row, stats)
+    hot_logger.info("✅ evaluate_by_listing_id done: %s", result.get("summary"))
+    with span("serialize"):
+        return to_native(result)
+
+# ======== 对外：批量评估（1 次查 row + 每个 cohort 1 次查询） ========
+def evaluate_batch(urls: Optional[List[str]] = None, listing_ids: Optional[List[str]] = None) -> dict:
+    """
+    批量评估：先一次性取回所有 row，再按 (full_key, year) 分组，每个 cohort 只查一次。
+    查询次数从 ~2N 降到 1 + 不同 cohort 数。
+
+    出参：
+      {"count": 成功数, "cohort_count": cohort 数, "results": [...], "errors": [{"input", "error"}]}
+      results 按入参顺序（先 urls 后 listing_ids，重复的 listing_id 只评估一次）
+    """
+    urls        = urls or []
+    listing_ids = listing_ids or []
+    if len(urls) + len(listing_ids) > BATCH_MAX_ITEMS:
+        raise ValueError(f"Too many items: at most {BATCH_MAX_ITEMS} per batch")
+
+    # 1) 解析 listing_id（URL 解析失败只记错误，不影响其他条目）
+    errors: List[Dict[str, str]] = []
+    ordered_ids: List[str] = []
+    for url in urls:
+        try:
+            ordered_ids.append(_parse_listing_id(url))
+        except ValueError as e:
+            errors.append({"input": url, "error": str(e)})
+    ordered_ids.extend(str(x) for x in listing_ids)
+    ordered_ids = list(dict.fromkeys(ordered_ids))   # 去重并保序
+
+    if not ordered_ids:
+        return {"count": 0, "cohort_count": 0, "results": [], "errors": errors}
+
+    # 2) 一次查回所有 row
+    with span("row_lookup"):
+        rows_df = _fetch_rows_by_listing_ids(ordered_ids)
+    found   = set(rows_df[FIELD_LISTING_ID].astype(str))
+    for listing_id in ordered_ids:
+        if listing_id not in found:
+            errors.append({"input": listing_id, "error": f"No vehicle found with {FIELD_LISTING_ID} = {listing_id}"})
+
+    # 3) 按 cohort 分组，每组只查一次 cohort，组内逐条评估
+    results_by_id: Dict[str, dict] = {}
+    largest_cohort = 0
+    groups = rows_df.groupby([FIELD_FULL_KEY, FIELD_YEAR], sort=False)
+    for (full_key, year), group in groups:
+        df, stats = _get_cohort(full_key, int(year))
+        largest_cohort = max(largest_cohort, stats.n)
+        for _, row in group.iterrows():
+            results_by_id[str(row[FIELD_LISTING_ID])] = build_result(df, row, stats)
+    set_request_label("cohort_bucket", cohort_bucket(largest_cohort))   # 批量按最大 cohort 归桶
+
+    hot_logger.info(
+        "✅ evaluate_batch done: requested=%d evaluated=%d cohorts=%d",
+        len(ordered_ids), len(results_by_id), groups.ngroups,
+    )
+    results = [results_by_id[i] for i in ordered_ids if i in results_by_id]
+    with span("serialize"):
+        return to_native({
+            "count": len(results),
+            "cohort_count": int(groups.ngroups),
+            "results": results,
+            "errors": errors,
+        })
+
+# ======== 对外：异步版本（FastAPI 接口使用；IO 走 asyncpg，CPU 计算放线程池） ========
+def _build_and_finish(finish: Callable[[dict], Any], df: Optional[pd.DataFrame], row: Mapping[str, Any], stats) -> Any:
+    # 评估 + 收尾（to_native 或直接编码为 JSON 字节）在同一个线程池任务里完成
+    result = build_result(df, row, stats)
+    hot_logger.info("✅ evaluate done: %s", result.get("summary"))
+    with span("serialize"):
+        return finish(result)
+
+async def _evaluate_async(listing_id: str, finish: Callable[[dict], Any], from_stored: Callable[[str], Any]) -> Any:
+    # 预计算结果命中：from_stored 把结果 JSON 文本转成与 finish 相同的输出形态
+    stored = await _fetch_verdict_async(listing_id)
+    if stored is not None:
+        return from_stored(stored)
+
+    if EVAL_MODE == "server":
+        row, aggs = await _fetch_row_with_aggregates_async(listing_id)
+        return await asyncio.to_thread(_build_and_finish, finish, None, row, aggs)
+
+    key = _indexed_cohort(listing_id)
+    if key is not None:
+        # 索引已知 cohort：row 与 cohort 并发查询（cohort 命中缓存时只剩 row 一次往返）
+        row, (df, stats) = await asyncio.gather(_fetch_row_async(listing_id), _get_cohort_async(*key))
+        if (row[FIELD_FULL_KEY], int(row[FIELD_YEAR])) != key:       # 索引落后于数据：车源已换 cohort
+            df, stats = await _get_cohort_async(row[FIELD_FULL_KEY], int(row[FIELD_YEAR]))
+    else:
+        row = await _fetch_row_async(listing_id)
+        df, stats = await _get_cohort_async(row[FIELD_FULL_KEY], int(row[FIELD_YEAR]))
+
+    hot_logger.info(
+        "🔍 evaluating listing_id=%s full_key=%s year=%s (cohort_size=%d)",
+        listing_id, row[FIELD_FULL_KEY], row[FIELD_YEAR], stats.n,
+    )
+
+    return await asyncio.to_thread(_build_and_finish, finish, df, row, stats)
+
+async def evaluate_by_listing_id_async(listing_id: str) -> dict:
+    return await _evaluate_async(listing_id, to_native, json.loads)
+
+async def evaluate_from_url_async(url: str) -> dict:
+    return await evaluate_by_listing_id_async(_parse_listing_id(url))
+
+# ======== 对外：带响应缓存的 JSON 输出（字节 + 强 ETag；重复访问零计算） ========
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+async def evaluate_json_by_listing_id_async(listing_id: str) -> Tuple[bytes, str]:
+    """
+    返回 (JSON 字节, 强 ETag)。缓存 key = listing_id，数据版本变化时整体失效；
+    ETag 为响应字节的哈希，因此同一版本数据下同一车源的 ETag 稳定。
+    """
+    version = await _current_data_version_async()
+    response_cache.check_version(version)
+    item = response_cache.get(listing_id)
+    if item is None:
+        # 同一 listing 的并发请求合并为一次评估（先到的执行，其余等待同一结果；不同数据版本不合并）
+        item, shared = await evaluate_flight.do((listing_id, version), _evaluate_json_and_cache, listing_id, version)
+        if shared:
+            set_request_label("cohort_bucket", "coalesced")
+            hot_logger.info("🔗 coalesced with in-flight evaluation: listing_id=%s", listing_id)
+    else:
+        set_request_label("cohort_bucket", "cached")
+        hot_logger.info("⚡ response cache hit: listing_id=%s", listing_id)
+    return item
+
+async def _evaluate_json_and_cache(listing_id: str, version: str) -> Tuple[bytes, str]:
+    body = await _evaluate_async(listing_id, dumps, str.encode)   # 评估结果一次编码为字节，不再先 to_native
+    item = (body, make_etag(body))
+    response_cache.put(listing_id, item, version)   # 计算期间数据版本已切换则不缓存（避免旧 ETag 持续 304）
+    return item
+
+async def evaluate_json_from_url_async(url: str) -> Tuple[bytes, str]:
+    return await evaluate_json_by_listing_id_async(_parse_listing_id(url))
+
+# ======== 对外：整个 cohort 流式评估（NDJSON；分块读取整行，内存与首字节时间不随 cohort 增长） ========
+def _iter_cohort_row_chunks(full_key: str, year: int) -> Iterator[pd.DataFrame]:
+    # 按 listing_id 排序分块；快照本身已按 (full_key, year, listing_id) 排好
+    if USE_SNAPSHOT:
+        snapshot = get_snapshot()
+        rows = snapshot.cohort_slice(full_key, year)
+        for start in range(rows.start, rows.stop, STREAM_CHUNK_SIZE):
+            records = [tuple(snapshot.record(i, ROW_COLUMNS).values()) for i in range(start, min(start + STREAM_CHUNK_SIZE, rows.stop))]
+            yield pd.DataFrame.from_records(records, columns=ROW_COLUMNS, coerce_float=True)
+        return
+    sql = f"""
+        SELECT {ROW_SELECT}
+        FROM {TABLE_NAME}
+        WHERE {FIELD_FULL_KEY} = :full_key
+          AND {FIELD_YEAR} = :year
+        ORDER BY {FIELD_LISTING_ID}
+    """
+    yield from iter_query_chunks(get_shared_engine(), sql, {"full_key": full_key, "year": year}, chunk_size=STREAM_CHUNK_SIZE)
+
+def _iter_cohort_ndjson(full_key: str, year: int, stats: CohortStats, recommended_only: bool, limit: Optional[int]) -> Iterator[bytes]:
+    remaining = limit
+    emitted   = 0
+    t0        = time.perf_counter()
+    lines: List[bytes] = []
+    for chunk in _iter_cohort_row_chunks(full_key, year):
+        for result in iter_evaluate_cohort(chunk, stats, recommended_only=recommended_only, limit=remaining):
+            lines.append(dumps(result))
+            if len(lines) >= STREAM_FLUSH_ROWS:        # 按批发送，避免逐行经过线程池
+                emitted += len(lines)
+                yield b"\n".join(lines) + b"\n"
+                lines = []
+        if remaining is not None:
+            remaining = limit - emitted - len(lines)
+            if remaining <= 0:
+                break
+    if lines:
+        emitted += len(lines)
+        yield b"\n".join(lines) + b"\n"
+    hot_logger.info(
+        "✅ cohort stream done: full_key=%s year=%s emitted=%d (cohort_size=%d) %.1fms",
+        full_key, year, emitted, stats.n, (time.perf_counter() - t0) * 1000,
+    )
+
+async def open_cohort_stream(full_key: str, year: int, recommended_only: bool = False, limit: Optional[int] = None) -> Iterator[bytes]:
+    """
+    整个 cohort 逐条评估，返回 NDJSON 字节块的同步生成器（交给 StreamingResponse，在线程池里逐块迭代）。
+    cohort 统计走缓存 / 请求合并，先于响应取得：cohort 为空时在这里抛 ValueError（还能返回 4xx）；
+    之后按 STREAM_CHUNK_SIZE 分块读取整行，每块用整个 cohort 的统计评估，与单条接口结果一致。
+    recommended_only / limit 在拼装与序列化之前生效。
+    """
+    year = int(year)
+    _, stats = await _get_cohort_async(full_key, year)
+    if stats.n == 0:
+        raise ValueError(f"No vehicles found with {FIELD_FULL_KEY} = {full_key} and {FIELD_YEAR} = {year}")
+    return _iter_cohort_ndjson(full_key, year, stats, recommended_only, limit)
+
+# ======== 对外：全表 best deals Top-N（预计算结果表 + 部分索引；JSON 字节 + ETag，与单条接口共用响应缓存） ========
+async def best_deals_json_async(
+        sort_by: str = "price_saving",
+        limit: int = 20,
+        full_key_prefix: Optional[str] = None,
+        year_min: Optional[int] = None,
+        year_max: Optional[int] = None,
+        powertrain: Optional[str] = None,
+) -> Tuple[bytes, str]:
+    """
+    推荐车源按 price_saving / mileage_saving 降序取前 limit 条，可按 full_key 前缀、年份区间、动力类型过滤。
+    results 为结果表里与单条接口完全相同的 JSON 原文，直接拼接成响应，不解析、不重新编码；
+    只返回当前数据版本已预计算的车源（夜间预计算进行中时可能不全）。
+    """
+    if USE_SNAPSHOT:
+        raise ValueError("best deals 需要预计算结果表，DATA_SOURCE=snapshot 下不可用")
+    if not 1 <= limit <= BEST_DEALS_MAX_LIMIT:
+        raise ValueError(f"limit 需在 1 ~ {BEST_DEALS_MAX_LIMIT} 之间")
+
+    data_version = await _current_data_version_async()
+    response_cache.check_version(data_version)
+    key  = ("best_deals", sort_by, limit, full_key_prefix or None, year_min, year_max, powertrain)
+    item = response_cache.get(key)
+    if item is not None:
+        set_request_label("cohort_bucket", "cached")
+        return item
+
+    sql, params = best_deals_query(data_version, sort_by, limit, full_key_prefix, year_min, year_max, powertrain)
+    with span("best_deals"):
+        async with get_shared_async_engine().connect() as conn:
+            texts = (await conn.execute(text(sql), params)).scalars().all()
+    set_request_label("cohort_bucket", "precomputed")
+
+    head = b'{"sort_by":' + dumps(sort_by) + b',"count":' + str(len(texts)).encode() + b',"results":['
+    body = head + ",".join(texts).encode("utf-8") + b"]}"
+    item = (body, make_etag(body))
+    response_cache.put(key, item, data_version)
+    hot_logger.info("✅ best deals: sort_by=%s prefix=%s year=%s~%s powertrain=%s → %d", sort_by, full_key_prefix, year_min, year_max, powertrain, len(texts))
+    return item
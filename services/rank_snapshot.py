@@ -0,0 +1,349 @@
+# services/rank_snapshot.py
+# -*- coding: utf-8 -*-
+"""
+排名表只读列式快照（内存映射）：scripts/export_rank_snapshot.py 把 dws_rehui_rank_cargurus 按 (full_key, year)
+排序写成逐列二进制文件 + cohort 偏移索引；各 uvicorn worker 以只读 mmap 打开，cohort 即连续区间上的零拷贝切片，
+页缓存由操作系统在进程间共享。DATA_SOURCE=snapshot 时服务只读快照，不连接 Postgres。
+
+目录结构（SNAPSHOT_DIR）：
+    CURRENT                         当前生效的版本目录名（导出完成后原子替换）
+    <name>/manifest.json            表名、数据版本、行数、列类型、cohort 数
+    <name>/<col>.bin                数值 / 布尔列（float64 / int64 / bool；float 列的 NULL 写为 NaN）
+    <name>/<col>.offsets.bin        文本列：int64 偏移（行数 + 1）
+    <name>/<col>.data.bin           文本列：UTF-8 字节（与 Arrow 的 string 列同样的布局）
+    <name>/<col>.null.bin           含 NULL 的列才有：空值掩码
+    <name>/cohort_key.*.bin         cohort 索引：full_key（文本布局）、year、[start, end)
+    <name>/listing_index.*          listing_id → (cohort, 行号) 索引（core/listing_index.py，int64 二分查找）
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from core.cohort_stats import (
+    CohortStats, FIELD_MILEAGE_SAVING, FIELD_NEXT_BIN_AVG, FIELD_PRICE_SAVING, FIELD_Y_PRED,
+)
+from core.listing_index import ListingIndex, ListingIndexBuilder
+from utils.logger import Logger
+from utils.path_utils import get_abs_path
+
+__all__ = ["RankSnapshot", "SnapshotWriter", "column_kinds", "current_snapshot", "publish_snapshot", "prune_snapshots"]
+
+# ======== 参数变量 ========
+SNAPSHOT_DIR  = os.getenv("SNAPSHOT_DIR", get_abs_path("snapshot"))
+CURRENT_FILE  = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+FORMAT_VERSION = 2
+LISTING_INDEX  = "listing_index"
+
+# Postgres 类型 → 列种类（其余类型一律按文本保存）；numeric 与 API 的 Decimal → float 口径一致
+PG_KINDS = {
+    "double precision": "float", "real": "float", "numeric": "float",
+    "bigint": "int", "integer": "int", "smallint": "int",
+    "boolean": "bool",
+}
+KIND_DTYPES = {"float": np.float64, "int": np.int64, "bool": np.bool_}
+KIND_FILL   = {"float": np.nan, "int": 0, "bool": False}            # NULL 的占位值（以掩码为准）
+KIND_PYTHON = {"float": float, "int": int, "bool": bool}
+
+logger = Logger.get_global_logger()
+
+
+def column_kinds(conn, table_name: str, columns: Sequence[str]) -> List[Tuple[str, str]]:
+    """按 information_schema 推断列种类，顺序与 columns 一致"""
+    sql = """
+        SELECT column_name, data_type
+        FROM information_schema.columns
+        WHERE table_name = :table_name
+    """
+    types = dict(conn.execute(text(sql), {"table_name": table_name.split(".")[-1]}).fetchall())
+    missing = [c for c in columns if c not in types]
+    if missing:
+        raise ValueError(f"{table_name} 缺少列: {missing}")
+    return [(c, PG_KINDS.get(types[c], "text")) for c in columns]
+
+
+def _map(path: str, dtype) -> np.ndarray:
+    if os.path.getsize(path) == 0:                  # 空文件无法 mmap
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
+
+
+# ===================== 写入：逐块追加，内存只占一个分块 =====================
+class _TextSink:
+    def __init__(self, base: str):
+        self.offsets = open(base + ".offsets.bin", "wb")
+        self.data    = open(base + ".data.bin", "wb")
+        self.end     = 0
+        np.zeros(1, dtype=np.int64).tofile(self.offsets)
+
+    def append(self, values: Iterable[Optional[str]]) -> None:
+        encoded = [b"" if v is None else str(v).encode("utf-8") for v in values]
+        lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+        (self.end + np.cumsum(lengths)).tofile(self.offsets)
+        self.data.write(b"".join(encoded))
+        self.end += int(lengths.sum())
+
+    def close(self) -> None:
+        self.offsets.close()
+        self.data.close()
+
+
+class SnapshotWriter:
+    """
+    按排序后的行流写快照：append(rows) 可多次调用（rows 为与 columns 同序的 tuple 列表），close() 写 manifest。
+    行必须按 key_columns 排好序（同一 cohort 连续），否则抛 ValueError。
+    """
+
+    def __init__(self, path: str, columns: Sequence[Tuple[str, str]], table_name: str, data_version: str,
+                 key_columns: Tuple[str, str], id_column: str):
+        os.makedirs(path, exist_ok=False)
+        self.path         = path
+        self.columns      = list(columns)
+        self.table_name   = table_name
+        self.data_version = data_version
+        self.key_columns  = tuple(key_columns)
+        self.id_column    = id_column
+        self.rows         = 0
+
+        names = [c for c, _ in self.columns]
+        self._key_idx = (names.index(key_columns[0]), names.index(key_columns[1]))
+        self._id_idx  = names.index(id_column)
+
+        self._values: Dict[str, Any] = {}
+        self._nulls   = {c: open(self._file(c, "null"), "wb") for c in names}
+        self._has_null = dict.fromkeys(names, False)
+        for name, kind in self.columns:
+            self._values[name] = _TextSink(os.path.join(path, name)) if kind == "text" else open(self._file(name), "wb")
+
+        # cohort 索引与 listing_id 索引（导出时常驻内存：每个 cohort / 每行一个键，远小于整表）
+        self._cohorts: List[Tuple[Any, Any, int]] = []     # (full_key, year, start)
+        self._seen: set = set()
+        self._listings = ListingIndexBuilder()
+
+    def _file(self, column: str, part: str = "") -> str:
+        return os.path.join(self.path, f"{column}.{part}.bin" if part else f"{column}.bin")
+
+    def append(self, rows: Sequence[Sequence[Any]]) -> None:
+        if not rows:
+            return
+        for i, (name, kind) in enumerate(self.columns):
+            values = [r[i] for r in rows]
+            nulls  = np.fromiter((v is None for v in values), dtype=np.bool_, count=len(values))
+            nulls.tofile(self._nulls[name])
+            self._has_null[name] |= bool(nulls.any())
+            if kind == "text":
+                self._values[name].append(values)
+            else:
+                fill = KIND_FILL[kind]
+                np.array([fill if v is None else v for v in values], dtype=KIND_DTYPES[kind]).tofile(self._values[name])
+
+        k0, k1 = self._key_idx
+        for offset, r in enumerate(rows):
+            key = (r[k0], r[k1])
+            if not self._cohorts or key != self._cohorts[-1][:2]:
+                if key in self._seen:
+                    raise ValueError(f"快照输入未按 cohort 排序：{key} 不连续")
+                self._seen.add(key)
+                self._cohorts.append((key[0], key[1], self.rows + offset))
+            self._listings.add(r[self._id_idx], key[0], key[1], self.rows + offset)
+        self.rows += len(rows)
+
+    def close(self) -> dict:
+        for sink in self._values.values():
+            sink.close()
+        for name, f in self._nulls.items():
+            f.close()
+            if not self._has_null[name]:
+                os.remove(self._file(name, "null"))
+
+        # cohort 索引（key 为 NULL 的行不建索引：数据库按 = 查询同样取不到）
+        cohorts = [c for c in self._cohorts if c[0] is not None and c[1] is not None]
+        ends    = {c[2]: e for c, e in zip(self._cohorts, [c[2] for c in self._cohorts[1:]] + [self.rows])}
+        keys = _TextSink(os.path.join(self.path, "cohort_key"))
+        keys.append([c[0] for c in cohorts])
+        keys.close()
+        np.array([int(c[1]) for c in cohorts], dtype=np.int64).tofile(self._file("cohort_year"))
+        np.array([c[2] for c in cohorts], dtype=np.int64).tofile(self._file("cohort_start"))
+        np.array([ends[c[2]] for c in cohorts], dtype=np.int64).tofile(self._file("cohort_end"))
+
+        # listing_id 索引（重复 id 取快照中的第一行）
+        self._listings.build(with_rows=True, version=self.data_version).save(os.path.join(self.path, LISTING_INDEX))
+
+        manifest = {
+            "format":       FORMAT_VERSION,
+            "table":        self.table_name,
+            "data_version": self.data_version,
+            "rows":         self.rows,
+            "cohorts":      len(cohorts),
+            "key_columns":  list(self.key_columns),
+            "id_column":    self.id_column,
+            "created_at":   time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "columns":      [{"name": c, "kind": k, "nullable": self._has_null[c]} for c, k in self.columns],
+        }
+        with open(os.path.join(self.path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        return manifest
+
+
+def publish_snapshot(snapshot_dir: str, name: str) -> None:
+    """原子切换 CURRENT；已打开旧快照的 worker 不受影响（旧文件删除后 mmap 仍有效）"""
+    tmp = os.path.join(snapshot_dir, CURRENT_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(name)
+    os.replace(tmp, os.path.join(snapshot_dir, CURRENT_FILE))
+
+
+def prune_snapshots(snapshot_dir: str, keep: int) -> List[str]:
+    """保留 CURRENT 及最近 keep 个版本目录，删除其余"""
+    current = _read_current(snapshot_dir)
+    names   = sorted(
+        (n for n in os.listdir(snapshot_dir) if os.path.isfile(os.path.join(snapshot_dir, n, MANIFEST_FILE))),
+        reverse=True,
+    )
+    removed = [n for n in names[max(keep, 1):] if n != current]
+    for n in removed:
+        shutil.rmtree(os.path.join(snapshot_dir, n), ignore_errors=True)
+    return removed
+
+
+# ===================== 读取：只读 mmap，按需解码单个值 =====================
+class _Column:
+    def __init__(self, base: str, kind: str, nullable: bool):
+        self.kind  = kind
+        self.nulls = _map(base + ".null.bin", np.bool_) if nullable else None
+        if kind == "text":
+            self.offsets = _map(base + ".offsets.bin", np.int64)
+            self.data    = _map(base + ".data.bin", np.uint8)
+        else:
+            self.values = _map(base + ".bin", KIND_DTYPES[kind])
+            self._cast  = KIND_PYTHON[kind]
+
+    def value(self, i: int) -> Any:
+        if self.nulls is not None and self.nulls[i]:
+            return None
+        if self.kind == "text":
+            return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+        return self._cast(self.values[i])
+
+    def floats(self, rows: slice) -> np.ndarray:
+        """区间内的 float64 数组（NULL → NaN）；float 列为 mmap 上的零拷贝视图"""
+        if self.kind == "float":
+            return self.values[rows]
+        arr = self.values[rows].astype(np.float64)
+        if self.nulls is not None:
+            arr[self.nulls[rows]] = np.nan
+        return arr
+
+
+class RankSnapshot:
+    def __init__(self, path: str):
+        with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format") != FORMAT_VERSION:
+            raise ValueError(f"不支持的快照格式: {manifest.get('format')}（{path}）")
+
+        self.path         = path
+        self.name         = os.path.basename(path.rstrip(os.sep))
+        self.table_name   = manifest["table"]
+        self.data_version = manifest["data_version"]
+        self.rows         = int(manifest["rows"])
+        self.column_names = [c["name"] for c in manifest["columns"]]
+        self.columns      = {
+            c["name"]: _Column(os.path.join(path, c["name"]), c["kind"], c["nullable"]) for c in manifest["columns"]
+        }
+
+        # cohort 偏移索引：启动时建一次字典（cohort 数远小于行数）
+        keys   = _Column(os.path.join(path, "cohort_key"), "text", False)
+        years  = np.fromfile(os.path.join(path, "cohort_year.bin"), dtype=np.int64)
+        starts = np.fromfile(os.path.join(path, "cohort_start.bin"), dtype=np.int64)
+        ends   = np.fromfile(os.path.join(path, "cohort_end.bin"), dtype=np.int64)
+        self._cohorts: Dict[Tuple[str, int], slice] = {
+            (keys.value(i), int(years[i])): slice(int(starts[i]), int(ends[i])) for i in range(len(years))
+        }
+
+        self.listing_index = ListingIndex.load(os.path.join(path, LISTING_INDEX))
+
+    # ======== 单条 ========
+    def find(self, listing_id: str) -> Optional[int]:
+        return self.listing_index.row_of(listing_id)
+
+    def record(self, i: int, columns: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        return {c: self.columns[c].value(i) for c in (columns or self.column_names)}
+
+    # ======== cohort ========
+    def cohort_slice(self, full_key: str, year: int) -> slice:
+        return self._cohorts.get((full_key, int(year)), slice(0, 0))
+
+    def cohort_arrays(self, full_key: str, year: int, columns: Sequence[str]) -> Dict[str, np.ndarray]:
+        rows = self.cohort_slice(full_key, year)
+        return {c: self.columns[c].floats(rows) for c in columns}
+
+    def cohort_frame(self, full_key: str, year: int, columns: Sequence[str]) -> pd.DataFrame:
+        rows = self.cohort_slice(full_key, year)
+        return pd.DataFrame.from_records(
+            [tuple(self.columns[c].value(i) for c in columns) for i in range(rows.start, rows.stop)],
+            columns=list(columns), coerce_float=True,
+        )
+
+    def cohort_stats(self, full_key: str, year: int) -> CohortStats:
+        arrays = self.cohort_arrays(full_key, year, (FIELD_PRICE_SAVING, FIELD_MILEAGE_SAVING, FIELD_Y_PRED, FIELD_NEXT_BIN_AVG))
+        rows   = self.cohort_slice(full_key, year)
+        return CohortStats(
+            price_saving=arrays[FIELD_PRICE_SAVING],
+            mileage_saving=arrays[FIELD_MILEAGE_SAVING],
+            y_pred=arrays[FIELD_Y_PRED],
+            next_bin_avg_price=arrays[FIELD_NEXT_BIN_AVG],
+            n=rows.stop - rows.start,
+        )
+
+    def __len__(self) -> int:
+        return self.rows
+
+    @property
+    def cohort_count(self) -> int:
+        return len(self._cohorts)
+
+
+# ===================== 当前快照（节流检查 CURRENT，切换后新请求读新版本） =====================
+_snapshot_lock       = threading.Lock()
+_snapshot: Optional[RankSnapshot] = None
+_snapshot_checked_at = 0.0
+
+
+def _read_current(snapshot_dir: str) -> Optional[str]:
+    try:
+        with open(os.path.join(snapshot_dir, CURRENT_FILE), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def current_snapshot(check_seconds: float = 30.0, snapshot_dir: str = SNAPSHOT_DIR) -> RankSnapshot:
+    """返回当前快照；每 check_seconds 秒最多读一次 CURRENT，发现新版本则重新映射"""
+    global _snapshot, _snapshot_checked_at
+    now = time.monotonic()
+    if _snapshot is not None and now - _snapshot_checked_at < check_seconds:
+        return _snapshot
+    with _snapshot_lock:
+        if _snapshot is not None and now - _snapshot_checked_at < check_seconds:
+            return _snapshot
+        name = _read_current(snapshot_dir)
+        if name is None:
+            if _snapshot is not None:
+                _snapshot_checked_at = now
+                return _snapshot
+            raise FileNotFoundError(f"快照不存在：{snapshot_dir}/{CURRENT_FILE}（先运行 python -m scripts.export_rank_snapshot）")
+        if _snapshot is None or _snapshot.name != name:
+            previous  = _snapshot.name if _snapshot is not None else None
+            _snapshot = RankSnapshot(os.path.join(snapshot_dir, name))
+            logger.info("🗂️ 快照切换: %s → %s（rows=%d）", previous, name, _snapshot.rows)
+        _snapshot_checked_at = now
+        return _snapshot
@@ -0,0 +1,254 @@
+# services/verdict_store.py
+# -*- coding: utf-8 -*-
+"""
+预计算评估结果表（由 scripts/precompute_verdicts.py 夜间批量写入，API 按主键读取）。
+result 列保存与在线接口完全相同的 JSON 文本（json 类型保留原文），直接作为响应字节返回；
+data_version 为写入时的数据版本，与当前版本不一致的行视为过期，不会被读取。
+进度表按 (full_key, year, data_version) 记录已写完的 cohort，重跑时据此跳过。
+
+全表 "best deals" Top-N：is_recommended 为部分索引条件，price_saving / mileage_saving 各一个
+降序部分索引，查询沿索引取前 N 条即停（不扫表、不排序）；full_key 前缀走 text_pattern_ops 范围索引。
+"""
+
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Boolean, Column, Float, Integer, MetaData, Table, Text, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Connection
+
+from core.textgen.advice_writer import POWERTRAINS, detect_powertrain
+from utils.serialize import dumps, to_native
+
+# ======== 参数变量 ========
+VERDICT_TABLE  = os.getenv("VERDICT_TABLE", "dws_rehui_verdict_cargurus")
+PROGRESS_TABLE = f"{VERDICT_TABLE}_progress"
+
+FIELD_LISTING_ID   = "listing_id"
+FIELD_FULL_KEY     = "full_key"
+FIELD_YEAR         = "year"
+FIELD_RESULT       = "result"
+FIELD_DATA_VERSION = "data_version"
+
+# highlights ↔ 判定 flags（evaluator 按 flags 生成 highlights，一一对应）
+HIGHLIGHT_FLAGS = {
+    "price_saving":          "ok_price",
+    "mileage_saving":        "ok_mile",
+    "expected_depreciation": "ok_depr",
+    "heat_rank":             "hot_ok",
+}
+
+# ======== 表结构 ========
+metadata = MetaData()
+verdict_table = Table(
+    VERDICT_TABLE, metadata,
+    Column(FIELD_LISTING_ID, Text, primary_key=True),
+    Column(FIELD_FULL_KEY, Text, nullable=False),
+    Column(FIELD_YEAR, Integer, nullable=False),
+    Column("is_recommended", Boolean, nullable=False),
+    Column("ok_price", Boolean, nullable=False),
+    Column("ok_mile", Boolean, nullable=False),
+    Column("ok_depr", Boolean, nullable=False),
+    Column("hot_ok", Boolean, nullable=False),
+    Column("price_saving", Float),
+    Column("mileage_saving", Float),
+    Column("depr_rate", Float),
+    Column("heat_rank", Integer),
+    Column("sample_size", Integer, nullable=False),
+    Column("powertrain", Text),
+    Column(FIELD_RESULT, Text, nullable=False),          # 建表 DDL 中为 json 类型（保留原文字节）
+    Column(FIELD_DATA_VERSION, Text, nullable=False),
+)
+progress_table = Table(
+    PROGRESS_TABLE, metadata,
+    Column(FIELD_FULL_KEY, Text, primary_key=True),
+    Column(FIELD_YEAR, Integer, primary_key=True),
+    Column(FIELD_DATA_VERSION, Text, primary_key=True),
+)
+
+CREATE_SQL = f"""
+    CREATE TABLE IF NOT EXISTS {VERDICT_TABLE} (
+        {FIELD_LISTING_ID}   text PRIMARY KEY,
+        {FIELD_FULL_KEY}     text NOT NULL,
+        {FIELD_YEAR}         integer NOT NULL,
+        is_recommended       boolean NOT NULL,
+        ok_price             boolean NOT NULL,
+        ok_mile              boolean NOT NULL,
+        ok_depr              boolean NOT NULL,
+        hot_ok               boolean NOT NULL,
+        price_saving         double precision,
+        mileage_saving       double precision,
+        depr_rate            double precision,
+        heat_rank            integer,
+        sample_size          integer NOT NULL,
+        powertrain           text,
+        {FIELD_RESULT}       json NOT NULL,
+        {FIELD_DATA_VERSION} text NOT NULL,
+        computed_at          timestamptz NOT NULL DEFAULT now()
+    );
+    ALTER TABLE {VERDICT_TABLE} ADD COLUMN IF NOT EXISTS powertrain text;
+    CREATE INDEX IF NOT EXISTS {VERDICT_TABLE}_cohort_idx ON {VERDICT_TABLE} ({FIELD_FULL_KEY}, {FIELD_YEAR});
+    CREATE INDEX IF NOT EXISTS {VERDICT_TABLE}_best_price_idx ON {VERDICT_TABLE} (price_saving DESC, {FIELD_LISTING_ID})
+        WHERE is_recommended AND price_saving IS NOT NULL;
+    CREATE INDEX IF NOT EXISTS {VERDICT_TABLE}_best_mile_idx ON {VERDICT_TABLE} (mileage_saving DESC, {FIELD_LISTING_ID})
+        WHERE is_recommended AND mileage_saving IS NOT NULL;
+    CREATE INDEX IF NOT EXISTS {VERDICT_TABLE}_best_key_idx ON {VERDICT_TABLE} ({FIELD_FULL_KEY} text_pattern_ops, {FIELD_YEAR})
+        WHERE is_recommended;
+    CREATE TABLE IF NOT EXISTS {PROGRESS_TABLE} (
+        {FIELD_FULL_KEY}     text NOT NULL,
+        {FIELD_YEAR}         integer NOT NULL,
+        {FIELD_DATA_VERSION} text NOT NULL,
+        completed_at         timestamptz NOT NULL DEFAULT now(),
+        PRIMARY KEY ({FIELD_FULL_KEY}, {FIELD_YEAR}, {FIELD_DATA_VERSION})
+    );
+"""
+
+# 按主键读取；只返回与当前数据版本一致的行（result::text 保证拿到原文，而不是被驱动解析成 dict）
+SELECT_SQL = f"""
+    SELECT {FIELD_RESULT}::text
+    FROM {VERDICT_TABLE}
+    WHERE {FIELD_LISTING_ID} = :listing_id
+      AND {FIELD_DATA_VERSION} = :data_version
+"""
+
+
+# ======== best deals：全表推荐车源 Top-N ========
+BEST_DEALS_SORT_FIELDS = ("price_saving", "mileage_saving")
+_MAX_CHAR = chr(0x10FFFF)
+
+
+def _prefix_upper_bound(prefix: str) -> Optional[str]:
+    """
+    按字节比较（text_pattern_ops，UTF-8 字节序 = 码位序）时，以 prefix 开头的字符串恰好落在 [prefix, 上界) 区间内：
+    上界 = 末字符进一位；末尾的 U+10FFFF 无法进位，先去掉再进位；全是 U+10FFFF 时没有上界（返回 None）。
+    """
+    stem = prefix.rstrip(_MAX_CHAR)
+    if not stem:
+        return None
+    code = ord(stem[-1]) + 1
+    if 0xD800 <= code <= 0xDFFF:                          # 代理区不是合法字符，U+D7FF 的下一个是 U+E000
+        code = 0xE000
+    return stem[:-1] + chr(code)
+
+
+def best_deals_query(
+        data_version: str,
+        sort_by: str = "price_saving",
+        limit: int = 20,
+        full_key_prefix: Optional[str] = None,
+        year_min: Optional[int] = None,
+        year_max: Optional[int] = None,
+        powertrain: Optional[str] = None,
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    推荐车源按 sort_by 降序取前 limit 条（只取当前数据版本），返回 (SQL, 参数)；结果列为 result::text。
+    条件与部分索引谓词一致（is_recommended AND 排序列 IS NOT NULL），前缀用 ~>=~ / ~<~ 范围比较，
+    参数化后通用执行计划也能走索引（LIKE 参数做不到）。
+    """
+    if sort_by not in BEST_DEALS_SORT_FIELDS:
+        raise ValueError(f"sort_by 只支持 {BEST_DEALS_SORT_FIELDS}，收到：{sort_by}")
+    if powertrain is not None and powertrain not in POWERTRAINS:
+        raise ValueError(f"powertrain 只支持 {POWERTRAINS}，收到：{powertrain}")
+
+    where  = ["is_recommended", f"{sort_by} IS NOT NULL", f"{FIELD_DATA_VERSION} = :data_version"]
+    params: Dict[str, Any] = {"data_version": data_version, "limit": int(limit)}
+    if full_key_prefix:
+        if "\x00" in full_key_prefix or any(0xD800 <= ord(c) <= 0xDFFF for c in full_key_prefix):
+            raise ValueError("full_key_prefix 含有数据库文本不支持的字符（NUL 或代理码位）")
+        where.append(f"{FIELD_FULL_KEY} ~>=~ :key_lo")
+        params["key_lo"] = full_key_prefix
+        key_hi = _prefix_upper_bound(full_key_prefix)
+        if key_hi is not None:
+            where.append(f"{FIELD_FULL_KEY} ~<~ :key_hi")
+            params["key_hi"] = key_hi
+    if year_min is not None:
+        where.append(f"{FIELD_YEAR} >= :year_min")
+        params["year_min"] = int(year_min)
+    if year_max is not None:
+        where.append(f"{FIELD_YEAR} <= :year_max")
+        params["year_max"] = int(year_max)
+    if powertrain is not None:
+        where.append("powertrain = :powertrain")
+        params["powertrain"] = powertrain
+
+    sql = f"""
+        SELECT {FIELD_RESULT}::text
+        FROM {VERDICT_TABLE}
+        WHERE {" AND ".join(where)}
+        ORDER BY {sort_by} DESC, {FIELD_LISTING_ID}
+        LIMIT :limit
+    """
+    return sql, params
+
+
+def ensure_verdict_table(conn: Connection) -> None:
+    conn.exec_driver_sql(CREATE_SQL)
+
+
+def verdict_record(result: Dict[str, Any], data_version: str) -> Dict[str, Any]:
+    """单条 evaluate 结果 → 结果表一行（result 为与在线接口相同的 JSON 文本）"""
+    evaluations = result["evaluations"]
+    highlights  = set(result["highlights"])
+    record = {
+        FIELD_LISTING_ID:   str(result["listing_id"]),
+        FIELD_FULL_KEY:     result["full_key"],
+        FIELD_YEAR:         int(result["year"]),
+        "is_recommended":   bool(result["is_recommended"]),
+        "price_saving":     to_native(evaluations["price_saving"]["value"]),
+        "mileage_saving":   to_native(evaluations["mileage_saving"]["value"]),
+        "depr_rate":        to_native(evaluations["expected_depreciation"]["depreciation_rate"]),
+        "heat_rank":        to_native(evaluations["heat_rank"]["value"]),
+        "sample_size":      int(result["sample_size"]),
+        "powertrain":       detect_powertrain(result["full_key"]),
+        FIELD_RESULT:       dumps(result).decode("utf-8"),
+        FIELD_DATA_VERSION: data_version,
+    }
+    for highlight, flag in HIGHLIGHT_FLAGS.items():
+        record[flag] = highlight in highlights
+    return record
+
+
+def upsert_verdicts(conn: Connection, records: List[Dict[str, Any]]) -> int:
+    """批量 upsert（主键冲突时整行覆盖）；executemany 由 SQLAlchemy 合并为多值 INSERT"""
+    if not records:
+        return 0
+    stmt = pg_insert(verdict_table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[FIELD_LISTING_ID],
+        set_={c.name: stmt.excluded[c.name] for c in verdict_table.columns if c.name != FIELD_LISTING_ID},
+    )
+    conn.execute(stmt, records)
+    return len(records)
+
+
+def mark_cohorts_completed(conn: Connection, cohorts: Iterable[Tuple[str, int]], data_version: str) -> int:
+    """
+    记录 cohort 在该数据版本下已写完；须在结果行提交之后调用。
+    两步之间中断只会导致该 cohort 重跑时重算（upsert 幂等），不会把未写完的 cohort 记为完成。
+    """
+    records = [{FIELD_FULL_KEY: full_key, FIELD_YEAR: int(year), FIELD_DATA_VERSION: data_version}
+               for full_key, year in cohorts]
+    if not records:
+        return 0
+    conn.execute(pg_insert(progress_table).on_conflict_do_nothing(), records)
+    return len(records)
+
+
+def completed_cohorts(conn: Connection, data_version: str) -> set:
+    """当前数据版本下已全部算完的 cohort（以进度表为准，不比较行数：源表重复 listing_id 会让行数永远对不上）"""
+    sql = f"""
+        SELECT {FIELD_FULL_KEY}, {FIELD_YEAR}
+        FROM {PROGRESS_TABLE}
+        WHERE {FIELD_DATA_VERSION} = :data_version
+    """
+    rows = conn.execute(text(sql), {"data_version": data_version}).fetchall()
+    return {(full_key, int(year)) for full_key, year in rows}
+
+
+def delete_stale_verdicts(conn: Connection, data_version: str) -> int:
+    """全量完成后清理旧版本行（源表已删除的车源）及旧版本进度"""
+    params = {"data_version": data_version}
+    conn.execute(text(f"DELETE FROM {PROGRESS_TABLE} WHERE {FIELD_DATA_VERSION} <> :data_version"), params)
+    sql = f"DELETE FROM {VERDICT_TABLE} WHERE {FIELD_DATA_VERSION} <> :data_version"
+    return conn.execute(text(sql), params).rowcount
+
@@ -1,11 +1,22 @@
+import io
+import json
+import time
 from collections import OrderedDict
+from collections.abc import Mapping
+from datetime import date, datetime
+from decimal import Decimal
 from logging import Logger
-from typing import List, Optional
+from typing import Any, Iterable, Iterator, List, Optional, Sequence
 
 import pandas as pd
 from sqlalchemy import create_engine, text
 from sqlalchemy.engine import Engine
 
+try:
+    import pyarrow as pa  # 可选：按 Arrow RecordBatch 分块读取时才需要
+except ImportError:  # pragma: no cover
+    pa = None
+
 
 # ========= 🌐 初始化 =========
 def get_sqlalchemy_engine(host: str, port: int, db: str, user: str, password: str) -> Engine:
@@ -82,6 +93,89 @@ def read_table_as_dataframe(engine, table_name: str, logger: Logger) -> pd.DataF
         return pd.DataFrame()
 
 
+# ========= 🌊 流式分块读取（服务端游标，内存只占一个分块） =========
+READ_CHUNK_SIZE = 50000             # 每个分块的行数
+CHUNK_FORMATS   = ("pandas", "arrow", "records")
+
+
+def _make_chunk(rows: List[tuple], columns: List[str], fmt: str) -> Any:
+    if fmt == "pandas":
+        return pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)   # 与 pd.read_sql 同口径
+    if fmt == "arrow":
+        arrays = [pa.array(list(col)) for col in zip(*rows)] if rows else [pa.array([]) for _ in columns]
+        return pa.RecordBatch.from_arrays(arrays, names=columns)
+    return rows
+
+
+def iter_query_chunks(
+        engine: Engine,
+        sql: str,
+        params: dict = None,
+        chunk_size: int = READ_CHUNK_SIZE,
+        fmt: str = "pandas",
+        limit: Optional[int] = None,
+) -> Iterator[Any]:
+    """
+    用服务端游标执行查询，按 chunk_size 行分块产出结果（生成器，内存只保留当前分块）
+
+    参数：
+        engine: SQLAlchemy Engine 对象
+        sql: 查询语句（支持 :param 占位符）
+        params: 参数字典，可选
+        chunk_size: 每块行数
+        fmt: "pandas" → DataFrame；"arrow" → pyarrow.RecordBatch（需安装 pyarrow）；"records" → List[tuple]
+        limit: 最多读取的行数，None 表示不限制
+
+    说明：
+        连接在生成器耗尽或被关闭（close / 提前 break 后被回收）时归还连接池
+    """
+    if fmt not in CHUNK_FORMATS:
+        raise ValueError(f"fmt 只支持 {CHUNK_FORMATS}，收到：{fmt}")
+    if fmt == "arrow" and pa is None:
+        raise ImportError("fmt='arrow' 需要安装 pyarrow")
+
+    remaining = limit
+    with engine.connect() as conn:
+        result  = conn.execution_options(stream_results=True, max_row_buffer=chunk_size).execute(text(sql), params or {})
+        columns = list(result.keys())
+        for part in result.partitions(chunk_size):
+            if remaining is not None:
+                part = part[:remaining]
+                remaining -= len(part)
+            yield _make_chunk([tuple(r) for r in part], columns, fmt)
+            if remaining is not None and remaining <= 0:
+                break
+        result.close()
+
+
+def iter_table_chunks(
+        engine: Engine,
+        table_name: str,
+        columns: Optional[Sequence[str]] = None,
+        where: Optional[str] = None,
+        params: dict = None,
+        order_by: Optional[str] = None,
+        limit: Optional[int] = None,
+        chunk_size: int = READ_CHUNK_SIZE,
+        fmt: str = "pandas",
+) -> Iterator[Any]:
+    """
+    分块读取整表（read_table_as_dataframe 的流式版本），支持列裁剪、过滤、排序与行数上限
+
+    示例：
+        for df in iter_table_chunks(engine, "dws_rehui_rank_cargurus", ["listing_id", "price"], limit=200000):
+            ...
+    """
+    sql = f"SELECT {', '.join(columns) if columns else '*'} FROM {table_name}"
+    if where:
+        sql += f" WHERE {where}"
+    if order_by:
+        sql += f" ORDER BY {order_by}"
+    if limit is not None:
+        sql += f" LIMIT {int(limit)}"                   # 服务端也只扫描需要的行
+    return iter_query_chunks(engine, sql, params, chunk_size=chunk_size, fmt=fmt, limit=limit)
+
+
 from sqlalchemy.exc import SQLAlchemyError
 import pandas as pd
 from sqlalchemy.engine import Engine
@@ -126,6 +220,189 @@ def insert_batch(
     except SQLAlchemyError as e:
         if logger:
             logger.error(f"❌ 插入失败：{table_name}，异常：{str(e)[:300]}...")
+        raise
+
+
+# ========= 🚚 COPY 批量导入 / upsert =========
+COPY_BUFFER_SIZE = 1 << 20          # 每次交给 COPY 的字节数（约 1MB）
+_END = object()
+
+
+def _copy_value(value: Any) -> str:
+    """单个值 → COPY text 格式字段（NULL 为 \\N；反斜杠、制表符、换行需转义）"""
+    if value is None or value is pd.NA or value is pd.NaT:
+        return "\\N"
+    if isinstance(value, str):
+        s = value
+    elif isinstance(value, bool):
+        return "t" if value else "f"
+    elif isinstance(value, float):
+        return "\\N" if value != value else float.__repr__(value)
+    elif isinstance(value, (int, Decimal)):
+        return str(value)
+    elif isinstance(value, (datetime, date)):
+        return value.isoformat()
+    elif isinstance(value, (dict, list)):
+        s = json.dumps(value, ensure_ascii=False)
+    else:
+        s = str(value)
+    if "\\" in s or "\t" in s or "\n" in s or "\r" in s:
+        s = s.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+    return s
+
+
+class _CopyStream(io.RawIOBase):
+    """
+    把记录迭代器按需编码成 COPY text 数据流：COPY 每次 read(size) 只编码够 size 字节的行，
+    全量记录不会同时出现在内存里。records 元素可以是 dict（按 fields 取值）或与 fields 同序的 tuple/list。
+    """
+
+    def __init__(self, records: Iterable[Any], fields: Sequence[str]):
+        super().__init__()
+        self._records = iter(records)
+        self._fields  = list(fields)
+        self._buffer  = bytearray()
+        self.rows     = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def _encode(self, record: Any) -> bytes:
+        values = [record.get(f) for f in self._fields] if isinstance(record, Mapping) else record
+        return ("\t".join([_copy_value(v) for v in values]) + "\n").encode("utf-8")
+
+    def read(self, size: int = -1) -> bytes:
+        buffer = self._buffer
+        while size < 0 or len(buffer) < size:
+            record = next(self._records, _END)
+            if record is _END:
+                break
+            buffer += self._encode(record)
+            self.rows += 1
+        if size < 0 or size >= len(buffer):
+            chunk, self._buffer = bytes(buffer), bytearray()
+        else:
+            chunk = bytes(buffer[:size])
+            del buffer[:size]
+        return chunk
+
+
+def _copy_into(cursor, table_name: str, records: Iterable[Any], fields: Sequence[str], buffer_size: int) -> int:
+    stream = _CopyStream(records, fields)
+    cursor.copy_expert(f"COPY {table_name} ({', '.join(fields)}) FROM STDIN", stream, size=buffer_size)
+    return stream.rows
+
+
+def _load_result(rows: int, started: float, **extra) -> dict:
+    elapsed = time.perf_counter() - started
+    return {"rows": rows, **extra, "elapsed_sec": elapsed, "rows_per_sec": rows / elapsed if elapsed > 0 else 0.0}
+
+
+def copy_records(
+        engine: Engine,
+        table_name: str,
+        records: Iterable[Any],
+        fields: Sequence[str],
+        buffer_size: int = COPY_BUFFER_SIZE,
+        logger: Logger = None
+) -> dict:
+    """
+    用 COPY FROM STDIN 流式导入记录（单个事务，失败整体回滚并抛出异常）
+
+    参数：
+        engine: SQLAlchemy Engine 对象（psycopg2 驱动）
+        table_name: 目标表名（如 public.my_table）
+        records: 记录迭代器，元素为 dict 或与 fields 同序的 tuple/list；可以是生成器
+        fields: 导入字段名列表，需与表结构匹配
+        buffer_size: 每次发送给服务端的字节数
+
+    返回：
+        {"rows": 导入行数, "elapsed_sec": 用时, "rows_per_sec": 速率}
+    """
+    started = time.perf_counter()
+    raw = engine.raw_connection()
+    try:
+        with raw.cursor() as cursor:
+            rows = _copy_into(cursor, table_name, records, fields, buffer_size)
+        raw.commit()
+    except Exception as e:
+        raw.rollback()
+        if logger:
+            logger.error(f"❌ COPY 导入失败：{table_name}，异常：{str(e)[:300]}...")
+        raise
+    finally:
+        raw.close()
+
+    result = _load_result(rows, started)
+    if logger:
+        logger.info(f"✅ COPY 导入 {rows:,} 条记录 → {table_name}，用时 {result['elapsed_sec']:.2f}s（{result['rows_per_sec']:,.0f} 行/秒）")
+    return result
+
+
+def upsert_records(
+        engine: Engine,
+        table_name: str,
+        records: Iterable[Any],
+        fields: Sequence[str],
+        conflict_fields: Sequence[str],
+        update_fields: Optional[Sequence[str]] = None,
+        buffer_size: int = COPY_BUFFER_SIZE,
+        logger: Logger = None
+) -> dict:
+    """
+    COPY 到临时暂存表，再 INSERT ... ON CONFLICT 合并进目标表（同一事务，失败整体回滚并抛出异常）
+
+    参数：
+        conflict_fields: 冲突判定字段（需有唯一约束/主键）
+        update_fields: 冲突时覆盖的字段，默认 fields 中除 conflict_fields 外的全部；传空列表则 DO NOTHING
+        其余同 copy_records
+
+    说明：
+        同一批记录内冲突键重复时，以最后一条为准（否则 ON CONFLICT 会因同一行被更新两次而报错）
+
+    返回：
+        {"rows": 导入行数, "inserted": 新增行数, "updated": 更新行数, "elapsed_sec": 用时, "rows_per_sec": 速率}
+    """
+    if update_fields is None:
+        update_fields = [f for f in fields if f not in conflict_fields]
+    columns  = ", ".join(fields)
+    keys     = ", ".join(conflict_fields)
+    stage    = "_stage_" + table_name.replace(".", "_")
+    action   = ("DO UPDATE SET " + ", ".join(f"{f} = EXCLUDED.{f}" for f in update_fields)) if update_fields else "DO NOTHING"
+    merge_sql = f"""
+        WITH merged AS (
+            INSERT INTO {table_name} ({columns})
+            SELECT DISTINCT ON ({keys}) {columns} FROM {stage} ORDER BY {keys}, ctid DESC
+            ON CONFLICT ({keys}) {action}
+            RETURNING (xmax = 0) AS inserted
+        )
+        SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted) FROM merged
+    """
+
+    started = time.perf_counter()
+    raw = engine.raw_connection()
+    try:
+        with raw.cursor() as cursor:
+            cursor.execute(f"CREATE TEMP TABLE {stage} (LIKE {table_name} INCLUDING DEFAULTS) ON COMMIT DROP")
+            rows = _copy_into(cursor, stage, records, fields, buffer_size)
+            cursor.execute(merge_sql)
+            inserted, updated = cursor.fetchone()
+        raw.commit()
+    except Exception as e:
+        raw.rollback()
+        if logger:
+            logger.error(f"❌ upsert 失败：{table_name}，异常：{str(e)[:300]}...")
+        raise
+    finally:
+        raw.close()
+
+    result = _load_result(rows, started, inserted=inserted, updated=updated)
+    if logger:
+        logger.info(
+            f"✅ upsert {rows:,} 条记录 → {table_name}（新增 {inserted:,} / 更新 {updated:,}），"
+            f"用时 {result['elapsed_sec']:.2f}s（{result['rows_per_sec']:,.0f} 行/秒）"
+        )
+    return result
 
 # ========= 🧱 表结构管理 =========
 def create_table_if_not_exists(engine, table_name: str, schema: OrderedDict, logger: Logger):
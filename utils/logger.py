@@ -1,26 +1,116 @@
+import atexit
+import copy
+import itertools
 import logging
 import os
-from datetime import datetime
+import queue
+from datetime import datetime, timedelta
+from logging.handlers import QueueHandler, QueueListener
 from utils.path_utils import get_abs_path
 
 
+# ======== 文件 handler：按日期命名 + 跨零点自动切换 + 保留天数 ========
+class DailyFileHandler(logging.FileHandler):
+    """
+    日志文件名为 {prefix}_{YYYYMMDD}{suffix}；跨零点后的第一条记录触发切换到新日期文件，
+    同时删除超过 retention_days 的旧文件（retention_days <= 0 表示不清理）。
+    只在切换时清理：构建 handler（任何 import utils.logger，包括测试）不删除文件。
+    """
+
+    def __init__(self, log_dir: str, prefix: str, suffix: str = ".log", retention_days: int = 14, encoding: str = "utf-8"):
+        self.log_dir        = log_dir
+        self.prefix         = prefix
+        self.suffix         = suffix
+        self.retention_days = retention_days
+
+        now = datetime.now()
+        self._next_rollover = self._next_midnight(now)
+        super().__init__(self._path_for(now), encoding=encoding)
+
+    def _path_for(self, day: datetime) -> str:
+        return os.path.join(self.log_dir, f"{self.prefix}_{day.strftime('%Y%m%d')}{self.suffix}")
+
+    @staticmethod
+    def _next_midnight(now: datetime) -> float:
+        return datetime.combine(now.date() + timedelta(days=1), datetime.min.time()).timestamp()
+
+    def _purge_expired(self, now: datetime) -> None:
+        if self.retention_days <= 0:
+            return
+        oldest_kept = (now - timedelta(days=self.retention_days - 1)).strftime("%Y%m%d")
+        head, tail  = f"{self.prefix}_", self.suffix
+        for name in os.listdir(self.log_dir):
+            date_part = name[len(head):-len(tail)] if name.startswith(head) and name.endswith(tail) else ""
+            if len(date_part) == 8 and date_part.isdigit() and date_part < oldest_kept:
+                try:
+                    os.remove(os.path.join(self.log_dir, name))
+                except OSError:
+                    pass
+
+    def emit(self, record: logging.LogRecord) -> None:
+        # emit 在 handler 锁内调用，切换文件无需额外加锁
+        if record.created >= self._next_rollover:
+            now = datetime.fromtimestamp(record.created)
+            if self.stream:
+                self.stream.close()
+                self.stream = None                                  # 下一次写入时按新路径重新打开
+            self.baseFilename   = os.path.abspath(self._path_for(now))
+            self._next_rollover = self._next_midnight(now)
+            self._purge_expired(now)
+        super().emit(record)
+
+
+# ======== 队列 handler：调用线程只入队，格式化与磁盘/控制台 IO 都在监听线程 ========
+_IMMUTABLE_ARGS = (str, int, float, bool, bytes, type(None))
+
+
+class DeferredQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 标准 QueueHandler 会在调用线程里完整 format 一次；这里只把异常堆栈渲染成文本（帧对象不跨线程保留），
+        # 参数全是不可变基本类型时 %-拼接留给监听线程；否则（dict / list / DataFrame 等）在调用线程拼好并丢弃 args，
+        # 避免调用方之后修改对象导致日志内容错乱，也不把对象引用带到监听线程
+        record = copy.copy(record)
+        args   = record.args
+        if args and not (isinstance(args, tuple) and all(isinstance(a, _IMMUTABLE_ARGS) for a in args)):
+            record.msg  = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+# ======== 采样过滤：热路径 INFO 及以下按 1/N 采样，WARNING 及以上全部保留 ========
+class SampleFilter(logging.Filter):
+    def __init__(self, sample_every: int):
+        super().__init__()
+        self.sample_every = max(1, int(sample_every))
+        self._counter     = itertools.count()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.sample_every == 1:
+            return True
+        return next(self._counter) % self.sample_every == 0
+
+
 class Logger:
     _global_logger = None  # 全局日志单例缓存，避免重复创建
+    _listener      = None  # 全局 QueueListener（后台线程负责写文件/控制台）
+    _listening     = False # 监听线程是否在运行（start 后置 True，shutdown 后置 False）
 
     def __init__(self):
         # ======== 默认值定义 ========
         logger_name = "rehui_api"                                     # 默认日志器名称
-        date_str    = datetime.now().strftime('%Y%m%d')               # 日志日期字符串（格式：20250807）
         log_dir     = "logs"                                          # 日志输出目录
 
         # ======== 参数变量 ========
-        self.logger_name = logger_name                                # 日志器名称
-        self.date_str    = date_str                                   # 当前日期字符串
-        self.log_dir     = log_dir                                    # 日志目录
+        self.logger_name    = logger_name                             # 日志器名称
+        self.log_dir        = log_dir                                 # 日志目录
+        self.retention_days = int(os.getenv("LOG_RETENTION_DAYS", "14"))                         # 日志保留天数（<=0 不清理）
+        self.log_level      = getattr(logging, os.getenv("LOG_LEVEL", "INFO").upper(), logging.INFO)  # 全局日志级别
 
         # ======== 常量定义 ========
         self.log_suffix   = ".log"                                    # 日志文件后缀
-        self.log_level    = logging.INFO                              # 日志级别：INFO
         self.time_format  = "%H:%M:%S"                                # 日志时间格式（仅时分秒）
         self.log_format   = "[%(asctime)s] %(levelname)s | %(filename)s | %(funcName)s | %(message)s"
 
@@ -30,35 +120,36 @@ class Logger:
             os.makedirs(abs_log_dir)
 
         # ======== 中间变量 ========
-        self.log_filename   = f"{self.logger_name}_{self.date_str}{self.log_suffix}"  # 日志文件名
-        self.log_file_path  = get_abs_path(self.log_dir, self.log_filename)           # 日志完整路径
-        self.logger         = self._setup_logger()                                                    # 实际 logger 实例
+        self.abs_log_dir = abs_log_dir                                # 日志目录绝对路径（文件名按日期切换）
+        self.logger      = self._setup_logger()                       # 实际 logger 实例
 
     def _setup_logger(self):
         # ======== 参数变量 ========
-        log_path     = self.log_file_path                        # 日志文件路径
-        log_dir      = os.path.dirname(log_path)                 # 日志目录路径
         logger_name  = self.logger_name                          # 日志器名称
         level        = self.log_level                            # 日志级别
         fmt          = self.log_format                           # 日志内容格式
         time_fmt     = self.time_format                          # 时间显示格式
 
         # ======== 中间变量 ========
-        logger         = logging.getLogger(logger_name)          # 获取 logger 实例
-        formatter      = logging.Formatter(fmt=fmt, datefmt=time_fmt)      # 格式器
-        file_handler   = logging.FileHandler(log_path, encoding="utf-8")   # 文件输出 handler
-        stream_handler = logging.StreamHandler()                           # 控制台输出 handler
+        logger    = logging.getLogger(logger_name)               # 获取 logger 实例
+        formatter = logging.Formatter(fmt=fmt, datefmt=time_fmt)  # 格式器
 
         # ======== 日志器配置 ========
-        if log_dir and not os.path.exists(log_dir):
-            os.makedirs(log_dir)
-
         logger.setLevel(level)
         if not logger.handlers:
+            file_handler = DailyFileHandler(self.abs_log_dir, logger_name, self.log_suffix, self.retention_days)
+            stream_handler = logging.StreamHandler()
             file_handler.setFormatter(formatter)
             stream_handler.setFormatter(formatter)
-            logger.addHandler(file_handler)
-            logger.addHandler(stream_handler)
+
+            log_queue = queue.SimpleQueue()
+            listener  = QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+            listener.start()
+            Logger._listener  = listener
+            Logger._listening = True
+            atexit.register(Logger.shutdown)                     # 退出前把队列里剩余的日志刷完
+
+            logger.addHandler(DeferredQueueHandler(log_queue))
 
         return logger
 
@@ -72,4 +163,42 @@ class Logger:
         """
         if Logger._global_logger is None:
             Logger._global_logger = Logger().get_logger()
-        return Logger._global_logger
\ No newline at end of file
+        return Logger._global_logger
+
+    @staticmethod
+    def shutdown():
+        """
+        停止监听线程并刷完队列（可重复调用）
+        """
+        if Logger._listening:
+            Logger._listening = False
+            Logger._listener.stop()
+
+    @staticmethod
+    def get_child_logger(name: str, level: str = None, sample_every: int = None):
+        """
+        子 logger（rehui_api.<name>）：共用全局队列与文件，可单独设置级别与采样（每 N 条 INFO 留 1 条）。
+        未传参时读环境变量 LOG_<NAME>_LEVEL / LOG_<NAME>_SAMPLE_EVERY。
+        """
+        Logger.get_global_logger()
+        child = logging.getLogger(f"{Logger._global_logger.name}.{name}")
+        if getattr(child, "_rehui_configured", False):
+            return child
+
+        env_prefix   = f"LOG_{name.upper()}_"
+        level        = level or os.getenv(env_prefix + "LEVEL")
+        sample_every = sample_every or int(os.getenv(env_prefix + "SAMPLE_EVERY", "1"))
+        if level:
+            child.setLevel(getattr(logging, level.upper(), logging.INFO))
+        if sample_every > 1:
+            child.addFilter(SampleFilter(sample_every))
+        child._rehui_configured = True
+        return child
+
+    @staticmethod
+    def get_hot_logger():
+        """
+        热路径 logger（每个请求都会打的日志）：LOG_HOT_LEVEL / LOG_HOT_SAMPLE_EVERY 控制，
+        例如 LOG_HOT_SAMPLE_EVERY=100 表示每 100 条请求日志只写 1 条（WARNING 以上不采样）。
+        """
+        return Logger.get_child_logger("hot")
@@ -0,0 +1,132 @@
+# utils/lru_cache.py
+# -*- coding: utf-8 -*-
+"""
+进程内 LRU 缓存：条目数 + 字节数双上限、TTL 过期、命中统计、数据版本失效。
+写入可带上"开始计算时的数据版本"：计算期间版本已切换（check_version 已清空）则丢弃，不把旧数据写进新版本。
+线程安全（uvicorn 线程池 / 多请求并发访问）。
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+__all__ = ["LRUCache"]
+
+
+class LRUCache:
+    def __init__(
+            self,
+            name: str,
+            max_entries: int,
+            max_bytes: int,
+            ttl_seconds: float,
+            sizeof: Optional[Callable[[Any], int]] = None,
+    ):
+        # ======== 参数变量 ========
+        self.name        = name                       # 缓存名（日志/统计用）
+        self.max_entries = max_entries                # 最多条目数
+        self.max_bytes   = max_bytes                  # 最多占用字节数（估算）
+        self.ttl_seconds = ttl_seconds                # 过期时间（秒），<=0 表示不过期
+        self.sizeof      = sizeof or (lambda v: 0)    # 单个 value 的字节估算函数
+
+        # ======== 内部状态 ========
+        self._lock    = threading.Lock()
+        self._data: "OrderedDict[Hashable, Tuple[Any, int, float]]" = OrderedDict()  # key -> (value, nbytes, expire_at)
+        self._bytes   = 0
+        self._version: Optional[str] = None
+
+        # ======== 统计 ========
+        self.hits          = 0
+        self.misses        = 0
+        self.evictions     = 0
+        self.expirations   = 0
+        self.invalidations = 0
+        self.stale_puts    = 0
+
+    # ======== 数据版本：变化则整体清空 ========
+    def check_version(self, version: Optional[str]) -> bool:
+        """
+        传入当前数据版本；与缓存中的版本不同则清空全部条目。
+        返回 True 表示发生了失效。
+        """
+        with self._lock:
+            if version == self._version:
+                return False
+            changed = self._version is not None
+            self._version = version
+            if changed:
+                self._data.clear()
+                self._bytes = 0
+                self.invalidations += 1
+            return changed
+
+    # ======== 读写 ========
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, nbytes, expire_at = item
+            if expire_at and expire_at < time.monotonic():
+                self._pop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any, version: Optional[str] = None) -> bool:
+        """
+        写入一条；version 为计算开始时 check_version 传入的数据版本（None 表示不校验）。
+        与缓存当前版本不一致时丢弃。返回是否写入。
+        """
+        nbytes = int(self.sizeof(value))
+        if nbytes > self.max_bytes:
+            return False  # 单条就超上限：不缓存
+        expire_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds > 0 else 0.0
+        with self._lock:
+            if version is not None and version != self._version:
+                self.stale_puts += 1
+                return False
+            if key in self._data:
+                self._pop(key)
+            self._data[key] = (value, nbytes, expire_at)
+            self._bytes += nbytes
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._data))
+                self._pop(oldest)
+                self.evictions += 1
+            return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def _pop(self, key: Hashable) -> None:
+        _, nbytes, _ = self._data.pop(key)
+        self._bytes -= nbytes
+
+    # ======== 统计输出 ========
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "name": self.name,
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "version": self._version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "stale_puts": self.stale_puts,
+            }
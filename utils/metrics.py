@@ -0,0 +1,204 @@
+# utils/metrics.py
+# -*- coding: utf-8 -*-
+"""
+轻量指标：直方图 + Prometheus 文本格式导出 + 按请求收集的分段耗时（Server-Timing）。
+不依赖 prometheus_client；所有直方图登记在 REGISTRY，/metrics 直接输出 REGISTRY.render()。
+
+用法：
+    with span("row_lookup"):              # 计入阶段直方图，并记到当前请求的 Server-Timing
+        row = fetch(...)
+    set_request_label("cohort_bucket", cohort_bucket(len(df)))
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+__all__ = [
+    "Histogram", "Counter", "Registry", "REGISTRY", "RequestTiming",
+    "STAGE_SECONDS", "REQUEST_SECONDS", "SINGLE_FLIGHT_CALLS",
+    "span", "start_request_timing", "current_request_timing", "set_request_label", "cohort_bucket",
+]
+
+# ======== 参数变量 ========
+DEFAULT_BUCKETS     = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COHORT_SIZE_BUCKETS = (10, 100, 1000, 10000)          # cohort 样本数分桶（le_10 / le_100 / ... / gt_10000）
+CONTENT_TYPE        = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(pairs: Sequence[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_float(x: float) -> str:
+    return repr(float(x)) if x != float("inf") else "+Inf"
+
+
+class Histogram:
+    """
+    固定桶直方图（线程安全）。标签值按 labelnames 顺序组成 key；
+    各桶内存非累计计数，导出时再累加成 Prometheus 的 le 累计口径。
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name          = name
+        self.documentation = documentation
+        self.labelnames    = tuple(labelnames)
+        self.buckets       = tuple(sorted(buckets))
+        self._lock         = threading.Lock()
+        self._series: Dict[Tuple[str, ...], List[float]] = {}   # key -> [桶计数..., +Inf 计数, sum]
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        idx = bisect_left(self.buckets, value)                    # 第一个 >= value 的桶（le 口径）
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[idx] += 1
+            series[-1]  += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {k: list(v) for k, v in self._series.items()}
+        for key, series in sorted(snapshot.items()):
+            base  = list(zip(self.labelnames, key))
+            total = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                total += count
+                lines.append(f"{self.name}_bucket{_format_labels(base + [('le', _format_float(bound))])} {total}")
+            lines.append(f"{self.name}_sum{_format_labels(base)} {_format_float(series[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(base)} {total}")
+        return lines
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+class Counter:
+    """单调递增计数器（线程安全），标签用法同 Histogram"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name          = name
+        self.documentation = documentation
+        self.labelnames    = tuple(labelnames)
+        self._lock         = threading.Lock()
+        self._series: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = dict(self._series)
+        for key, value in sorted(snapshot.items()):
+            lines.append(f"{self.name}{_format_labels(list(zip(self.labelnames, key)))} {_format_float(value)}")
+        return lines
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Any] = []
+
+    def register(self, metric: Any) -> Any:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "rehui_stage_duration_seconds",
+    "Duration of each evaluation stage (row lookup, cohort fetch, evaluator, advice, serialization).",
+    labelnames=("stage",),
+))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "rehui_request_duration_seconds",
+    "HTTP request duration by endpoint and cohort-size bucket.",
+    labelnames=("endpoint", "method", "status", "cohort_bucket"),
+))
+SINGLE_FLIGHT_CALLS = REGISTRY.register(Counter(
+    "rehui_single_flight_calls_total",
+    "Calls through single-flight groups: executed (ran the work) or coalesced (shared an in-flight result).",
+    labelnames=("group", "result"),
+))
+
+
+# ======== 按请求收集：分段耗时 + 标签（contextvar；to_thread / 线程池会带上同一个对象） ========
+class RequestTiming:
+    __slots__ = ("spans", "labels")
+
+    def __init__(self):
+        self.spans: List[Tuple[str, float]] = []   # (stage, 秒)，同名阶段多次出现时导出前合并
+        self.labels: Dict[str, str] = {}
+
+    def server_timing(self) -> str:
+        merged: Dict[str, float] = {}
+        for stage, sec in self.spans:
+            merged[stage] = merged.get(stage, 0.0) + sec
+        return ", ".join(f"{stage};dur={sec * 1000:.2f}" for stage, sec in merged.items())
+
+
+_request_timing: ContextVar[Optional[RequestTiming]] = ContextVar("rehui_request_timing", default=None)
+
+
+def start_request_timing() -> RequestTiming:
+    timing = RequestTiming()
+    _request_timing.set(timing)
+    return timing
+
+
+def current_request_timing() -> Optional[RequestTiming]:
+    return _request_timing.get()
+
+
+def set_request_label(name: str, value: str) -> None:
+    timing = _request_timing.get()
+    if timing is not None:
+        timing.labels[name] = value
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """计时一个阶段：写入阶段直方图；处于请求上下文中时同时记入 Server-Timing"""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        sec = time.perf_counter() - t0
+        STAGE_SECONDS.observe(sec, stage=stage)
+        timing = _request_timing.get()
+        if timing is not None:
+            timing.spans.append((stage, sec))
+
+
+def cohort_bucket(n: int) -> str:
+    for bound in COHORT_SIZE_BUCKETS:
+        if n <= bound:
+            return f"le_{bound}"
+    return f"gt_{COHORT_SIZE_BUCKETS[-1]}"
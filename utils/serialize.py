@@ -1,41 +1,100 @@
 # utils/serialize.py
 from datetime import datetime, date
 from decimal import Decimal
-from typing import Any
+from typing import Any, Callable, Dict, List, Tuple
 
+import json
 import numpy as np
 import pandas as pd
 
-__all__ = ["to_native", "as_json_ready"]
+try:
+    import orjson  # 可选：C 实现的 JSON 编码，缺失时回退到标准库 json
+except ImportError:  # pragma: no cover
+    orjson = None
+
+__all__ = ["to_native", "as_json_ready", "dumps"]
+
+# ======== 类型分派（按 type(obj) 精确查表；新类型首次出现时按继承关系解析一次并记住） ========
+def _float(x: Any) -> Any:
+    x = float(x)
+    return None if x != x else x          # NaN → None（JSON 的 null）
+
+def _identity(x: Any) -> Any:
+    return x
+
+def _none(x: Any) -> None:
+    return None
+
+def _iso(x: Any) -> str:
+    return x.isoformat()
+
+def _dict(d: dict) -> dict:
+    return {to_native(k): to_native(v) for k, v in d.items()}
+
+def _seq(xs: Any) -> list:
+    return [to_native(x) for x in xs]
+
+# 解析顺序：numpy/pandas 标量在前（np.float64 继承自 float，需先命中 np.floating）
+_RESOLVE_ORDER: List[Tuple[type, Callable[[Any], Any]]] = [
+    (np.bool_,           bool),
+    (np.integer,         int),
+    (np.floating,        _float),
+    (np.ndarray,         lambda a: _seq(a.tolist())),
+    (type(pd.NaT),       _none),
+    (type(pd.NA),        _none),
+    (pd.Timestamp,       _iso),
+    (pd.Series,          lambda s: _dict(s.to_dict())),
+    (pd.DataFrame,       lambda df: [_dict(r) for r in df.to_dict(orient="records")]),
+    ((datetime, date),   _iso),
+    (Decimal,            _float),
+    (dict,               _dict),
+    ((list, tuple, set), _seq),
+    (float,              _float),
+]
+
+_DISPATCH: Dict[type, Callable[[Any], Any]] = {
+    str: _identity, int: _identity, bool: _identity, type(None): _identity,
+    float: _float, dict: _dict, list: _seq, tuple: _seq,
+}
+
+def _resolve(t: type) -> Callable[[Any], Any]:
+    for base, fn in _RESOLVE_ORDER:
+        if issubclass(t, base):
+            return fn
+    return _identity
 
 def to_native(obj: Any) -> Any:
-    if isinstance(obj, dict):
-        return {to_native(k): to_native(v) for k, v in obj.items()}
-    if isinstance(obj, (list, tuple, set)):
-        return [to_native(x) for x in obj]
-    if isinstance(obj, np.ndarray):
-        return obj.tolist()
-    if isinstance(obj, np.integer):
-        return int(obj)
-    if isinstance(obj, np.floating):
-        return float(obj)
-    if isinstance(obj, np.bool_):
-        return bool(obj)
-    if isinstance(obj, pd.Timestamp):
-        return obj.isoformat()
-    if obj is pd.NaT:
-        return None
-    if isinstance(obj, pd.Series):
-        return to_native(obj.to_dict())
-    if isinstance(obj, pd.DataFrame):
-        return [to_native(r) for r in obj.to_dict(orient="records")]
-    if isinstance(obj, (datetime, date)):
-        return obj.isoformat()
-    if isinstance(obj, Decimal):
-        return float(obj)
-    return obj
+    """
+    递归转换为 JSON 原生类型：numpy/pandas 标量、Decimal、时间、NaN（→ None）等。
+    """
+    fn = _DISPATCH.get(type(obj))
+    if fn is None:
+        fn = _resolve(type(obj))
+        _DISPATCH[type(obj)] = fn
+    return fn(obj)
 
 def as_json_ready(fn):
     def wrapper(*args, **kwargs):
         return to_native(fn(*args, **kwargs))
     return wrapper
+
+# ======== 一次编码到 JSON 字节（orjson 直接处理 numpy 标量与 NaN，其余类型走 to_native） ========
+def _orjson_default(obj: Any) -> Any:
+    native = to_native(obj)
+    if native is obj:
+        raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+    return native
+
+def dumps(obj: Any) -> bytes:
+    """
+    编码为紧凑 UTF-8 JSON 字节（NaN → null）。
+    有 orjson 时单次 C 编码，无需先 to_native 整体遍历；否则回退到 to_native + json.dumps。
+    """
+    if orjson is not None:
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        try:
+            return orjson.dumps(obj, default=_orjson_default, option=option)
+        except TypeError:
+            # 少见情况（如 numpy 标量作 dict key）：先整体 to_native 再编码
+            return orjson.dumps(to_native(obj), option=option)
+    return json.dumps(to_native(obj), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
@@ -0,0 +1,122 @@
+# utils/single_flight.py
+# -*- coding: utf-8 -*-
+"""
+请求合并（single-flight）：同一个 key 同时只执行一次，执行期间到达的相同调用直接等待并共享结果（或异常）。
+执行完成即移除，不做缓存（缓存仍由 LRUCache 负责）；只合并"正在进行中"的重复调用。
+
+    SingleFlight       线程版（uvicorn 线程池 / 同步接口）
+    AsyncSingleFlight  asyncio 版（同一事件循环内的协程）
+
+do() 返回 (结果, shared)：shared=True 表示本次调用等待并复用了别人的执行结果。
+统计：calls = executions + coalesced；同时计入 Prometheus 计数 rehui_single_flight_calls_total{group, result}。
+"""
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from utils.metrics import SINGLE_FLIGHT_CALLS
+
+__all__ = ["SingleFlight", "AsyncSingleFlight"]
+
+
+class _FlightStats:
+    def __init__(self, name: str):
+        self.name       = name
+        self.executions = 0
+        self.coalesced  = 0
+        self.errors     = 0
+
+    def _record(self, shared: bool) -> None:
+        if shared:
+            self.coalesced += 1
+        else:
+            self.executions += 1
+        SINGLE_FLIGHT_CALLS.inc(group=self.name, result="coalesced" if shared else "executed")
+
+    def _stats(self, in_flight: int) -> Dict[str, Any]:
+        calls = self.executions + self.coalesced
+        return {
+            "name": self.name,
+            "in_flight": in_flight,
+            "calls": calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "coalesce_rate": round(self.coalesced / calls, 4) if calls else 0.0,
+            "errors": self.errors,
+        }
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event  = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight(_FlightStats):
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Tuple[Any, bool]:
+        with self._lock:
+            call   = self._calls.get(key)
+            shared = call is not None
+            if not shared:
+                call = self._calls[key] = _Call()
+            self._record(shared)
+
+        if shared:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+                self.errors += call.error is not None
+            call.event.set()
+        return call.result, False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return self._stats(len(self._calls))
+
+
+class AsyncSingleFlight(_FlightStats):
+    """
+    执行体放在独立 Task 中（继承发起者的 contextvars，耗时分段记在发起请求上），
+    所有调用方都 await shield(task)：发起者被取消（客户端断开）不会连累正在等待的其他请求。
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Tuple[Any, bool]:
+        task   = self._tasks.get(key)
+        shared = task is not None
+        if not shared:
+            task = self._tasks[key] = asyncio.ensure_future(fn(*args, **kwargs))
+            task.add_done_callback(lambda t: self._finish(key, t))
+        self._record(shared)
+        return await asyncio.shield(task), shared
+
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled() and task.exception() is not None:   # 读取一次，避免无人等待时告警
+            self.errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return self._stats(len(self._tasks))